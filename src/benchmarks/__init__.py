@@ -0,0 +1,9 @@
+"""Benchmark cho pipeline xử lý tài liệu. Chạy từ thư mục src: python -m benchmarks.<tên_benchmark>"""
+import os
+import tempfile
+
+# Benchmark không bao giờ chạm vào DB, Qdrant hay API key thật
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'notebooklm_benchmarks.db')}"
+os.environ["QDRANT_URL"] = ":memory:"
+os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+os.environ["OPENROUTER_API_KEY"] = "sk-benchmark"
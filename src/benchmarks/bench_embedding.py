@@ -0,0 +1,101 @@
+"""So sánh embedding tuần tự từng batch với nhiều batch song song và cache theo hash nội dung chunk.
+
+    python -m benchmarks.bench_embedding --sources 5 --chunks 512 --boilerplate 0.3 --in-flight 4
+
+Mỗi source có --chunks chunk, trong đó tỉ lệ --boilerplate là nội dung lặp lại giữa các source
+(header, footer, điều khoản mẫu). Model embedding giả (benchmarks.fakes.FakeEmbeddings) có độ trễ
+--latency mỗi request, cache là bản trong bộ nhớ thay cho Postgres.
+"""
+import argparse
+import json
+import random
+import time
+from itertools import batched
+
+from benchmarks.fakes import FakeEmbeddings, InMemoryCache
+from core import metrics
+from services.srv_embedding import EmbeddingService
+
+def generate_sources(count: int, chunks: int, boilerplate: float, seed: int) -> list[list[str]]:
+    rng = random.Random(seed)
+    shared = [f"Điều khoản chung {i}: " + " ".join(f"từ{rng.randrange(1000)}" for _ in range(40)) for i in range(50)]
+    sources = []
+    for source in range(count):
+        texts = []
+        for index in range(chunks):
+            if rng.random() < boilerplate:
+                texts.append(rng.choice(shared))
+            else:
+                texts.append(f"Source {source} chunk {index}: " + " ".join(f"từ{rng.randrange(1000)}" for _ in range(40)))
+        sources.append(texts)
+    return sources
+
+def run(name: str, service: EmbeddingService, sources: list[list[str]], batch_size: int) -> tuple[dict, list]:
+    service.embeddings.reset()
+    texts_before = metrics.get("embedding.texts")
+    embedded_before = metrics.get("embedding.embedded_texts")
+
+    vectors = []
+    started = time.perf_counter()
+    for texts in sources:
+        for _, batch_vectors in service.embed_batches(batched(texts, batch_size), list):
+            vectors.extend(batch_vectors)
+    seconds = time.perf_counter() - started
+
+    texts = metrics.get("embedding.texts") - texts_before
+    embedded = metrics.get("embedding.embedded_texts") - embedded_before
+    return {
+        "mode": name,
+        "chunks": texts,
+        "model_requests": service.embeddings.calls,
+        "model_texts": embedded,
+        "hit_ratio": round(1 - embedded / texts, 4),
+        "seconds": round(seconds, 2),
+        "chunks_per_sec": round(texts / seconds, 1),
+    }, vectors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--boilerplate", type=float, default=0.3)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--in-flight", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.3, help="Độ trễ mỗi request embedding (giây)")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    sources = generate_sources(args.sources, args.chunks, args.boilerplate, args.seed)
+    fake_embeddings = FakeEmbeddings(args.dim, args.latency)
+
+    results, outputs = [], []
+    for name, in_flight, cache_enabled in [
+        ("sequential", 1, False),
+        (f"in_flight={args.in_flight}", args.in_flight, False),
+        (f"in_flight={args.in_flight}+cache", args.in_flight, True),
+    ]:
+        service = EmbeddingService(fake_embeddings, cache=InMemoryCache(), max_in_flight=in_flight,
+                                   cache_enabled=cache_enabled)
+        result, vectors = run(name, service, sources, args.batch_size)
+        results.append(result)
+        outputs.append(vectors)
+
+    # Mọi chế độ phải ra cùng vector theo cùng thứ tự chunk
+    assert all(vectors == outputs[0] for vectors in outputs[1:]), "embedding output differs between modes"
+    # Có cache: nội dung đã gặp không gửi lại model (batch chạy song song có thể cùng lỡ một nội dung)
+    unique_texts = len({text for texts in sources for text in texts})
+    assert unique_texts <= results[-1]["model_texts"] < results[1]["model_texts"], results
+
+    for result in results:
+        print(f"{result['mode']:>22}: {result['chunks']} chunks, {result['model_requests']} requests, "
+              f"{result['model_texts']} texts sent, hit ratio {result['hit_ratio']:.2%}, "
+              f"{result['chunks_per_sec']} chunks/sec")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""So sánh peak RSS khi render PDF: giữ toàn bộ trang trong list (cũ) và stream theo cửa sổ (mới).
+
+    python -m benchmarks.bench_extract_memory --pages 300 --window 8
+
+Mỗi chế độ chạy trong một process riêng để peak RSS không ảnh hưởng lẫn nhau.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+def _read_status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+def _reset_peak_rss():
+    # Linux >= 4.0: ghi "5" vào clear_refs để reset VmHWM về RSS hiện tại
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def run_child(mode: str, pdf_path: str, output_dir: str, window: int) -> dict:
+    from services.process_document.utils import doc_extractor
+
+    _reset_peak_rss()
+    baseline_kb = _read_status_kb("VmRSS")
+    started = time.perf_counter()
+
+    pages_seen = 0
+    if mode == "list":
+        pages = doc_extractor.convert_pdf_to_pages(pdf_path, output_dir)
+        for _ in pages:
+            pages_seen += 1
+        del pages
+    else:
+        for page_window in doc_extractor.iter_pdf_page_windows(pdf_path, output_dir, window):
+            pages_seen += len(page_window)
+
+    return {
+        "mode": mode,
+        "pages": pages_seen,
+        "window": window if mode == "stream" else None,
+        "seconds": round(time.perf_counter() - started, 2),
+        "peak_rss_mb": round(_read_status_kb("VmHWM") / 1024, 1),
+        "peak_rss_delta_mb": round((_read_status_kb("VmHWM") - baseline_kb) / 1024, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--window", type=int, default=8)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--child", choices=["list", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.pdf, args.output_dir, args.window)))
+        return
+
+    from benchmarks.synthetic_pdf import generate_pdf
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = generate_pdf(os.path.join(tmp_dir, "scanned.pdf"), args.pages, scanned=True)
+        results = []
+        for mode in ("list", "stream"):
+            completed = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.bench_extract_memory",
+                    "--child", mode, "--pdf", pdf_path,
+                    "--output-dir", os.path.join(tmp_dir, mode), "--window", str(args.window),
+                ],
+                check=True, capture_output=True, text=True,
+            )
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    for result in results:
+        print(
+            f"{result['mode']:>6}: {result['pages']} pages in {result['seconds']}s, "
+            f"peak RSS {result['peak_rss_mb']} MB (+{result['peak_rss_delta_mb']} MB)"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
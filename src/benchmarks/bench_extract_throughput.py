@@ -0,0 +1,69 @@
+"""So sánh tốc độ render PDF (pages/sec) giữa chế độ tuần tự và process pool.
+
+    python -m benchmarks.bench_extract_throughput --corpus ./samples --workers 4
+
+Không truyền --corpus thì dùng một bộ PDF tổng hợp (text + ảnh minh họa).
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+
+from services.process_document.utils.doc_extractor import DocExtractor
+
+def run(extractor: DocExtractor, pdf_paths: list[str], output_root: str) -> dict:
+    pages = 0
+    started = time.perf_counter()
+    for index, pdf_path in enumerate(pdf_paths):
+        output_dir = os.path.join(output_root, str(index))
+        for _ in extractor.iter_pdf_pages(pdf_path, output_dir):
+            pages += 1
+    seconds = time.perf_counter() - started
+    return {
+        "workers": extractor.render_workers,
+        "pages": pages,
+        "seconds": round(seconds, 2),
+        "pages_per_sec": round(pages / seconds, 2) if seconds else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Thư mục chứa các file PDF mẫu")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk-pages", type=int, default=4)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.corpus:
+            pdf_paths = sorted(glob.glob(os.path.join(args.corpus, "**", "*.pdf"), recursive=True))
+        else:
+            from benchmarks.synthetic_pdf import generate_pdf
+            pdf_paths = [
+                generate_pdf(os.path.join(tmp_dir, "corpus", f"doc_{i}.pdf"), 40, images_per_page=2, seed=i)
+                for i in range(3)
+            ]
+
+        parallel = DocExtractor(render_workers=args.workers, chunk_pages=args.chunk_pages)
+        # Khởi động pool trước để không tính thời gian spawn process vào kết quả
+        parallel._get_process_pool().submit(int).result()
+
+        results = [
+            run(DocExtractor(render_workers=1), pdf_paths, os.path.join(tmp_dir, "serial")),
+            run(parallel, pdf_paths, os.path.join(tmp_dir, "parallel")),
+        ]
+
+    for result in results:
+        print(f"workers={result['workers']:>2}: {result['pages']} pages in {result['seconds']}s "
+              f"-> {result['pages_per_sec']} pages/sec")
+    if results[0]["pages_per_sec"]:
+        print(f"speedup: x{results[1]['pages_per_sec'] / results[0]['pages_per_sec']:.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""So sánh peak RSS khi OCR + caption tài liệu nhiều ảnh: base64 tạo ngay khi render (cũ) và ảnh giữ dạng
+file / bytes, chỉ base64 lúc gửi request, ảnh trang giải phóng khi các request của trang đã xong (mới).
+
+    python -m benchmarks.bench_image_memory --pages 60 --images-per-page 4
+
+Chế độ eager giả lập model cũ: DocPageModel / DocImageModel mang chuỗi base64 từ lúc render đến khi model
+bị thu hồi. LLM là bản giả trong benchmarks.fakes. Mỗi chế độ chạy trong một process riêng.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+def use_eager_models():
+    import base64
+    from typing import Dict, List, Optional
+
+    from services.process_document.utils import DocImageModel, DocPageModel, doc_extractor
+
+    class EagerDocImageModel(DocImageModel):
+        base64: str
+
+        def to_llm_image(self) -> Dict[str, str]:
+            return {"base64": self.base64, "mime_type": self.mime_type}
+
+    class EagerDocPageModel(DocPageModel):
+        base64: Optional[str] = None
+        images: List[EagerDocImageModel]
+
+        def to_llm_image(self) -> Dict[str, str]:
+            return {"base64": self.base64, "mime_type": self.mime_type}
+
+        def release(self):
+            pass
+
+    to_page_model = doc_extractor._to_page_model
+
+    def eager_page_model(page: dict) -> DocPageModel:
+        model = to_page_model(page)
+        images = []
+        for img in model.images:
+            with open(img.local_path, "rb") as f:
+                images.append(EagerDocImageModel(**img.model_dump(), base64=base64.b64encode(f.read()).decode("utf-8")))
+        page_base64 = base64.b64encode(model.image_data).decode("utf-8") if model.has_image else None
+        return EagerDocPageModel(**model.model_dump(exclude={"images"}), images=images, base64=page_base64)
+
+    doc_extractor._to_page_model = eager_page_model
+
+def run_child(mode: str, pdf_path: str, output_dir: str, latency: float) -> dict:
+    from benchmarks.fakes import FakeTextLLM, FakeVisionLLM
+    from services import llm_service
+    from services.process_document.document_processor import document_processor
+    from services.process_document.utils import IngestionProgress, image_caption_service, ocr_service
+
+    if mode == "eager":
+        use_eager_models()
+    llm_service.vision_llm = FakeVisionLLM(latency, per_image_latency=0)
+    llm_service.text_llm = FakeTextLLM(latency=0)
+    ocr_service.cache_enabled = False
+    image_caption_service.cache_enabled = False
+
+    progress = IngestionProgress()
+    started = time.perf_counter()
+    documents = document_processor.process_document(pdf_path, os.path.basename(pdf_path), output_dir, progress=progress)
+    return {
+        "mode": mode,
+        "pages": progress.get("pages_total"),
+        "images": progress.get("caption_images"),
+        "documents": len(documents),
+        "seconds": round(time.perf_counter() - started, 2),
+        # Linux: ru_maxrss tính bằng KB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--images-per-page", type=int, default=4)
+    parser.add_argument("--scanned-every", type=int, default=2, help="Mỗi N trang có một trang scan")
+    parser.add_argument("--latency", type=float, default=0.2, help="Độ trễ mỗi request LLM (giây)")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--child", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.pdf, args.output_dir, args.latency)))
+        return
+
+    from benchmarks.synthetic_pdf import generate_pdf
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = generate_pdf(
+            os.path.join(tmp_dir, "images.pdf"), args.pages,
+            images_per_page=args.images_per_page, scanned_every=args.scanned_every,
+        )
+        results = []
+        for mode in ("eager", "lazy"):
+            completed = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.bench_image_memory",
+                    "--child", mode, "--pdf", pdf_path, "--output-dir", os.path.join(tmp_dir, mode),
+                    "--latency", str(args.latency),
+                ],
+                check=True, capture_output=True, text=True,
+            )
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    # Hai chế độ phải ra cùng kết quả
+    assert results[0]["documents"] == results[1]["documents"], results
+
+    for result in results:
+        print(f"{result['mode']:>6}: {result['pages']} pages, {result['images']} images in {result['seconds']}s, "
+              f"peak RSS {result['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Bộ benchmark throughput ingest chạy offline: mọi provider (OCR / caption, phân cấp section, embedding)
+là bản giả có độ trễ và tỉ lệ lỗi cấu hình được, Qdrant chạy trong bộ nhớ.
+
+    python -m benchmarks.bench_ingestion_suite --pages 40 --output ingestion_suite.json
+    python -m benchmarks.bench_ingestion_suite --scenarios scanned,mixed --vision-error-rate 0.05 --seed 1
+
+Mỗi kịch bản là một tài liệu tổng hợp, chạy trong một process riêng để peak RSS không ảnh hưởng lẫn nhau:
+- text: trang có text layer và header, không ảnh
+- images: trang text kèm ảnh minh họa (caption)
+- scanned: toàn bộ trang scan (OCR bằng vision LLM)
+- mixed: trang text kèm ảnh, cứ mỗi --scanned-every trang có một trang scan
+- docx: DOCX có heading và ảnh (đọc trực tiếp, không có khái niệm trang)
+
+--target source chạy SourceService.process_file (tách chunk + embed + upsert), --target processor chỉ chạy
+DocumentProcessor. Kết quả mỗi kịch bản: pages/sec, số lần gọi LLM mỗi trang, peak RSS và thời gian cộng dồn
+của từng stage (các stage chạy chồng lên nhau khi pipeline nên tổng có thể lớn hơn thời gian thực).
+Cùng --seed thì tài liệu và các request bị lỗi giả lập giống hệt nhau giữa các lần chạy.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ["text", "images", "scanned", "mixed", "docx"]
+
+# Stage -> tiền tố metric thời gian (`{prefix}.seconds`)
+STAGE_METRICS = {
+    "render": "ingestion.render",
+    "ocr": "ingestion.ocr",
+    "caption": "ingestion.caption",
+    "tree": "ingestion.tree",
+    "chunk": "ingestion.chunk",
+    "embed": "embedding",
+    "upsert": "qdrant.upsert.request",
+}
+
+def generate_document(scenario: str, directory: str, pages: int, scanned_every: int, seed: int) -> str:
+    if scenario == "docx":
+        from benchmarks.synthetic_docx import generate_docx
+        return generate_docx(os.path.join(directory, "docx.docx"), max(1, pages // 2), images_per_chapter=1, seed=seed)
+
+    from benchmarks.synthetic_pdf import generate_pdf
+    options = {
+        "text": {},
+        "images": {"images_per_page": 2},
+        "scanned": {"scanned": True},
+        "mixed": {"images_per_page": 1, "scanned_every": scanned_every},
+    }[scenario]
+    return generate_pdf(os.path.join(directory, f"{scenario}.pdf"), pages, seed=seed, **options)
+
+def run_child(scenario: str, file_path: str, output_dir: str, args) -> dict:
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+
+    from benchmarks.fakes import FakeEmbeddings, FakeTextLLM, FakeVisionLLM, InMemoryCache, SlowQdrantClient
+    from core import config, metrics
+    from services import embedding_service, llm_service, qdrant_service, source_service
+    from services.process_document.document_processor import document_processor
+    from services.process_document.utils import IngestionProgress, image_caption_service, ocr_service
+
+    vision_llm = FakeVisionLLM(args.vision_latency, args.per_image_latency,
+                               error_rate=args.vision_error_rate, seed=args.seed)
+    text_llm = FakeTextLLM(args.text_latency, error_rate=args.text_error_rate, seed=args.seed)
+    embeddings = FakeEmbeddings(config.qdrant_embedding_dim, args.embed_latency,
+                                error_rate=args.embed_error_rate, seed=args.seed)
+
+    llm_service.vision_llm = vision_llm
+    llm_service.text_llm = text_llm
+    embedding_service.embeddings = embeddings
+    embedding_service.cache = InMemoryCache()
+    embedding_service.cache_enabled = False
+    ocr_service.cache_enabled = False
+    image_caption_service.cache_enabled = False
+    source_service.checkpoint_enabled = False
+    qdrant_service.client = SlowQdrantClient(qdrant_service.client, args.upsert_latency)
+    document_processor.pipelined = not args.no_pipeline
+    source_service.pipelined = not args.no_pipeline
+
+    source_id = 1
+    progress = IngestionProgress()
+    before = metrics.snapshot()["counters"]
+    error = None
+    started = time.perf_counter()
+    try:
+        if args.target == "source":
+            source_service.process_file(file_path, os.path.basename(file_path), source_id, output_dir, progress=progress)
+        else:
+            document_processor.process_document(file_path, os.path.basename(file_path), output_dir, progress=progress)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - started
+    after = metrics.snapshot()["counters"]
+
+    points = None
+    if args.target == "source":
+        points = qdrant_service.client.count(
+            collection_name=qdrant_service.collection_name,
+            count_filter=Filter(must=[FieldCondition(key="source_id", match=MatchValue(value=source_id))]),
+        ).count
+
+    pages = progress.get("pages_total")
+    chunks = progress.get("chunks_total")
+    llm_calls = vision_llm.requests + text_llm.requests
+    return {
+        "scenario": scenario,
+        "target": args.target,
+        "status": "ok" if error is None else "error",
+        "error": error,
+        "pages": pages,
+        "chunks": chunks,
+        "points": points,
+        "seconds": round(seconds, 3),
+        "pages_per_sec": round(pages / seconds, 2) if pages else None,
+        "chunks_per_sec": round(chunks / seconds, 2) if chunks else None,
+        "llm_calls": {
+            "vision": vision_llm.requests,
+            "text": text_llm.requests,
+            "embedding": embeddings.calls,
+        },
+        "llm_calls_per_page": round(llm_calls / pages, 3) if pages else None,
+        "errors_injected": {
+            "vision": vision_llm.errors.errors,
+            "text": text_llm.errors.errors,
+            "embedding": embeddings.errors.errors,
+        },
+        "pages_failed": progress.get("pages_failed"),
+        "captions_failed": progress.get("captions_failed"),
+        # Linux: ru_maxrss tính bằng KB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stage_seconds": {
+            stage: round(after.get(f"{prefix}.seconds", 0) - before.get(f"{prefix}.seconds", 0), 3)
+            for stage, prefix in STAGE_METRICS.items()
+        },
+        "progress": progress.snapshot(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Danh sách kịch bản, trong số: {SCENARIOS}")
+    parser.add_argument("--target", choices=["source", "processor"], default="source")
+    parser.add_argument("--scanned-every", type=int, default=4, help="Kịch bản mixed: mỗi N trang có một trang scan")
+    parser.add_argument("--no-pipeline", action="store_true", help="Chạy tuần tự từng stage thay vì pipeline")
+    parser.add_argument("--vision-latency", type=float, default=0.5, help="Độ trễ mỗi request OCR / caption (giây)")
+    parser.add_argument("--per-image-latency", type=float, default=0.05, help="Độ trễ thêm mỗi ảnh trong request (giây)")
+    parser.add_argument("--text-latency", type=float, default=1.0, help="Độ trễ request phân cấp section (giây)")
+    parser.add_argument("--embed-latency", type=float, default=0.3, help="Độ trễ mỗi batch embedding (giây)")
+    parser.add_argument("--upsert-latency", type=float, default=0.05, help="Độ trễ mỗi lần upsert Qdrant (giây)")
+    parser.add_argument("--vision-error-rate", type=float, default=0.0)
+    parser.add_argument("--text-error-rate", type=float, default=0.0)
+    parser.add_argument("--embed-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="ingestion_suite.json", help="File JSON ghi kết quả")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.file, args.output_dir, args), ensure_ascii=False))
+        return
+
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scenario in scenarios:
+            file_path = generate_document(scenario, tmp_dir, args.pages, args.scanned_every, args.seed)
+            completed = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.bench_ingestion_suite", *sys.argv[1:],
+                    "--child", scenario, "--file", file_path, "--output-dir", os.path.join(tmp_dir, scenario),
+                ],
+                check=True, capture_output=True, text=True,
+            )
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            if args.target == "source" and result["status"] == "ok":
+                # Mọi chunk phải nằm trong Qdrant sau khi ingest xong
+                assert result["points"] == result["chunks"], result
+            results.append(result)
+
+    for result in results:
+        stages = ", ".join(f"{stage} {seconds}s" for stage, seconds in result["stage_seconds"].items() if seconds)
+        print(
+            f"{result['scenario']:>8}: {result['status']}, {result['pages']} pages, {result['chunks']} chunks "
+            f"in {result['seconds']}s ({result['pages_per_sec']} pages/sec), "
+            f"{result['llm_calls_per_page']} LLM calls/page, peak RSS {result['peak_rss_mb']} MB"
+        )
+        print(f"{'':>10}{stages}")
+        if result["error"]:
+            print(f"{'':>10}{result['error']}")
+
+    config = {key: value for key, value in vars(args).items() if key not in {"child", "file", "output_dir"}}
+    with open(args.output, "w") as f:
+        json.dump({"config": config, "scenarios": results}, f, indent=2, ensure_ascii=False)
+    print(f"saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""So sánh giới hạn request đồng thời cố định với AdaptiveLimiter (AIMD) khi provider giới hạn tải.
+
+    python -m benchmarks.bench_llm_adaptive --requests 600 --capacity 24 --latency 0.3
+
+Provider giả (benchmarks.fakes.FakeVisionLLM + ThrottleSimulator) nhận tối đa --capacity request cùng lúc,
+vượt quá thì trả 429 kèm Retry-After; xong một nửa số request thì capacity giảm còn một nửa (hết quota).
+Các chế độ:
+- fixed-initial: giới hạn cố định --initial (như max_concurrent=3 trước đây)
+- fixed-max: giới hạn cố định --max-concurrent, vượt capacity nên bị 429 liên tục
+- adaptive: bắt đầu từ --initial, tự tăng / giảm trong [1, --max-concurrent]
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks.fakes import FakeVisionLLM, ThrottleSimulator
+from services.llm.srv_llm import LLMService
+
+class LimitSampler:
+    """Lấy mẫu limit của limiter theo thời gian"""
+    def __init__(self, limiter, interval: float = 0.25):
+        self.limiter = limiter
+        self.interval = interval
+        self.samples = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self.samples.append((round(time.perf_counter() - self._started, 2), self.limiter.limit))
+            if self._stopped.wait(self.interval):
+                return
+
+def run(mode: str, args, initial: int, adaptive: bool) -> dict:
+    throttle = ThrottleSimulator(args.capacity, retry_after=args.retry_after)
+    fake_llm = FakeVisionLLM(args.latency, per_image_latency=0, throttle=throttle)
+    service = LLMService(
+        max_concurrent=args.max_concurrent,
+        vision_llm=fake_llm,
+        initial_concurrent=initial,
+        adaptive=adaptive,
+        max_retries=args.retries,
+    )
+    tasks = [("image_captioning_v2", {"images": [f"page-{index}"]}) for index in range(args.requests)]
+
+    done = 0
+    def on_result(idx, result, error):
+        nonlocal done
+        done += 1
+        # Provider hết quota giữa chừng
+        if done == args.requests // 2:
+            throttle.capacity = max(1, args.capacity // 2)
+
+    with LimitSampler(service.limiters["vision"]) as sampler:
+        started = time.perf_counter()
+        results = service.batch_get_chat_completion(tasks, on_result=on_result)
+        seconds = time.perf_counter() - started
+    service.shutdown()
+
+    failed = sum(1 for _, _, error in results if error is not None)
+    return {
+        "mode": mode,
+        "requests": args.requests,
+        "failed": failed,
+        "throttled": throttle.throttled,
+        "seconds": round(seconds, 2),
+        "requests_per_sec": round((args.requests - failed) / seconds, 1),
+        "peak_provider_in_flight": throttle.peak_in_flight,
+        "final_limit": service.limiters["vision"].limit,
+        "limit_samples": sampler.samples,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--capacity", type=int, default=24, help="Số request đồng thời provider nhận được")
+    parser.add_argument("--latency", type=float, default=0.3, help="Độ trễ mỗi request (giây)")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After trả về kèm 429 (giây)")
+    parser.add_argument("--initial", type=int, default=3)
+    parser.add_argument("--max-concurrent", type=int, default=64)
+    parser.add_argument("--retries", type=int, default=3, help="Số lần gửi lại request bị 429")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    results = [
+        run(f"fixed-{args.initial}", args, args.initial, adaptive=False),
+        run(f"fixed-{args.max_concurrent}", args, args.max_concurrent, adaptive=False),
+        run("adaptive", args, args.initial, adaptive=True),
+    ]
+
+    # Adaptive phải không làm hỏng request nào và nhanh hơn giới hạn cố định ban đầu
+    assert results[2]["failed"] == 0, results[2]
+    assert results[2]["seconds"] < results[0]["seconds"], results
+
+    for result in results:
+        print(f"{result['mode']:>10}: {result['requests_per_sec']} req/sec in {result['seconds']}s, "
+              f"{result['failed']} failed, {result['throttled']} throttled (429), "
+              f"peak provider in-flight {result['peak_provider_in_flight']}, final limit {result['final_limit']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
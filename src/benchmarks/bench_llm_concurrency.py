@@ -0,0 +1,96 @@
+"""So sánh gọi LLM bằng thread pool (mỗi request đang chờ provider giữ một thread, như LLMService trước đây)
+với LLMService async (request là coroutine trên một event loop, giới hạn bằng asyncio.Semaphore).
+
+    python -m benchmarks.bench_llm_concurrency --requests 400 --concurrency 200 --latency 0.5
+
+LLM là bản giả (benchmarks.fakes.FakeVisionLLM). Kết quả: thời gian, requests/sec và số thread lớn nhất
+của process trong lúc chạy.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeVisionLLM
+from services.llm.get_prompt import get_prompt_by_task
+from services.llm.srv_llm import LLMService
+
+class ThreadSampler:
+    """Lấy mẫu threading.active_count() định kỳ để biết số thread lớn nhất"""
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+def run_threads(service: LLMService, tasks: list, concurrency: int) -> list:
+    # Cách cũ: ThreadPoolExecutor, mỗi request chạy invoke chặn trong một thread
+    def process_single(task: str, params: dict):
+        prompt, parser = get_prompt_by_task(task)
+        messages = prompt.format_messages(retrieved_documents=None) + [
+            service._build_message(params.get("question"), params.get("images"))
+        ]
+        return parser.parse(service.vision_llm.invoke(messages).content).dict()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda item: process_single(*item), tasks))
+
+def run_async(service: LLMService, tasks: list) -> list:
+    return [result for _, result, _ in service.batch_get_chat_completion(tasks)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="Độ trễ mỗi request LLM (giây)")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    fake_llm = FakeVisionLLM(args.latency, per_image_latency=0)
+    service = LLMService(max_concurrent=args.concurrency, vision_llm=fake_llm)
+    tasks = [("image_captioning_v2", {"images": [f"page-{index}"]}) for index in range(args.requests)]
+
+    results, outputs = [], []
+    for mode, run in [
+        ("threads", lambda: run_threads(service, tasks, args.concurrency)),
+        ("asyncio", lambda: run_async(service, tasks)),
+    ]:
+        fake_llm.reset()
+        with ThreadSampler() as sampler:
+            started = time.perf_counter()
+            outputs.append(run())
+            seconds = time.perf_counter() - started
+        results.append({
+            "mode": mode,
+            "requests": fake_llm.requests,
+            "seconds": round(seconds, 2),
+            "requests_per_sec": round(fake_llm.requests / seconds, 1),
+            "peak_threads": sampler.peak,
+        })
+    service.shutdown()
+
+    assert outputs[0] == outputs[1], "LLM output differs between modes"
+
+    for result in results:
+        print(f"{result['mode']:>8}: {result['requests']} requests in {result['seconds']}s "
+              f"({result['requests_per_sec']} req/sec), peak threads {result['peak_threads']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
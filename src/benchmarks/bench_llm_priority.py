@@ -0,0 +1,142 @@
+"""Độ trễ chat khi đang ingest tài liệu lớn: một hàng đợi chung (FIFO) so với limiter có độ ưu tiên
+(interactive / bulk), slot dành riêng cho chat và fair queuing theo user.
+
+    python -m benchmarks.bench_llm_priority --limit 8 --big-pages 1200 --small-pages 60 --chats 40
+
+Chạy trực tiếp trên AdaptiveLimiter với request giả (asyncio.sleep), không qua provider:
+- user "big" upload tài liệu --big-pages trang scan, user "small" upload --small-pages trang ngay sau đó
+- --chats lượt chat (mỗi lượt 1 request --chat-latency giây) từ --chat-users user, đến đều trong lúc ingest
+Kịch bản starvation: chat gửi liên tục, đủ chiếm hết slot; ingest vẫn phải được cấp ít nhất một slot
+mỗi --bulk-max-wait giây.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from services.llm.limiter import BULK, INTERACTIVE, AdaptiveLimiter
+
+def percentile(values: list, value: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * value / 100))]
+
+async def request(limiter: AdaptiveLimiter, latency: float, priority: str, client: str) -> float:
+    """Gửi một request qua limiter, trả về thời gian chờ slot"""
+    queued = time.perf_counter()
+    started = await limiter.acquire(priority=priority, client=client)
+    waited = time.perf_counter() - queued
+    try:
+        await asyncio.sleep(latency)
+    finally:
+        limiter.release(started)
+    return waited
+
+async def ingest(limiter: AdaptiveLimiter, pages: int, latency: float, priority: str, client: str) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(request(limiter, latency, priority, client) for _ in range(pages)))
+    return time.perf_counter() - started
+
+async def run_mixed(mode: str, args) -> dict:
+    prioritized = mode == "priority"
+    limiter = AdaptiveLimiter(
+        f"bench-{mode}", initial=args.limit, max_limit=args.limit, adaptive=False,
+        interactive_reserve=args.reserve if prioritized else 0, bulk_max_wait=args.bulk_max_wait,
+    )
+
+    def admission(priority: str, client: str):
+        # FIFO: mọi request chung một hàng đợi như semaphore trước đây
+        return (priority, client) if prioritized else (BULK, "default")
+
+    async def chat(index: int) -> float:
+        await asyncio.sleep(index * args.chat_interval)
+        return await request(limiter, args.chat_latency, *admission(INTERACTIVE, f"chat-{index % args.chat_users}"))
+
+    started = time.perf_counter()
+    big = asyncio.ensure_future(ingest(limiter, args.big_pages, args.page_latency, *admission(BULK, "big")))
+    await asyncio.sleep(0)
+    small = asyncio.ensure_future(ingest(limiter, args.small_pages, args.page_latency, *admission(BULK, "small")))
+    chat_waits = await asyncio.gather(*(chat(index) for index in range(args.chats)))
+    big_seconds, small_seconds = await asyncio.gather(big, small)
+
+    return {
+        "scenario": "mixed",
+        "mode": mode,
+        "seconds": round(time.perf_counter() - started, 2),
+        "chat_wait_p50": round(percentile(chat_waits, 50), 3),
+        "chat_wait_p99": round(percentile(chat_waits, 99), 3),
+        "chat_wait_max": round(max(chat_waits), 3),
+        "big_ingest_seconds": round(big_seconds, 2),
+        "small_ingest_seconds": round(small_seconds, 2),
+    }
+
+async def run_starvation(args) -> dict:
+    limiter = AdaptiveLimiter(
+        "bench-starvation", initial=args.limit, max_limit=args.limit, adaptive=False,
+        interactive_reserve=args.reserve, bulk_max_wait=args.bulk_max_wait,
+    )
+    stopped = False
+
+    async def chat_loop(user: int):
+        while not stopped:
+            await request(limiter, args.chat_latency, INTERACTIVE, f"chat-{user}")
+
+    # Nhiều luồng chat hơn số slot: luôn có chat đang chờ
+    chats = [asyncio.ensure_future(chat_loop(user)) for user in range(args.limit * 2)]
+    await asyncio.sleep(0)
+    bulk_waits = await asyncio.gather(*(request(limiter, args.page_latency, BULK, "big") for _ in range(args.starved_pages)))
+    stopped = True
+    await asyncio.gather(*chats)
+    return {
+        "scenario": "starvation",
+        "mode": "priority",
+        "bulk_requests": len(bulk_waits),
+        "bulk_wait_min": round(min(bulk_waits), 3),
+        "bulk_wait_max": round(max(bulk_waits), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=8, help="Số request đồng thời tới provider")
+    parser.add_argument("--reserve", type=int, default=1, help="Số slot chỉ dành cho chat")
+    parser.add_argument("--big-pages", type=int, default=1200)
+    parser.add_argument("--small-pages", type=int, default=60)
+    parser.add_argument("--page-latency", type=float, default=0.05, help="Độ trễ mỗi request OCR (giây)")
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--chat-users", type=int, default=5)
+    parser.add_argument("--chat-interval", type=float, default=0.15, help="Khoảng cách giữa các lượt chat (giây)")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="Độ trễ mỗi request chat (giây)")
+    parser.add_argument("--bulk-max-wait", type=float, default=1.0, help="Bulk không được cấp slot trong thời gian này thì được ưu tiên (giây)")
+    parser.add_argument("--starved-pages", type=int, default=4, help="Số request ingest trong kịch bản starvation")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(run_mixed("fifo", args)),
+        asyncio.run(run_mixed("priority", args)),
+        asyncio.run(run_starvation(args)),
+    ]
+    fifo, priority, starvation = results
+
+    # Chat không phải chờ sau hàng đợi ingest, user nhỏ không phải chờ user lớn ingest xong
+    assert priority["chat_wait_p99"] < fifo["chat_wait_p99"], results
+    assert priority["chat_wait_max"] <= args.chat_latency * 2, priority
+    assert priority["small_ingest_seconds"] < fifo["small_ingest_seconds"], results
+    # Chat chiếm hết slot thì bulk vẫn được cấp một slot sau mỗi khoảng bulk_max_wait
+    slack = args.chat_latency * 4
+    assert starvation["bulk_wait_min"] < args.bulk_max_wait + slack, starvation
+    assert starvation["bulk_wait_max"] < args.starved_pages * (args.bulk_max_wait + slack), starvation
+
+    for result in results[:2]:
+        print(f"{result['mode']:>8}: chat wait p50 {result['chat_wait_p50']}s / p99 {result['chat_wait_p99']}s "
+              f"/ max {result['chat_wait_max']}s, ingest big {result['big_ingest_seconds']}s, "
+              f"small {result['small_ingest_seconds']}s, total {result['seconds']}s")
+    print(f"starvation: {starvation['bulk_requests']} bulk requests under chat flood, "
+          f"first after {starvation['bulk_wait_min']}s, last after {starvation['bulk_wait_max']}s "
+          f"(bulk_max_wait {args.bulk_max_wait}s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
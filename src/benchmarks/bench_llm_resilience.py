@@ -0,0 +1,123 @@
+"""So sánh tỉ lệ trang OCR lỗi và thời gian xử lý tài liệu (p50 / p99) khi provider có lỗi tạm thời,
+response hỏng và đuôi độ trễ, với các mức bảo vệ của LLMService.
+
+    python -m benchmarks.bench_llm_resilience --documents 40 --pages 20 --error-rate 0.05 --slow-rate 0.02
+
+Provider giả (benchmarks.fakes.FakeVisionLLM): --error-rate request trả 503, --malformed-rate response là
+JSON hỏng, --slow-rate request chậm thêm --slow-latency giây. Mỗi tài liệu là một batch OCR từng trang
+(như OcrService), --workers tài liệu chạy cùng lúc. Các chế độ:
+- none: không retry, không re-prompt, không hedge (trang lỗi bị bỏ)
+- retry: retry có jitter + re-prompt + deadline mỗi task
+- retry+hedge: thêm hedged request sau độ trễ percentile --hedge-percentile
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeVisionLLM
+from core import metrics
+from services.llm.srv_llm import LLMService
+
+def percentile(values: list, value: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * value / 100))]
+
+def run(mode: str, args, resilient: bool, hedge: bool) -> dict:
+    fake_llm = FakeVisionLLM(
+        args.latency, per_image_latency=0,
+        error_rate=args.error_rate, malformed_rate=args.malformed_rate,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency, seed=args.seed,
+    )
+    service = LLMService(
+        max_concurrent=args.max_concurrent,
+        vision_llm=fake_llm,
+        max_retries=args.retries if resilient else 0,
+        retry_backoff=args.backoff,
+        parse_retries=1 if resilient else 0,
+        hedge_percentile=args.hedge_percentile if hedge else 0,
+        deadline=args.deadline if resilient else 0,
+    )
+
+    def process_document(document: int):
+        tasks = [
+            ("image_captioning_v2", {"images": [f"document-{document}-page-{page}"]})
+            for page in range(args.pages)
+        ]
+        started = time.perf_counter()
+        results = service.batch_get_chat_completion(tasks)
+        return time.perf_counter() - started, sum(1 for _, _, error in results if error is not None)
+
+    before = metrics.snapshot()["counters"]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        documents = list(executor.map(process_document, range(args.documents)))
+    seconds = time.perf_counter() - started
+    service.shutdown()
+    after = metrics.snapshot()["counters"]
+
+    def counter(name: str) -> int:
+        return after.get(f"llm.vision.{name}", 0) - before.get(f"llm.vision.{name}", 0)
+
+    document_seconds = [document_seconds for document_seconds, _ in documents]
+    failed = sum(failed for _, failed in documents)
+    total = args.documents * args.pages
+    return {
+        "mode": mode,
+        "pages": total,
+        "failed_pages": failed,
+        "failure_rate": round(failed / total, 4),
+        "seconds": round(seconds, 2),
+        "document_p50": round(percentile(document_seconds, 50), 2),
+        "document_p99": round(percentile(document_seconds, 99), 2),
+        "requests": fake_llm.requests,
+        "retries": counter("retries"),
+        "reprompts": counter("reprompts"),
+        "hedged": counter("hedged"),
+        "hedge_wins": counter("hedge_wins"),
+        "deadline_exceeded": counter("deadline_exceeded"),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=20, help="Số trang scan mỗi tài liệu")
+    parser.add_argument("--workers", type=int, default=2, help="Số tài liệu xử lý cùng lúc")
+    parser.add_argument("--latency", type=float, default=0.2, help="Độ trễ mỗi request (giây)")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--malformed-rate", type=float, default=0.03)
+    parser.add_argument("--slow-rate", type=float, default=0.02)
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="Độ trễ thêm của request chậm (giây)")
+    parser.add_argument("--max-concurrent", type=int, default=64)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.2, help="Backoff cơ sở khi retry (giây)")
+    parser.add_argument("--hedge-percentile", type=float, default=95)
+    parser.add_argument("--deadline", type=float, default=30, help="Deadline mỗi task (giây)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    results = [
+        run("none", args, resilient=False, hedge=False),
+        run("retry", args, resilient=True, hedge=False),
+        run("retry+hedge", args, resilient=True, hedge=True),
+    ]
+
+    # Retry + re-prompt phải giảm số trang lỗi, hedge phải giảm p99 thời gian xử lý tài liệu
+    if args.error_rate or args.malformed_rate:
+        assert results[1]["failure_rate"] < results[0]["failure_rate"], results
+    if args.slow_rate:
+        assert results[2]["document_p99"] < results[1]["document_p99"], results
+
+    for result in results:
+        print(f"{result['mode']:>11}: {result['failed_pages']}/{result['pages']} pages failed, "
+              f"document p50 {result['document_p50']}s / p99 {result['document_p99']}s, total {result['seconds']}s, "
+              f"{result['requests']} requests ({result['retries']} retries, {result['reprompts']} re-prompts, "
+              f"{result['hedged']} hedged / {result['hedge_wins']} won)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""So sánh số request LLM / tài liệu và thời gian OCR khi gộp N trang scan vào một request.
+
+    python -m benchmarks.bench_ocr_batching --pages 40 --pages-per-request 1 2 4 8
+
+Dùng model giả (benchmarks.fakes.FakeVisionLLM) nên không tốn API, độ trễ chỉnh bằng --latency.
+--fail-every N làm hỏng mỗi request gộp thứ N để đo chi phí fallback về từng trang,
+--drop-page-every N làm response của mỗi request gộp thứ N thiếu trang cuối (trang đó được OCR lại riêng).
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import FakeVisionLLM
+from benchmarks.synthetic_pdf import generate_pdf
+from services import llm_service
+from services.process_document.utils.doc_extractor import DocExtractor
+from services.process_document.utils.ocr import OcrService
+from services.process_document.utils.progress import IngestionProgress
+
+def run(pages_per_request: int, pdf_path: str, output_dir: str, fake_llm: FakeVisionLLM, window: int) -> dict:
+    fake_llm.reset()
+    progress = IngestionProgress()
+    ocr = OcrService(window_size=window, cache_enabled=False, pages_per_request=pages_per_request)
+
+    started = time.perf_counter()
+    pages = DocExtractor().iter_pdf_pages(pdf_path, output_dir)
+    nodes = ocr.ocr_pages(pages, pdf_path, os.path.basename(pdf_path), progress)
+    seconds = time.perf_counter() - started
+
+    return {
+        "pages_per_request": pages_per_request,
+        "pages": progress.get("pages_vision"),
+        "pages_ocr": progress.get("pages_ocr"),
+        "nodes": len(nodes),
+        "requests": fake_llm.requests,
+        "fallbacks": progress.get("ocr_batch_fallbacks"),
+        "seconds": round(seconds, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--pages-per-request", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--window", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="Độ trễ cố định mỗi request (giây)")
+    parser.add_argument("--per-image-latency", type=float, default=0.1, help="Độ trễ thêm cho mỗi ảnh (giây)")
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--drop-page-every", type=int, default=3)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    fake_llm = FakeVisionLLM(args.latency, args.per_image_latency, args.fail_every, drop_page_every=args.drop_page_every)
+    llm_service.vision_llm = fake_llm
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = generate_pdf(os.path.join(tmp_dir, "scanned.pdf"), args.pages, scanned=True)
+        for pages_per_request in args.pages_per_request:
+            result = run(pages_per_request, pdf_path, os.path.join(tmp_dir, str(pages_per_request)), fake_llm, args.window)
+            # Mọi chế độ phải OCR đủ trang (trang fallback chỉ đếm một lần) và ra cùng số node
+            assert result["pages_ocr"] == args.pages, result
+            if results:
+                assert result["nodes"] == results[0]["nodes"], result
+            results.append(result)
+
+    for result in results:
+        print(f"pages/request={result['pages_per_request']:>2}: {result['requests']} requests/document "
+              f"({result['fallbacks']} fallbacks), {result['nodes']} nodes in {result['seconds']}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
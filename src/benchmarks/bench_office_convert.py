@@ -0,0 +1,96 @@
+"""So sánh độ trễ convert DOCX -> PDF: soffice cold mỗi file với pool LibreOffice chạy sẵn.
+
+    python -m benchmarks.bench_office_convert --corpus ./samples --repeat 3
+
+Không truyền --corpus thì dùng một bộ DOCX tổng hợp. Các chế độ:
+- cold: mỗi file một process soffice với profile mới (như `libreoffice --convert-to` trước đây)
+- cold-profile: mỗi file một process soffice, dùng lại profile đã khởi tạo
+- warm: OfficeConverterService, instance đã khởi động trước khi đo (cần interpreter có module uno)
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from services.office import OfficeConverterService
+
+def summarize(mode: str, latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "mode": mode,
+        "conversions": len(latencies),
+        "mean": round(statistics.mean(latencies), 3),
+        "p50": round(latencies[len(latencies) // 2], 3),
+        "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+    }
+
+def run(mode: str, convert, docx_paths: list[str], output_dir: str, repeat: int) -> dict:
+    latencies = []
+    for _ in range(repeat):
+        for docx_path in docx_paths:
+            started = time.perf_counter()
+            pdf_path = convert(docx_path, output_dir)
+            latencies.append(time.perf_counter() - started)
+            assert os.path.getsize(pdf_path) > 0, f"{mode}: empty PDF for {docx_path}"
+            os.remove(pdf_path)
+    return summarize(mode, latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Thư mục chứa các file DOCX mẫu")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--soffice", default="soffice")
+    parser.add_argument("--uno-python", default="/usr/bin/python3")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.corpus:
+            docx_paths = sorted(glob.glob(os.path.join(args.corpus, "**", "*.docx"), recursive=True))
+        else:
+            from benchmarks.synthetic_docx import generate_docx
+            docx_paths = [
+                generate_docx(os.path.join(tmp_dir, "corpus", f"doc_{i}.docx"), 10, images_per_chapter=1, seed=i)
+                for i in range(3)
+            ]
+        output_dir = os.path.join(tmp_dir, "pdf")
+
+        service = OfficeConverterService(
+            pool_size=1,
+            soffice_bin=args.soffice,
+            uno_python=args.uno_python,
+            profile_dir=os.path.join(tmp_dir, "profiles"),
+        )
+        reused_profile = os.path.join(tmp_dir, "cold-profile")
+
+        results = [
+            run("cold", lambda path, out: service.convert_cold(path, out), docx_paths, output_dir, args.repeat),
+            run("cold-profile", lambda path, out: service.convert_cold(path, out, profile_dir=reused_profile),
+                docx_paths, output_dir, args.repeat),
+        ]
+
+        if service.warm_available:
+            # Lần convert đầu khởi động instance, không tính vào kết quả
+            started = time.perf_counter()
+            os.remove(service.convert_to_pdf(docx_paths[0], output_dir))
+            print(f"warm pool start + first conversion: {time.perf_counter() - started:.2f}s")
+            results.append(run("warm", service.convert_to_pdf, docx_paths, output_dir, args.repeat))
+        else:
+            print(f"skip warm: '{args.uno_python}' cannot import uno")
+        service.shutdown()
+
+    for result in results:
+        print(f"{result['mode']:>12}: {result['conversions']} conversions, mean {result['mean']}s, "
+              f"p50 {result['p50']}s, p95 {result['p95']}s")
+    if len(results) == 3:
+        print(f"warm speedup (mean): x{results[0]['mean'] / results[2]['mean']:.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
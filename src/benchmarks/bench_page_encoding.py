@@ -0,0 +1,73 @@
+"""So sánh kích thước ảnh trang gửi LLM (bytes/page) và thời gian render giữa các cách encode.
+
+    python -m benchmarks.bench_page_encoding --corpus ./samples
+
+Không truyền --corpus thì dùng PDF tổng hợp: một file scan và một file text có ảnh minh họa.
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+
+import fitz
+
+from utils.pdf_render import PageEncoding, RenderOptions, render_page
+
+ENCODINGS = {
+    "png@144": PageEncoding(dpi=144, max_dpi=144, image_format="png"),
+    "jpeg@144": PageEncoding(dpi=144, max_dpi=200, image_format="jpeg", quality=85),
+    "webp@144": PageEncoding(dpi=144, max_dpi=200, image_format="webp", quality=80),
+    "jpeg@96": PageEncoding(dpi=96, max_dpi=96, image_format="jpeg", quality=70, max_edge=1280),
+}
+
+def run(name: str, encoding: PageEncoding, pdf_paths: list[str], output_dir: str) -> dict:
+    # Ép render ảnh toàn trang cho mọi trang để so sánh trên cùng tập trang
+    options = RenderOptions(ocr_encoding=encoding, text_layer_enabled=False)
+    pages, total_bytes = 0, 0
+    started = time.perf_counter()
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            for page_index in range(len(doc)):
+                page = render_page(doc, page_index, output_dir, options)
+                pages += 1
+                total_bytes += page["encoded_bytes"]
+    seconds = time.perf_counter() - started
+    return {
+        "encoding": name,
+        "pages": pages,
+        "bytes_per_page": total_bytes // pages if pages else 0,
+        "seconds": round(seconds, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Thư mục chứa các file PDF mẫu")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.corpus:
+            pdf_paths = sorted(glob.glob(os.path.join(args.corpus, "**", "*.pdf"), recursive=True))
+        else:
+            from benchmarks.synthetic_pdf import generate_pdf
+            pdf_paths = [
+                generate_pdf(os.path.join(tmp_dir, "corpus", "scanned.pdf"), 10, scanned=True),
+                generate_pdf(os.path.join(tmp_dir, "corpus", "text.pdf"), 10, images_per_page=1),
+            ]
+
+        output_dir = os.path.join(tmp_dir, "images")
+        os.makedirs(output_dir, exist_ok=True)
+        results = [run(name, encoding, pdf_paths, output_dir) for name, encoding in ENCODINGS.items()]
+
+    for result in results:
+        print(f"{result['encoding']:>10}: {result['bytes_per_page'] / 1024:.1f} KiB/page, "
+              f"{result['pages']} pages in {result['seconds']}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
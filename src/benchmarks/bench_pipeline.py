@@ -0,0 +1,84 @@
+"""So sánh thời gian ingest end-to-end (SourceService.process_file) giữa chạy tuần tự từng stage và pipeline.
+
+    python -m benchmarks.bench_pipeline --pages 40 --embedding-batch 8
+
+LLM (OCR + phân cấp section), embedding và Qdrant đều là bản giả trong benchmarks.fakes,
+độ trễ mỗi loại chỉnh bằng --ocr-latency / --tree-latency / --embed-latency / --upsert-latency.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from qdrant_client.models import Filter, FieldCondition, MatchValue
+
+from benchmarks.fakes import FakeEmbeddings, FakeTextLLM, FakeVisionLLM, InMemoryCache, SlowQdrantClient
+from benchmarks.synthetic_pdf import generate_pdf
+from core import config
+from services import embedding_service, llm_service, qdrant_service, source_service
+from services.process_document.document_processor import document_processor
+from services.process_document.utils import IngestionProgress, ocr_service
+
+def run(pipelined: bool, pdf_path: str, output_dir: str, source_id: int) -> dict:
+    document_processor.pipelined = pipelined
+    source_service.pipelined = pipelined
+    progress = IngestionProgress()
+
+    started = time.perf_counter()
+    source_service.process_file(pdf_path, os.path.basename(pdf_path), source_id, output_dir, progress=progress)
+    seconds = time.perf_counter() - started
+
+    points = qdrant_service.client.count(
+        collection_name=qdrant_service.collection_name,
+        count_filter=Filter(must=[FieldCondition(key="source_id", match=MatchValue(value=source_id))]),
+    ).count
+    return {
+        "mode": "pipeline" if pipelined else "barrier",
+        "pages": progress.get("pages_ocr"),
+        "chunks": progress.get("chunks_embedded"),
+        "points": points,
+        "seconds": round(seconds, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--embedding-batch", type=int, default=8)
+    parser.add_argument("--ocr-latency", type=float, default=0.5, help="Độ trễ mỗi request OCR (giây)")
+    parser.add_argument("--tree-latency", type=float, default=1.0, help="Độ trễ request phân cấp section (giây)")
+    parser.add_argument("--embed-latency", type=float, default=0.3, help="Độ trễ mỗi batch embedding (giây)")
+    parser.add_argument("--upsert-latency", type=float, default=0.2, help="Độ trễ mỗi lần upsert Qdrant (giây)")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    llm_service.vision_llm = FakeVisionLLM(args.ocr_latency, per_image_latency=0)
+    llm_service.text_llm = FakeTextLLM(args.tree_latency)
+    embedding_service.embeddings = FakeEmbeddings(config.qdrant_embedding_dim, args.embed_latency)
+    embedding_service.cache = InMemoryCache()
+    embedding_service.cache_enabled = False
+    source_service.embedding_batch = args.embedding_batch
+    source_service.checkpoint_enabled = False
+    ocr_service.cache_enabled = False
+    qdrant_service.client = SlowQdrantClient(qdrant_service.client, args.upsert_latency)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = generate_pdf(os.path.join(tmp_dir, "scanned.pdf"), args.pages, scanned=True)
+        for source_id, pipelined in enumerate([False, True], start=1):
+            result = run(pipelined, pdf_path, os.path.join(tmp_dir, str(source_id)), source_id)
+            # Hai chế độ phải ra cùng số chunk và số point trong Qdrant
+            assert result["points"] == result["chunks"], result
+            if results:
+                assert result["chunks"] == results[0]["chunks"], result
+            results.append(result)
+
+    for result in results:
+        print(f"{result['mode']:>8}: {result['pages']} pages, {result['chunks']} chunks in {result['seconds']}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Chi phí dựng prompt mỗi lần gọi LLM: cách cũ (mỗi lần gọi tạo ChatPromptTemplate, serialize JSON schema của
+parser qua get_format_instructions() và dựng chain `prompt | llm | parser`) so với task_registry dựng sẵn.
+
+    python -m benchmarks.bench_prompt_registry --iterations 2000 --calls-per-document 1000
+
+Đo phần việc trước khi gửi request (không gọi provider) cho các task trên đường ingest: OCR từng trang,
+OCR gộp trang, caption ảnh và phân cấp section. Kết quả: micro giây mỗi lần gọi và thời gian tiết kiệm
+cho --calls-per-document lần gọi (tài liệu vài trăm trang).
+"""
+import argparse
+import json
+import time
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from benchmarks.fakes import FakeTextLLM
+from services.llm.parsers import ocr_parser, ocr_batch_parser, image_captioning_batch_parser, \
+    correct_section_structure_parser
+from services.llm.prompts import ocr_prompt, ocr_batch_prompt, image_captioning_batch_prompt, \
+    correct_section_structure_prompt
+from services.llm.registry import task_registry
+
+# Task trên đường ingest -> (prompt template, parser, params)
+HOT_TASKS = {
+    "image_captioning_v2": (ocr_prompt.prompt, ocr_parser.parser, {}),
+    "ocr_batch": (ocr_batch_prompt.prompt, ocr_batch_parser.parser, {}),
+    "image_captioning_batch": (image_captioning_batch_prompt.prompt, image_captioning_batch_parser.parser, {}),
+    "correct_section_structure": (
+        correct_section_structure_prompt.prompt, correct_section_structure_parser.parser,
+        {"question": "", "sections": [{"index": index, "title": f"Mục {index}", "page": index // 4} for index in range(40)]},
+    ),
+}
+
+def legacy_messages(task: str, params: dict, text_llm) -> list:
+    """Như get_prompt_by_task + LLMService trước khi có registry"""
+    prompt_template, parser, _ = HOT_TASKS[task]
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", prompt_template + "\n{format_instructions}"),
+        ]
+    ).partial(
+        format_instructions=parser.get_format_instructions() if parser else ""
+    )
+    if task_registry.get(task).provider == "text":
+        chain = prompt | text_llm | parser
+        return chain.first.invoke(params).to_messages()
+    return prompt.format_messages(retrieved_documents=None)
+
+def registry_messages(task: str, params: dict, text_llm) -> list:
+    spec = task_registry.get(task)
+    if spec.provider == "text":
+        return spec.prompt.invoke(params).to_messages()
+    return spec.format_messages(retrieved_documents=None)
+
+def measure(build, task: str, params: dict, text_llm, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        build(task, params, text_llm)
+    return (time.perf_counter() - started) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--calls-per-document", type=int, default=1000, help="Số lần gọi LLM khi ingest một tài liệu")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    text_llm = FakeTextLLM(latency=0)
+    results = []
+    for task, (_, _, params) in HOT_TASKS.items():
+        # Hai cách phải gửi đi cùng nội dung
+        legacy = legacy_messages(task, params, text_llm)
+        current = registry_messages(task, params, text_llm)
+        assert [message.content for message in legacy] == [message.content for message in current], task
+
+        legacy_seconds = measure(legacy_messages, task, params, text_llm, args.iterations)
+        registry_seconds = measure(registry_messages, task, params, text_llm, args.iterations)
+        results.append({
+            "task": task,
+            "legacy_us": round(legacy_seconds * 1e6, 1),
+            "registry_us": round(registry_seconds * 1e6, 1),
+            "speedup": round(legacy_seconds / registry_seconds, 1),
+            "saved_ms_per_document": round((legacy_seconds - registry_seconds) * args.calls_per_document * 1000, 1),
+        })
+
+    for result in results:
+        print(f"{result['task']:>26}: {result['legacy_us']} us -> {result['registry_us']} us per call "
+              f"({result['speedup']}x), {result['saved_ms_per_document']} ms saved per "
+              f"{args.calls_per_document} calls")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""So sánh tốc độ upsert Qdrant (points/sec): một request cho cả source, batch tuần tự chờ apply,
+batch song song wait=False kèm barrier ở cuối.
+
+    python -m benchmarks.bench_qdrant_upsert --points 20000 --batch-size 256 --parallel 4
+    python -m benchmarks.bench_qdrant_upsert --url http://localhost:6333 --grpc
+
+Mặc định dùng QdrantClient(":memory:") bọc bởi benchmarks.fakes.SlowQdrantClient để giả lập độ trễ mạng
+(--latency mỗi request) và thời gian apply khi wait=True (--apply-latency mỗi point).
+Truyền --url để chạy với Qdrant thật (ví dụ container local), khi đó không thêm độ trễ giả.
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from benchmarks.fakes import SlowQdrantClient
+from services import qdrant_service
+from services.qdrant import QdrantBaseDocument, QdrantDocumentMetadata
+from services.qdrant.srv_qdrant import QdrantBulkWriter
+
+def generate(count: int, dim: int, seed: int) -> tuple[list[QdrantBaseDocument], list[list[float]]]:
+    rng = random.Random(seed)
+    documents = [
+        QdrantBaseDocument(
+            id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench:chunk:{index}")),
+            content=f"chunk {index} " + " ".join(f"từ{rng.randrange(1000)}" for _ in range(60)),
+            type="text",
+            source_id=1,
+            metadata=QdrantDocumentMetadata(file_path="bench.pdf", filename="bench.pdf", page_start=1, page_end=1),
+        )
+        for index in range(count)
+    ]
+    embeddings = [[rng.random() for _ in range(dim)] for _ in range(count)]
+    return documents, embeddings
+
+def run(name: str, documents, embeddings, batch_size: int, parallel: int, wait: bool) -> dict:
+    qdrant_service.collection_name = f"bench_upsert_{name}"
+    qdrant_service.recreate = True
+    qdrant_service._ensure_collection()
+
+    started = time.perf_counter()
+    if batch_size == 0:
+        # Cách cũ: mọi point của source trong một request, chờ apply
+        qdrant_service.client.upsert(
+            collection_name=qdrant_service.collection_name,
+            points=[
+                PointStruct(id=doc.id, vector=embedding, payload=doc.model_dump(exclude={"id"}))
+                for doc, embedding in zip(documents, embeddings)
+            ],
+        )
+    else:
+        writer = QdrantBulkWriter(qdrant_service, batch_size=batch_size, parallel=parallel, wait=wait)
+        writer.add(documents, embeddings)
+        writer.flush()
+    seconds = time.perf_counter() - started
+
+    # Sau barrier mọi point phải đọc được
+    count = qdrant_service.client.count(collection_name=qdrant_service.collection_name, exact=True).count
+    assert count == len(documents), f"{name}: {count}/{len(documents)} points visible after flush"
+    return {
+        "mode": name,
+        "points": len(documents),
+        "seconds": round(seconds, 2),
+        "points_per_sec": round(len(documents) / seconds, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Độ trễ mạng mỗi request upsert (giây)")
+    parser.add_argument("--apply-latency", type=float, default=0.00005, help="Thời gian apply mỗi point khi wait=True (giây)")
+    parser.add_argument("--url", help="URL Qdrant thật, mặc định dùng :memory:")
+    parser.add_argument("--grpc", action="store_true", help="Dùng gRPC khi chạy với --url")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    if args.url:
+        qdrant_service.client = QdrantClient(location=args.url, prefer_grpc=args.grpc)
+    else:
+        qdrant_service.client = SlowQdrantClient(QdrantClient(location=":memory:"), args.latency, args.apply_latency)
+    qdrant_service.vector_size = args.dim
+
+    documents, embeddings = generate(args.points, args.dim, args.seed)
+    results = [
+        run("single", documents, embeddings, batch_size=0, parallel=1, wait=True),
+        run("batched", documents, embeddings, batch_size=args.batch_size, parallel=1, wait=True),
+        run("parallel_nowait", documents, embeddings, batch_size=args.batch_size, parallel=args.parallel, wait=False),
+    ]
+    for result in results:
+        qdrant_service.client.delete_collection(f"bench_upsert_{result['mode']}")
+
+    for result in results:
+        print(f"{result['mode']:>16}: {result['points']} points in {result['seconds']}s "
+              f"-> {result['points_per_sec']} points/sec")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""So sánh phân cấp section bằng một request LLM duy nhất với các cửa sổ gối nhau gửi song song.
+
+    python -m benchmarks.bench_section_windows --headers 2000 --window 40 --overlap 0 8 16
+
+Dãy header tổng hợp không đánh số (luật không suy được, mọi header đều qua LLM), cấp đúng sinh ngẫu nhiên.
+LLM giả (benchmarks.fakes.FakeTextLLM) chỉ suy đúng parent nếu parent nằm trong request, độ trễ tăng theo
+số header và response bị cắt sau --max-sections header như khi vượt giới hạn output.
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.fakes import FakeTextLLM
+from services import llm_service
+from services.process_document.utils.data_models import SectionNode
+from services.process_document.utils.tree_builder import TreeBuilder
+
+def generate_levels(count: int, max_depth: int, seed: int) -> dict[int, int]:
+    rng = random.Random(seed)
+    levels = {}
+    level = 1
+    for index in range(count):
+        levels[index] = level
+        level = rng.choice([lvl for lvl in range(1, min(level + 1, max_depth) + 1)])
+    return levels
+
+def expected_parents(levels: dict[int, int]) -> dict[int, int | None]:
+    parents = {}
+    last_index_by_level = {}
+    for index in sorted(levels):
+        level = levels[index]
+        parents[index] = last_index_by_level.get(level - 1)
+        last_index_by_level[level] = index
+        for deeper in [lvl for lvl in last_index_by_level if lvl > level]:
+            del last_index_by_level[deeper]
+    return parents
+
+def run(name: str, builder: TreeBuilder, levels: dict[int, int], fake_llm: FakeTextLLM) -> dict:
+    fake_llm.reset()
+    nodes = [
+        SectionNode(order_id=index, label="header", content=f"Tiêu đề {index}", page=index // 5 + 1)
+        for index in sorted(levels)
+    ]
+
+    started = time.perf_counter()
+    tree = builder.build(nodes)
+    seconds = time.perf_counter() - started
+
+    # Cây hợp lệ: đủ mọi header, mỗi header xuất hiện một lần, parent luôn đứng trước con
+    parents = {}
+    stack = [(root, None) for root in tree]
+    while stack:
+        node, parent_id = stack.pop()
+        assert node.order_id not in parents, f"header {node.order_id} appears twice"
+        assert parent_id is None or parent_id < node.order_id, f"header {node.order_id} has a later parent"
+        parents[node.order_id] = parent_id
+        stack.extend((child, node.order_id) for child in node.children if child.is_header())
+    assert len(parents) == len(levels), f"{len(levels) - len(parents)} headers missing from the tree"
+
+    expected = expected_parents(levels)
+    correct = sum(1 for index, parent_id in parents.items() if parent_id == expected[index])
+    return {
+        "mode": name,
+        "headers": len(levels),
+        "requests": fake_llm.requests,
+        "accuracy": round(correct / len(levels), 4),
+        "seconds": round(seconds, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--headers", type=int, default=2000)
+    parser.add_argument("--max-depth", type=int, default=4)
+    parser.add_argument("--window", type=int, default=40)
+    parser.add_argument("--overlap", type=int, nargs="+", default=[0, 8, 16])
+    parser.add_argument("--parallel-windows", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="Độ trễ cố định mỗi request (giây)")
+    parser.add_argument("--per-section-latency", type=float, default=0.005, help="Độ trễ thêm mỗi header (giây)")
+    parser.add_argument("--max-sections", type=int, default=300, help="Số header tối đa trong response (0 = không giới hạn)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    levels = generate_levels(args.headers, args.max_depth, args.seed)
+    fake_llm = FakeTextLLM(args.latency, levels, args.per_section_latency, args.max_sections)
+    llm_service.text_llm = fake_llm
+
+    # Không gửi sớm theo số trang / thời gian: chỉ so sánh cách chia cửa sổ
+    results = [run("single", TreeBuilder(rules_enabled=False, llm_window=args.headers, llm_overlap=0,
+                                         llm_parallel_windows=1, llm_flush_pages=0, llm_flush_seconds=0),
+                   levels, fake_llm)]
+    for overlap in args.overlap:
+        builder = TreeBuilder(rules_enabled=False, llm_window=args.window, llm_overlap=overlap,
+                              llm_parallel_windows=args.parallel_windows, llm_flush_pages=0, llm_flush_seconds=0)
+        results.append(run(f"window={args.window},overlap={overlap}", builder, levels, fake_llm))
+
+    # Cửa sổ gối nhau không được kém hơn cửa sổ rời nhau
+    windowed = results[1:]
+    for previous, result in zip(windowed, windowed[1:]):
+        assert result["accuracy"] >= previous["accuracy"] - 0.01, (previous, result)
+
+    for result in results:
+        print(f"{result['mode']:>24}: {result['requests']} requests, accuracy {result['accuracy']:.2%} "
+              f"in {result['seconds']}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
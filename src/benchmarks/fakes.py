@@ -0,0 +1,380 @@
+"""Model giả cho benchmark: trả JSON hợp lệ theo prompt, giả lập độ trễ, lỗi provider và không gọi mạng"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+from langchain_core.runnables import Runnable
+
+PAGE_NUMBERS_PATTERN = re.compile(r"lần lượt là:\s*([\d,\s]+)")
+CAPTION_COUNT_PATTERN = re.compile(r"Có (\d+) hình ảnh cần mô tả")
+
+class FakeProviderError(RuntimeError):
+    """Lỗi giả lập từ provider (429 / 5xx), có status_code và response.headers như lỗi của SDK openai"""
+    def __init__(self, status_code: int = 503, retry_after: Optional[float] = None):
+        super().__init__(f"{status_code} error (fake provider)")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+class ThrottleSimulator:
+    """Provider giới hạn số request đồng thời: request vượt capacity bị trả 429 ngay (kèm Retry-After nếu có).
+
+    capacity = 0 là không giới hạn; có thể đổi capacity giữa chừng để giả lập provider hết / có thêm quota.
+    Dùng làm context manager bao quanh thời gian xử lý một request.
+    """
+    def __init__(self, capacity: int = 0, retry_after: Optional[float] = None):
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.peak_in_flight = self.in_flight
+            self.throttled = 0
+
+    def __enter__(self):
+        with self._lock:
+            if self.capacity and self.in_flight >= self.capacity:
+                self.throttled += 1
+                raise FakeProviderError(429, self.retry_after)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.in_flight -= 1
+
+class FaultInjector:
+    """Quyết định request nào gặp sự cố theo hash(seed, nội dung request, lần gửi thứ mấy của nội dung đó).
+
+    Không phụ thuộc thứ tự các thread gửi request nên cùng seed luôn chọn đúng các request như nhau,
+    và request gửi lại (retry / fallback / hedged) được xét độc lập với lần trước.
+    """
+    def __init__(self, rate: float = 0.0, seed: int = 0, name: str = ""):
+        self.rate = rate
+        self.seed = seed
+        self.name = name
+        self.hits = 0
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self._attempts.clear()
+
+    def hit(self, key: str) -> bool:
+        if self.rate <= 0:
+            return False
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+        # name tách các loại sự cố dùng chung một seed
+        prefix = f"{self.seed}:{self.name}" if self.name else f"{self.seed}"
+        digest = hashlib.sha256(f"{prefix}:{key}:{attempt}".encode("utf-8")).digest()
+        if int.from_bytes(digest[:8], "big") / 2 ** 64 >= self.rate:
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+class ErrorInjector(FaultInjector):
+    """FaultInjector raise FakeProviderError(503) cho request được chọn"""
+    def __init__(self, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(error_rate, seed)
+
+    @property
+    def errors(self) -> int:
+        return self.hits
+
+    def check(self, key: str):
+        if self.hit(key):
+            raise FakeProviderError(503)
+
+class FakeVisionLLM:
+    """Thay cho llm_service.vision_llm. Độ trễ = latency + per_image_latency * số ảnh trong request.
+
+    fail_every: cứ mỗi fail_every request gộp nhiều trang thì trả về JSON hỏng (0 = không bao giờ),
+    dùng để kiểm tra cơ chế fallback về từng trang.
+    drop_page_every: cứ mỗi drop_page_every request gộp nhiều trang thì response thiếu trang cuối (0 = không bao giờ).
+    error_rate: tỉ lệ request raise FakeProviderError sau khi chờ hết độ trễ (xem ErrorInjector).
+    throttle: ThrottleSimulator giới hạn số request đồng thời, vượt quá thì bị 429.
+    slow_rate / slow_latency: tỉ lệ request chậm bất thường và độ trễ thêm của chúng (đuôi độ trễ).
+    malformed_rate: tỉ lệ response là JSON hỏng.
+    """
+    model_name = "fake-vision"
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        per_image_latency: float = 0.1,
+        fail_every: int = 0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        throttle: Optional[ThrottleSimulator] = None,
+        slow_rate: float = 0.0,
+        slow_latency: float = 5.0,
+        malformed_rate: float = 0.0,
+        drop_page_every: int = 0
+    ):
+        self.latency = latency
+        self.per_image_latency = per_image_latency
+        self.fail_every = fail_every
+        self.drop_page_every = drop_page_every
+        self.errors = ErrorInjector(error_rate, seed)
+        self.throttle = throttle
+        self.slow = FaultInjector(slow_rate, seed, "slow")
+        self.slow_latency = slow_latency
+        self.malformed = FaultInjector(malformed_rate, seed, "malformed")
+        self.requests = 0
+        self.images = 0
+        self._batch_requests = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.images = 0
+            self._batch_requests = 0
+        self.errors.reset()
+        self.slow.reset()
+        self.malformed.reset()
+        if self.throttle is not None:
+            self.throttle.reset()
+
+    def invoke(self, messages):
+        delay, content, caption = self._begin(messages)
+        with self.throttle or nullcontext():
+            time.sleep(delay)
+        return self._respond(content, caption)
+
+    async def ainvoke(self, messages):
+        delay, content, caption = self._begin(messages)
+        with self.throttle or nullcontext():
+            await asyncio.sleep(delay)
+        return self._respond(content, caption)
+
+    def _begin(self, messages) -> Tuple[float, list, bool]:
+        if hasattr(messages, "to_messages"):
+            messages = messages.to_messages()
+        # Message multimodal của request gốc (khi re-prompt, message cuối là yêu cầu trả lời lại)
+        content = next(message.content for message in messages if isinstance(message.content, list))
+        # Prompt caption (từng ảnh hoặc gộp) nằm ở system message
+        caption = any(isinstance(message.content, str) and "MÔ TẢ" in message.content for message in messages)
+        num_images = sum(1 for part in content if part["type"] == "image")
+        with self._lock:
+            self.requests += 1
+            self.images += num_images
+        delay = self.latency + self.per_image_latency * num_images
+        if self.slow.hit(self._fingerprint(content)):
+            delay += self.slow_latency
+        return delay, content, caption
+
+    def _respond(self, content: list, caption: bool = False):
+        fingerprint = self._fingerprint(content)
+        self.errors.check(fingerprint)
+        if self.malformed.hit(fingerprint):
+            return SimpleNamespace(content="{\"ocr_response\": [{\"index\": 0,")
+        question = next((part["text"] for part in content if part["type"] == "text"), "")
+        num_images = sum(1 for part in content if part["type"] == "image")
+
+        if caption:
+            match = CAPTION_COUNT_PATTERN.search(question)
+            if match:
+                content = {"captions": [
+                    {"index": index, "description": "Hình minh họa"} for index in range(int(match.group(1)))
+                ]}
+            else:
+                content = {"description": "Hình minh họa"}
+            return SimpleNamespace(content=json.dumps(content, ensure_ascii=False))
+
+        match = PAGE_NUMBERS_PATTERN.search(question)
+        if match:
+            with self._lock:
+                self._batch_requests += 1
+                should_fail = self.fail_every and self._batch_requests % self.fail_every == 0
+                should_drop = self.drop_page_every and self._batch_requests % self.drop_page_every == 0
+            if should_fail:
+                return SimpleNamespace(content="{\"pages\": [")
+
+            page_numbers = [int(number) for number in match.group(1).split(",")]
+            if should_drop and len(page_numbers) > 1:
+                page_numbers = page_numbers[:-1]
+            content = {"pages": [
+                {"page_number": page_number, "ocr_response": self._segments(page_number)}
+                for page_number in page_numbers
+            ]}
+        elif num_images == 1:
+            content = {"ocr_response": self._segments(None)}
+        else:
+            content = {"description": "Hình minh họa"}
+        return SimpleNamespace(content=json.dumps(content, ensure_ascii=False))
+
+    @staticmethod
+    def _fingerprint(content) -> str:
+        hasher = hashlib.sha256()
+        for part in content:
+            hasher.update(str(part.get("text") or part.get("base64") or "").encode("utf-8"))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _segments(page_number):
+        suffix = f" trang {page_number}" if page_number is not None else ""
+        return [
+            {"index": 0, "label": "header", "content": f"Tiêu đề{suffix}"},
+            {"index": 1, "label": "text", "content": f"Nội dung{suffix}"},
+        ]
+
+SECTION_INDEX_PATTERN = re.compile(r"'index':\s*(\d+)")
+
+class FakeTextLLM(Runnable):
+    """Thay cho llm_service.text_llm (chain `prompt | text_llm | parser`), chỉ trả lời correct_section_structure.
+
+    levels: {index: cấp đúng của header}. Có levels thì parent = header gần nhất phía trước có cấp nhỏ hơn 1
+    trong số header nhìn thấy trong request (không thấy thì là root), không có thì mọi header là root.
+    Độ trễ = latency + per_section_latency * số header; max_sections > 0 cắt bớt response như khi vượt giới hạn output.
+    error_rate: tỉ lệ request raise FakeProviderError (xem ErrorInjector).
+    """
+    model_name = "fake-text"
+
+    def __init__(
+        self,
+        latency: float = 1.0,
+        levels: Optional[Dict[int, int]] = None,
+        per_section_latency: float = 0.0,
+        max_sections: int = 0,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.latency = latency
+        self.levels = levels
+        self.per_section_latency = per_section_latency
+        self.max_sections = max_sections
+        self.errors = ErrorInjector(error_rate, seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+        self.errors.reset()
+
+    def invoke(self, prompt_value, config=None, **kwargs) -> str:
+        delay, prompt = self._begin(prompt_value)
+        time.sleep(delay)
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt_value, config=None, **kwargs) -> str:
+        delay, prompt = self._begin(prompt_value)
+        await asyncio.sleep(delay)
+        return self._respond(prompt)
+
+    def _begin(self, prompt_value) -> Tuple[float, str]:
+        prompt = prompt_value.to_string()
+        with self._lock:
+            self.requests += 1
+        return self.latency + self.per_section_latency * len(SECTION_INDEX_PATTERN.findall(prompt)), prompt
+
+    def _respond(self, prompt: str) -> str:
+        self.errors.check(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        indices = [int(index) for index in SECTION_INDEX_PATTERN.findall(prompt)]
+
+        response = []
+        last_index_by_level: Dict[int, int] = {}
+        for index in indices:
+            parent_index = None
+            if self.levels is not None:
+                level = self.levels[index]
+                parent_index = last_index_by_level.get(level - 1)
+                last_index_by_level[level] = index
+                for deeper in [lvl for lvl in last_index_by_level if lvl > level]:
+                    del last_index_by_level[deeper]
+            response.append({"index": index, "parent_index": parent_index})
+
+        if self.max_sections:
+            response = response[:self.max_sections]
+        return json.dumps({"response": response})
+
+class FakeEmbeddings:
+    """Thay cho openai_embeddings: vector cố định theo nội dung, độ trễ = latency mỗi lần gọi.
+
+    error_rate: tỉ lệ request raise FakeProviderError (xem ErrorInjector).
+    """
+    model = "fake-embedding"
+
+    def __init__(self, dim: int, latency: float = 0.3, error_rate: float = 0.0, seed: int = 0):
+        self.dim = dim
+        self.latency = latency
+        self.errors = ErrorInjector(error_rate, seed)
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.texts = 0
+        self.errors.reset()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        time.sleep(self.latency)
+        self.errors.check(hashlib.sha256("\n".join(texts).encode("utf-8")).hexdigest())
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+    def _vector(self, text):
+        # Giá trị biểu diễn đúng bằng float32 như vector model thật: qua cache (float32) vẫn y nguyên
+        seed = sum(text.encode("utf-8")) or 1
+        return [((seed * (i + 1)) % 97 + 1) / 128 for i in range(self.dim)]
+
+class InMemoryCache:
+    """Thay cho cache_service (Postgres) ở các service nhận cache qua tham số"""
+    def __init__(self):
+        self._values: Dict[str, Dict[str, object]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, namespace, keys):
+        with self._lock:
+            values = self._values.get(namespace, {})
+            return {key: values[key] for key in set(keys) if key in values}
+
+    def set_many(self, namespace, items, max_entries=None):
+        with self._lock:
+            self._values.setdefault(namespace, {}).update(items)
+
+class SlowQdrantClient:
+    """Bọc QdrantClient (thường là ":memory:") và thêm độ trễ mạng cho mỗi lần upsert.
+
+    wait=True chờ thêm apply_latency mỗi point như khi server phải apply + index xong mới trả về.
+    Client ":memory:" không an toàn khi gọi song song nên lệnh upsert thật được chạy tuần tự.
+    """
+    def __init__(self, client, upsert_latency: float = 0.2, apply_latency: float = 0.0):
+        self._client = client
+        self.upsert_latency = upsert_latency
+        self.apply_latency = apply_latency
+        self._lock = threading.Lock()
+
+    def upsert(self, *args, **kwargs):
+        points = kwargs.get("points", args[1] if len(args) > 1 else [])
+        wait = kwargs.get("wait", True)
+        time.sleep(self.upsert_latency + (self.apply_latency * len(points) if wait else 0))
+        with self._lock:
+            return self._client.upsert(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
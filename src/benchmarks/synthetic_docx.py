@@ -0,0 +1,47 @@
+import io
+import os
+import random
+
+import docx
+from docx.shared import Inches
+from PIL import Image
+
+def _noise_png(width: int, height: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    img = Image.frombytes("RGB", (width, height), bytes(rng.randrange(160, 256) for _ in range(width * height * 3)))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def generate_docx(
+    path: str,
+    num_chapters: int,
+    *,
+    sections_per_chapter: int = 3,
+    images_per_chapter: int = 0,
+    seed: int = 0,
+) -> str:
+    """Sinh DOCX tổng hợp: Heading 1 / Heading 2 kèm đoạn văn, một bảng mỗi chương, tùy chọn ảnh minh họa"""
+    rng = random.Random(seed)
+    document = docx.Document()
+    document.add_heading("Tài liệu tổng hợp", level=0)
+    figure = _noise_png(300, 220, seed + 1) if images_per_chapter else None
+
+    for chapter in range(num_chapters):
+        document.add_heading(f"Chương {chapter + 1}", level=1)
+        for section in range(sections_per_chapter):
+            document.add_heading(f"Mục {chapter + 1}.{section + 1}", level=2)
+            for _ in range(3):
+                document.add_paragraph(" ".join(f"từ{rng.randrange(1000)}" for _ in range(40)))
+
+        table = document.add_table(rows=3, cols=3)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = f"ô{rng.randrange(100)}"
+
+        for _ in range(images_per_chapter):
+            document.add_picture(io.BytesIO(figure), width=Inches(3))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document.save(path)
+    return path
@@ -0,0 +1,67 @@
+import os
+import random
+
+import fitz
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 (points)
+
+def _noise_pixmap(width: int, height: int, seed: int) -> fitz.Pixmap:
+    rng = random.Random(seed)
+    samples = bytes(rng.randrange(160, 256) for _ in range(width * height * 3))
+    return fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), samples, False)
+
+def generate_pdf(
+    path: str,
+    num_pages: int,
+    *,
+    scanned: bool = False,
+    scanned_every: int = 0,
+    images_per_page: int = 0,
+    seed: int = 0,
+) -> str:
+    """Sinh PDF tổng hợp: trang text có header, tùy chọn trang scan (ảnh toàn trang) và ảnh minh họa.
+
+    scanned_every > 0: tài liệu hỗn hợp, cứ mỗi scanned_every trang thì trang cuối là trang scan.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+
+    # Dùng chung xref cho ảnh để file PDF không phình to, nhưng mỗi trang render vẫn đầy đủ
+    scan_xref = None
+    figure_xref = None
+
+    for page_index in range(num_pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+
+        if scanned or (scanned_every and page_index % scanned_every == scanned_every - 1):
+            rect = page.rect
+            if scan_xref is None:
+                scan_xref = page.insert_image(rect, pixmap=_noise_pixmap(600, 850, seed))
+            else:
+                page.insert_image(rect, xref=scan_xref)
+            continue
+
+        y = 72
+        page.insert_text((72, y), f"{page_index + 1}. Chương {page_index + 1}", fontsize=16)
+        y += 28
+        for paragraph in range(6):
+            words = " ".join(f"từ{rng.randrange(1000)}" for _ in range(12))
+            page.insert_text((72, y), words, fontsize=10)
+            y += 16
+            if paragraph == 2:
+                page.insert_text((72, y + 8), f"{page_index + 1}.{paragraph} Mục con", fontsize=13)
+                y += 32
+
+        for image_index in range(images_per_page):
+            if figure_xref is None:
+                figure_xref = page.insert_image(
+                    fitz.Rect(72, 400, 272, 550), pixmap=_noise_pixmap(300, 220, seed + 1)
+                )
+            else:
+                top = 400 + image_index * 160
+                page.insert_image(fitz.Rect(72, top, 272, top + 150), xref=figure_xref)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
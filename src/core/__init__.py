@@ -1,3 +1,4 @@
 from .settings import config
 from .llm import openai_embeddings, latex_ocr, openai_llm, gemini_llm, latex_ocr
-from .logging import setup_logging, logger
\ No newline at end of file
+from .logging import setup_logging, logger
+from .metrics import metrics
\ No newline at end of file
@@ -5,7 +5,8 @@ from core import config
 
 openai_embeddings = OpenAIEmbeddings(api_key=config.openai_api_key)
 
-openai_llm = ChatOpenAI(model_name="gpt-4.1-mini", api_key=config.openai_api_key, temperature=0)
+# Không để client tự retry: 429 / 5xx phải về tới limiter của LLMService để giảm tải và chờ Retry-After
+openai_llm = ChatOpenAI(model_name="gpt-4.1-mini", api_key=config.openai_api_key, temperature=0, max_retries=0)
 gemini_llm = ChatOpenAI(
     model_name="google/gemini-2.5-flash",
     openai_api_key=config.openrouter_api_key,
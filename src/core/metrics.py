@@ -0,0 +1,41 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Union
+
+Number = Union[int, float]
+
+class MetricsRegistry:
+    """Counter/gauge trong process, đọc qua API /api/metrics"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Number] = {}
+        self._gauges: Dict[str, Number] = {}
+
+    def incr(self, name: str, value: Number = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: Number):
+        with self._lock:
+            self._gauges[name] = value
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Cộng thời gian chạy của khối lệnh vào `{name}.seconds` và số lần chạy vào `{name}.calls`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.incr(f"{name}.seconds", time.perf_counter() - started)
+            self.incr(f"{name}.calls")
+
+    def get(self, name: str) -> Number:
+        with self._lock:
+            return self._counters.get(name, self._gauges.get(name, 0))
+
+    def snapshot(self) -> Dict[str, Dict[str, Number]]:
+        with self._lock:
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+metrics = MetricsRegistry()
@@ -14,6 +14,12 @@ class Config(BaseSettings):
     qdrant_url: str = os.getenv("QDRANT_URL", "")
     qdrant_collection_name: str = os.getenv("QDRANT_COLLECTION_NAME", "NotebookLM")
     qdrant_embedding_dim: int = os.getenv("QDRANT_EMBEDDING_DIM", 1536)
+    qdrant_prefer_grpc: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    qdrant_grpc_port: int = os.getenv("QDRANT_GRPC_PORT", 6334)
+    # qdrant: upsert theo batch cố định, nhiều batch song song, không chờ apply (wait=False) rồi chốt bằng barrier
+    qdrant_upsert_batch_size: int = os.getenv("QDRANT_UPSERT_BATCH_SIZE", 256)
+    qdrant_upsert_parallel: int = os.getenv("QDRANT_UPSERT_PARALLEL", 4)
+    qdrant_upsert_wait: bool = os.getenv("QDRANT_UPSERT_WAIT", "false").lower() == "true"
     
     # log level
     log_level: str = "INFO"
@@ -37,6 +43,113 @@ class Config(BaseSettings):
     max_width: int = 5000
     max_height: int = 5000
     
+    # render pdf: số process render song song (1 = tuần tự) và số trang mỗi lần giao cho 1 process
+    pdf_render_workers: int = os.getenv("PDF_RENDER_WORKERS", 1)
+    pdf_render_chunk_pages: int = os.getenv("PDF_RENDER_CHUNK_PAGES", 4)
+    
+    # text layer: trang born-digital có ít nhất text_layer_min_chars ký tự sẽ bỏ qua OCR bằng LLM
+    text_layer_enabled: bool = os.getenv("TEXT_LAYER_ENABLED", "true").lower() == "true"
+    text_layer_min_chars: int = os.getenv("TEXT_LAYER_MIN_CHARS", 200)
+    
+    # render trang gửi LLM: trang OCR cần nét, trang chỉ làm ngữ cảnh caption ảnh thì nhỏ hơn
+    ocr_render_dpi: int = os.getenv("OCR_RENDER_DPI", 144)
+    ocr_render_max_dpi: int = os.getenv("OCR_RENDER_MAX_DPI", 200)
+    ocr_render_format: str = os.getenv("OCR_RENDER_FORMAT", "jpeg")
+    ocr_render_quality: int = os.getenv("OCR_RENDER_QUALITY", 85)
+    ocr_render_max_edge: int = os.getenv("OCR_RENDER_MAX_EDGE", 2048)
+    context_render_dpi: int = os.getenv("CONTEXT_RENDER_DPI", 96)
+    context_render_format: str = os.getenv("CONTEXT_RENDER_FORMAT", "jpeg")
+    context_render_quality: int = os.getenv("CONTEXT_RENDER_QUALITY", 70)
+    context_render_max_edge: int = os.getenv("CONTEXT_RENDER_MAX_EDGE", 1280)
+    
+    # docx: đọc heading / đoạn văn / ảnh trực tiếp từ file thay vì convert sang PDF bằng LibreOffice rồi OCR
+    docx_native_enabled: bool = os.getenv("DOCX_NATIVE_ENABLED", "true").lower() == "true"
+    # docx: số ảnh gom lại trước khi gửi caption, node được trả cho stage sau theo từng cửa sổ này
+    docx_image_window: int = os.getenv("DOCX_IMAGE_WINDOW", 8)
+    
+    # office -> pdf: pool instance LibreOffice headless chạy sẵn, mỗi instance một profile riêng
+    office_pool_size: int = os.getenv("OFFICE_POOL_SIZE", 2)
+    office_prewarm: bool = os.getenv("OFFICE_PREWARM", "false").lower() == "true"
+    office_convert_timeout: float = os.getenv("OFFICE_CONVERT_TIMEOUT", 120)
+    office_start_timeout: float = os.getenv("OFFICE_START_TIMEOUT", 60)
+    office_health_check_seconds: float = os.getenv("OFFICE_HEALTH_CHECK_SECONDS", 30)
+    office_max_conversions: int = os.getenv("OFFICE_MAX_CONVERSIONS", 200)
+    office_soffice_bin: str = os.getenv("OFFICE_SOFFICE_BIN", "soffice")
+    # office -> pdf: interpreter có module uno (python3-uno), không có thì mỗi lần convert chạy soffice riêng
+    office_uno_python: str = os.getenv("OFFICE_UNO_PYTHON", "/usr/bin/python3")
+    office_profile_dir: str = os.getenv("OFFICE_PROFILE_DIR", "/tmp/office-profiles")
+    
+    # llm: số request đồng thời mỗi provider, tự điều chỉnh (AIMD) trong [min, max] theo 429 / 5xx và độ trễ
+    llm_adaptive_concurrency: bool = os.getenv("LLM_ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+    llm_initial_concurrent: int = os.getenv("LLM_INITIAL_CONCURRENT", 3)
+    llm_min_concurrent: int = os.getenv("LLM_MIN_CONCURRENT", 1)
+    llm_max_concurrent: int = os.getenv("LLM_MAX_CONCURRENT", 32)
+    # llm: số lần gửi lại request lỗi tạm thời (429 / 5xx / timeout), chờ Retry-After hoặc backoff có jitter
+    llm_max_retries: int = os.getenv("LLM_MAX_RETRIES", 3)
+    llm_retry_backoff: float = os.getenv("LLM_RETRY_BACKOFF", 1.0)
+    # llm: số lần yêu cầu LLM trả lời lại khi response không parse được
+    llm_parse_retries: int = os.getenv("LLM_PARSE_RETRIES", 1)
+    # llm: request chạy quá độ trễ percentile này (0-100) của provider thì gửi thêm một bản sao, 0 = tắt
+    llm_hedge_percentile: float = os.getenv("LLM_HEDGE_PERCENTILE", 0)
+    # llm: deadline mỗi task (giây, tính cả retry), 0 = không giới hạn; LLM_TASK_DEADLINES ghi đè theo task
+    llm_deadline_seconds: float = os.getenv("LLM_DEADLINE_SECONDS", 300)
+    llm_task_deadlines: str = os.getenv("LLM_TASK_DEADLINES", "notebook_chat=90,rewrite_question=30,rerank=30")
+    # llm: số slot mỗi provider chỉ dành cho task chat (ingest không dùng), ingest chờ quá bulk_max_wait giây thì được ưu tiên
+    llm_interactive_reserve: int = os.getenv("LLM_INTERACTIVE_RESERVE", 1)
+    llm_bulk_max_wait: float = os.getenv("LLM_BULK_MAX_WAIT", 30)
+    
+    # cache: mỗi namespace evict tối đa một lần mỗi N giây (COUNT + xóa entry cũ nhất), không theo số lần ghi.
+    # Lượt đọc (hits / last_used_at) cũng được gom và ghi theo lô với chu kỳ này
+    cache_evict_interval_seconds: float = os.getenv("CACHE_EVICT_INTERVAL_SECONDS", 60)
+    
+    # ocr: số trang được render và giữ trong bộ nhớ cùng lúc
+    ocr_page_window: int = os.getenv("OCR_PAGE_WINDOW", 8)
+    ocr_cache_enabled: bool = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+    ocr_cache_max_entries: int = os.getenv("OCR_CACHE_MAX_ENTRIES", 100000)
+    # ocr: số trang scan liên tiếp gộp vào một request LLM
+    ocr_pages_per_request: int = os.getenv("OCR_PAGES_PER_REQUEST", 4)
+    
+    # caption ảnh: cache theo hash ảnh + gộp ảnh trùng trong tài liệu
+    caption_cache_enabled: bool = os.getenv("CAPTION_CACHE_ENABLED", "true").lower() == "true"
+    caption_cache_max_entries: int = os.getenv("CAPTION_CACHE_MAX_ENTRIES", 100000)
+    caption_perceptual_dedup: bool = os.getenv("CAPTION_PERCEPTUAL_DEDUP", "false").lower() == "true"
+    caption_perceptual_max_distance: int = os.getenv("CAPTION_PERCEPTUAL_MAX_DISTANCE", 4)
+    caption_batch_per_page: bool = os.getenv("CAPTION_BATCH_PER_PAGE", "true").lower() == "true"
+    caption_batch_max_images: int = os.getenv("CAPTION_BATCH_MAX_IMAGES", 8)
+    
+    # chunking: cấu hình RecursiveCharacterTextSplitter khi tách section thành chunk
+    chunk_size: int = os.getenv("CHUNK_SIZE", 1000)
+    chunk_overlap: int = os.getenv("CHUNK_OVERLAP", 200)
+    
+    # section tree: suy phân cấp header từ đánh số / cỡ chữ, chỉ gửi LLM các header không suy được
+    section_rules_enabled: bool = os.getenv("SECTION_RULES_ENABLED", "true").lower() == "true"
+    section_llm_window: int = os.getenv("SECTION_LLM_WINDOW", 40)
+    section_llm_context: int = os.getenv("SECTION_LLM_CONTEXT", 8)
+    # section tree: cửa sổ LLM gối nhau bao nhiêu header và số cửa sổ gửi song song
+    section_llm_overlap: int = os.getenv("SECTION_LLM_OVERLAP", 8)
+    section_llm_parallel_windows: int = os.getenv("SECTION_LLM_PARALLEL_WINDOWS", 4)
+    # section tree: dãy header chờ LLM được gửi sớm khi kéo dài quá N trang hoặc chờ quá N giây
+    section_llm_flush_pages: int = os.getenv("SECTION_LLM_FLUSH_PAGES", 10)
+    section_llm_flush_seconds: float = os.getenv("SECTION_LLM_FLUSH_SECONDS", 30)
+    
+    # ingestion
+    ingestion_max_workers: int = os.getenv("INGESTION_MAX_WORKERS", 2)
+    ingestion_checkpoint_enabled: bool = os.getenv("INGESTION_CHECKPOINT_ENABLED", "true").lower() == "true"
+    ingestion_progress_flush_seconds: float = os.getenv("INGESTION_PROGRESS_FLUSH_SECONDS", 1.0)
+    # ingestion: worker báo task còn chạy mỗi N giây, task RUNNING không có heartbeat quá N giây được chạy lại
+    ingestion_heartbeat_seconds: float = os.getenv("INGESTION_HEARTBEAT_SECONDS", 15)
+    ingestion_stale_seconds: float = os.getenv("INGESTION_STALE_SECONDS", 120)
+    # ingestion: chạy render / OCR / chunk / embed / upsert thành pipeline, mỗi stage chạy trước tối đa N phần tử
+    ingestion_pipeline_enabled: bool = os.getenv("INGESTION_PIPELINE_ENABLED", "true").lower() == "true"
+    ingestion_stage_queue_size: int = os.getenv("INGESTION_STAGE_QUEUE_SIZE", 2)
+    
+    # embedding: số batch gửi model cùng lúc, cache vector theo hash nội dung chunk + tên model
+    embedding_batch_size: int = os.getenv("EMBEDDING_BATCH_SIZE", 128)
+    embedding_max_in_flight: int = os.getenv("EMBEDDING_MAX_IN_FLIGHT", 4)
+    embedding_cache_enabled: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    # embedding: vector lưu trong cache dạng float32 base64 (~8KB với 1536 chiều), 20000 entry ~ 160MB
+    embedding_cache_max_entries: int = os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 20000)
+    
     # version
     source_version: str = "v2"
     
@@ -1 +1 @@
-from .init_db import get_db
\ No newline at end of file
+from .init_db import get_db, SessionLocal
@@ -7,8 +7,9 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
 
-from core import settings, setup_logging
+from core import config, settings, setup_logging
 from routes import total_router
+from services import ingestion_worker, llm_service, office_converter_service
 
 def get_application() -> FastAPI:
     application = FastAPI()
@@ -28,6 +29,18 @@ def get_application() -> FastAPI:
     setup_logging()
     
     application.include_router(total_router)
+
+    # Worker xử lý tài liệu ở background, resume các job dở dang khi khởi động
+    application.add_event_handler("startup", ingestion_worker.start)
+    application.add_event_handler("shutdown", ingestion_worker.shutdown)
+
+    # Pool LibreOffice cho file office cần convert sang PDF
+    if config.office_prewarm:
+        application.add_event_handler("startup", office_converter_service.warm_up)
+    application.add_event_handler("shutdown", office_converter_service.shutdown)
+
+    # Event loop nền của LLMService
+    application.add_event_handler("shutdown", llm_service.shutdown)
     return application
 
 app = get_application()
\ No newline at end of file
@@ -1,2 +1,3 @@
-from .entities import User, Notebook, Source, Message
-from .relationship import NotebookSource
\ No newline at end of file
+from .entities import User, Notebook, Source, Message, IngestionJob, IngestionTask, CacheEntry, \
+    IngestionCheckpoint
+from .relationship import NotebookSource
@@ -1,4 +1,8 @@
 from .model_user import User
 from .model_notebook import Notebook
 from .model_source import Source
-from .model_message import Message
\ No newline at end of file
+from .model_message import Message
+from .model_ingestion_job import IngestionJob, IngestionStatus
+from .model_ingestion_task import IngestionTask
+from .model_cache_entry import CacheEntry
+from .model_ingestion_checkpoint import IngestionCheckpoint
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Integer, JSON, UniqueConstraint
+
+from models.model_base import BareBaseModel
+
+class CacheEntry(BareBaseModel):
+    __table_args__ = (UniqueConstraint("namespace", "key"),)
+
+    namespace = Column(String, nullable=False, index=True)
+    key = Column(String, nullable=False)
+    value = Column(JSON, nullable=False)
+
+    hits = Column(Integer, default=0)
+    last_used_at = Column(String, nullable=False, index=True)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, Integer, ForeignKey, JSON, UniqueConstraint
+
+from models.model_base import BareBaseModel
+
+class IngestionCheckpoint(BareBaseModel):
+    __table_args__ = (UniqueConstraint("source_id", "stage", "key"),)
+
+    source_id = Column(Integer, ForeignKey("source.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Stage của pipeline (page, tree, documents, embedded) và key trong stage (số trang, batch, ...)
+    stage = Column(String, nullable=False)
+    key = Column(String, nullable=False, default="")
+    value = Column(JSON, nullable=False)
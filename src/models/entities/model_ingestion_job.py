@@ -0,0 +1,25 @@
+import enum
+
+from sqlalchemy import Column, Integer, ForeignKey, Enum
+from sqlalchemy.orm import relationship
+
+from models.model_base import BareBaseModel
+
+class IngestionStatus(enum.Enum):
+    PENDING="pending"
+    RUNNING="running"
+    SUCCEEDED="succeeded"
+    FAILED="failed"
+
+class IngestionJob(BareBaseModel):
+    notebook_id = Column(Integer, ForeignKey("notebook.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    status = Column(Enum(IngestionStatus), default=IngestionStatus.PENDING, nullable=False)
+
+    # Job - Task
+    tasks = relationship(
+        "IngestionTask",
+        back_populates="job",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
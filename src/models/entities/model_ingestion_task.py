@@ -0,0 +1,33 @@
+from sqlalchemy import Column, String, Integer, ForeignKey, Enum, Text, JSON
+from sqlalchemy.orm import relationship
+
+from models.model_base import BareBaseModel
+from models.entities.model_ingestion_job import IngestionStatus
+
+class IngestionTask(BareBaseModel):
+    job_id = Column(Integer, ForeignKey("ingestionjob.id", ondelete="CASCADE"), nullable=False, index=True)
+    source_id = Column(Integer, ForeignKey("source.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(Enum(IngestionStatus), default=IngestionStatus.PENDING, nullable=False, index=True)
+
+    # Thông tin để worker chạy lại pipeline sau khi restart
+    filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    output_dir = Column(String, nullable=False)
+
+    # Tiến độ
+    pages_total = Column(Integer, default=0)
+    pages_ocr = Column(Integer, default=0)
+    chunks_total = Column(Integer, default=0)
+    chunks_embedded = Column(Integer, default=0)
+
+    error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+    started_at = Column(String, nullable=True)
+    finished_at = Column(String, nullable=True)
+
+    # Worker đang chạy task và lần cuối worker báo còn sống, task RUNNING quá hạn heartbeat mới được chạy lại
+    worker_id = Column(String, nullable=True, index=True)
+    heartbeat_at = Column(String, nullable=True)
+
+    # Task - Job
+    job = relationship("IngestionJob", back_populates="tasks")
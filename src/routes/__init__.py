@@ -5,6 +5,8 @@ from .route_user import router as user_router
 from .route_notebook import router as notebook_router
 from .route_source import router as source_router
 from .route_message import router as message_router
+from .route_ingestion import router as ingestion_router
+from .route_metrics import router as metrics_router
 
 total_router = APIRouter(prefix="/api")
 
@@ -12,4 +14,6 @@ total_router.include_router(retrieve_router, prefix="/retrieve", tags=["retrieve
 total_router.include_router(user_router, prefix="/user", tags=["user"])
 total_router.include_router(notebook_router, prefix="/notebook", tags=["notebook"])
 total_router.include_router(source_router, tags=["source"])
-total_router.include_router(message_router, tags=["message"])
\ No newline at end of file
+total_router.include_router(message_router, tags=["message"])
+total_router.include_router(ingestion_router, prefix="/ingestion", tags=["ingestion"])
+total_router.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
\ No newline at end of file
@@ -0,0 +1,116 @@
+from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from database import get_db
+from models.entities import User, IngestionTask, IngestionStatus
+from schemas import RechunkRequest
+from services import UserService, ingestion_job_service, ingestion_task_service, ingestion_worker, source_service
+
+router = APIRouter()
+
+def format_task(task: IngestionTask) -> dict:
+    return {
+        "id": task.id,
+        "source_id": task.source_id,
+        "filename": task.filename,
+        "status": task.status.value,
+        "progress": {
+            "pages_total": task.pages_total or 0,
+            "pages_ocr": task.pages_ocr or 0,
+            "chunks_total": task.chunks_total or 0,
+            "chunks_embedded": task.chunks_embedded or 0,
+        },
+        "result": task.result,
+        "error": task.error,
+        "started_at": task.started_at,
+        "finished_at": task.finished_at,
+    }
+
+@router.get("/job/{job_id}")
+def get_ingestion_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(UserService.get_current_user)
+):
+    job = ingestion_job_service.get_by_id(job_id, db)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job không tồn tại.")
+
+    if job.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Bạn không có quyền truy cập job này.")
+
+    tasks = ingestion_task_service.get_tasks_by_job_id(job.id, db)
+    result = jsonable_encoder(job)
+    result["sources"] = [format_task(task) for task in tasks]
+    return result
+
+@router.get("/source/{source_id}")
+def get_source_ingestion_status(
+    source_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(UserService.get_current_user)
+):
+    task = ingestion_task_service.get_latest_task_by_source_id(source_id, db)
+    if not task:
+        raise HTTPException(status_code=404, detail="Source chưa có job xử lý.")
+
+    if task.job.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Bạn không có quyền truy cập source này.")
+
+    return format_task(task)
+
+@router.post("/source/{source_id}/retry")
+def retry_source_ingestion(
+    source_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(UserService.get_current_user)
+):
+    task = ingestion_task_service.get_latest_task_by_source_id(source_id, db)
+    if not task:
+        raise HTTPException(status_code=404, detail="Source chưa có job xử lý.")
+
+    if task.job.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Bạn không có quyền truy cập source này.")
+
+    # Chỉ chạy lại task lỗi, các trang/chunk đã xong được lấy lại từ checkpoint
+    if not ingestion_task_service.reset_failed_task(task.id, db):
+        raise HTTPException(status_code=409, detail="Chỉ có thể chạy lại source đang ở trạng thái failed.")
+
+    ingestion_job_service.refresh_status(task.job_id, db)
+    ingestion_worker.submit(task.id)
+
+    db.refresh(task)
+    return format_task(task)
+
+@router.post("/source/{source_id}/rechunk")
+def rechunk_source(
+    source_id: int,
+    request: RechunkRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(UserService.get_current_user)
+):
+    task = ingestion_task_service.get_latest_task_by_source_id(source_id, db)
+    if not task:
+        raise HTTPException(status_code=404, detail="Source chưa có job xử lý.")
+
+    if task.job.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Bạn không có quyền truy cập source này.")
+
+    if task.status != IngestionStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail="Chỉ có thể tách chunk lại source đã xử lý xong.")
+
+    if request.chunk_overlap >= request.chunk_size:
+        raise HTTPException(status_code=400, detail="chunk_overlap phải nhỏ hơn chunk_size.")
+
+    # Tách chunk + embed lại từ cây section đã lưu trên source, không OCR lại
+    chunks = source_service.rechunk_source(source_id, request.chunk_size, request.chunk_overlap)
+    if chunks is None:
+        raise HTTPException(status_code=409, detail="Source chưa có cây section đã lưu, cần xử lý lại file.")
+
+    return {
+        "source_id": source_id,
+        "chunks": chunks,
+        "chunk_size": request.chunk_size,
+        "chunk_overlap": request.chunk_overlap,
+    }
@@ -57,7 +57,8 @@ def rewrite_question(
         "question": question,
         "conversation_history": formatted_history,
     }
-    result = llm_service.get_chat_completion("rewrite_question", params)
+    with llm_service.client(f"user:{current_user.id}"):
+        result = llm_service.get_chat_completion("rewrite_question", params)
     return result
 
 from pydantic import BaseModel
@@ -150,10 +151,11 @@ def post_notebook_message(
     )
     message_service.add(user_message, db)
     
-    ai_response = message_service.chat(
-        query=message_request.query,
-        documents=format_retrieved_context(message_request.documents)
-    )
+    with llm_service.client(f"user:{current_user.id}"):
+        ai_response = message_service.chat(
+            query=message_request.query,
+            documents=format_retrieved_context(message_request.documents)
+        )
     
     # Convert messages and citations to JSON string for storage
     messages_content = json.dumps(ai_response.get("messages", []))
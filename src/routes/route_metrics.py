@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+
+from core import metrics
+from models.entities import User
+from services import UserService, cache_service, embedding_service, llm_service
+
+router = APIRouter()
+
+@router.get("")
+def get_metrics(current_user: User = Depends(UserService.get_current_user)):
+    result = metrics.snapshot()
+    result["caches"] = {
+        namespace: cache_service.stats(namespace)
+        for namespace in ("ocr", "image_caption", "embedding")
+    }
+    result["embedding"] = embedding_service.stats()
+    result["llm"] = llm_service.stats()
+    return result
@@ -1,6 +1,5 @@
 import os
 import uuid
-import shutil
 from typing import List, Optional
 
 from sqlalchemy.orm import Session
@@ -9,9 +8,10 @@ from fastapi.encoders import jsonable_encoder
 
 from core import config, logger
 from database import get_db
-from models.entities import User, Notebook, Source
+from models.entities import User, Notebook, Source, IngestionJob, IngestionTask
 from models.relationship import NotebookSource
-from services import UserService, notebook_service, source_service, notebook_source_service
+from services import UserService, notebook_service, source_service, notebook_source_service, \
+    ingestion_job_service, ingestion_worker
 from utils import get_bytes_and_hash, check_valid_file_type
 
 router = APIRouter()
@@ -74,11 +74,9 @@ def create_notebook(
     new_notebook = Notebook(title=valid_files[0].filename, user_id=current_user.id)
     new_notebook = notebook_service.add(new_notebook, db)
     
-    # Xử lý từng file hợp lệ
-    success_files = []
+    # Lưu từng file hợp lệ và tạo job xử lý ở background
     failed_files = list(invalid_format_files)  # Bắt đầu với các file sai định dạng
-    saved_paths = []  # Track các file đã lưu để cleanup khi fail
-    
+    pending_tasks = []
 
     for file in valid_files:
         file_name = file.filename
@@ -94,7 +92,6 @@ def create_notebook(
         try:
             with open(file_path, "wb") as f:
                 f.write(file.file.read())
-            saved_paths.append((file_path, file_images_dir))  # Track để cleanup
         except Exception as e:
             logger.error(f"Lỗi lưu file '{file_name}': {e}")
             failed_files.append(file_name)
@@ -111,50 +108,39 @@ def create_notebook(
         # Link notebook với source
         notebook_source = NotebookSource(notebook_id=new_notebook.id, source_id=source.id)
         notebook_source_service.add(notebook_source, db)
-        
-        try:
-            result = source_service.process_file(file_path, file_name, source.id, file_images_dir)
-            if result:
-                success_files.append(file_name)
-                logger.info(f"Xử lý file '{file_name}' thành công")
-            else:
-                failed_files.append(file_name)
-                logger.warning(f"Xử lý file '{file_name}' trả về False")
-        except Exception as e:
-            logger.error(f"Lỗi xử lý file '{file_name}': {e}")
-            failed_files.append(file_name)
-            continue
+
+        pending_tasks.append(
+            IngestionTask(
+                source_id=source.id,
+                filename=file_name,
+                file_path=file_path,
+                output_dir=file_images_dir,
+            )
+        )
     
-    # Kiểm tra kết quả
-    if not success_files:
-        # Cleanup: xóa static files đã lưu
-        for file_path, images_dir in saved_paths:
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Đã xóa file: {file_path}")
-                if os.path.exists(images_dir):
-                    shutil.rmtree(images_dir)
-                    logger.info(f"Đã xóa thư mục: {images_dir}")
-            except Exception as e:
-                logger.error(f"Lỗi xóa file/folder: {e}")
-        
-        # Cleanup: xóa notebook trong DB
+    # Không lưu được file nào -> xóa notebook
+    if not pending_tasks:
         try:
             notebook_service.delete(new_notebook.id, db)
-            logger.info(f"Đã xóa notebook {new_notebook.id} do không có file nào xử lý thành công")
+            logger.info(f"Đã xóa notebook {new_notebook.id} do không lưu được file nào")
         except Exception as e:
             logger.error(f"Lỗi khi xóa notebook {new_notebook.id}: {e}")
         
         raise HTTPException(
             status_code=500,
-            detail=f"Xử lý thất bại tất cả files. Files lỗi: {failed_files}"
+            detail=f"Lưu thất bại tất cả files. Files lỗi: {failed_files}"
         )
     
-    # Có ít nhất 1 file thành công -> thành công
+    # Tạo job, worker sẽ xử lý các file ở background
+    job = IngestionJob(notebook_id=new_notebook.id, user_id=current_user.id, tasks=pending_tasks)
+    job = ingestion_job_service.add(job, db)
+    for task in job.tasks:
+        ingestion_worker.submit(task.id)
+    
     return {
         "notebook": jsonable_encoder(new_notebook),
-        "success_files": success_files,
+        "job_id": job.id,
+        "status": job.status.value,
         "failed_files": failed_files if failed_files else None,
     }
     
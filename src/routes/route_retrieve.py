@@ -33,7 +33,7 @@ async def normal_retrieve(
         params["num_docs"] = len(texts)
         params["top_k"] = min(len(texts), 3)
         params["documents"] = texts
-        doc_indices = llm_service.get_chat_completion(task, params)["reranked_indices"]
+        doc_indices = (await llm_service.aget_chat_completion(task, params))["reranked_indices"]
         texts = [
             {
                 "content": texts[i]["content"],
@@ -60,7 +60,7 @@ async def normal_retrieve(
         params["num_docs"] = len(images)
         params["top_k"] = min(len(images), 3)
         params["documents"] = images
-        doc_indices = llm_service.get_chat_completion(task, params)["reranked_indices"]
+        doc_indices = (await llm_service.aget_chat_completion(task, params))["reranked_indices"]
         for i in doc_indices:
             image = images[i]
 
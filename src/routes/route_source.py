@@ -20,4 +20,5 @@ def get_sources_by_notebook_id(
     current_user: User = Depends(UserService.get_current_user),
 ):
     sources = source_service.get_sources_by_notebook_id(notebook_id, db)
-    return [jsonable_encoder(source) for source in sources]
\ No newline at end of file
+    # Cây section (structure_config) có thể rất lớn, không trả về trong danh sách
+    return [jsonable_encoder(source, exclude={"structure_config"}) for source in sources]
\ No newline at end of file
@@ -1 +1,2 @@
-from .schm_user import UserCreateRequest
\ No newline at end of file
+from .schm_user import UserCreateRequest
+from .schm_ingestion import RechunkRequest
\ No newline at end of file
@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+class RechunkRequest(BaseModel):
+    chunk_size: int = Field(gt=0)
+    chunk_overlap: int = Field(ge=0)
@@ -2,7 +2,12 @@ from .srv_user import UserService
 from .srv_notebook import notebook_service
 from .srv_notebook_source import notebook_source_service
 from .srv_message import message_service
+from .srv_cache import cache_service
+from .srv_embedding import embedding_service
+from .srv_checkpoint import checkpoint_service, SourceCheckpoint
+from .office import office_converter_service
 
 from .llm.srv_llm import llm_service
 from .srv_source import source_service
-from .qdrant.srv_qdrant import qdrant_service
\ No newline at end of file
+from .qdrant.srv_qdrant import qdrant_service
+from .ingestion import ingestion_job_service, ingestion_task_service, ingestion_worker
\ No newline at end of file
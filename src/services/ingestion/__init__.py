@@ -0,0 +1,2 @@
+from .srv_ingestion import ingestion_job_service, ingestion_task_service
+from .worker import ingestion_worker
@@ -0,0 +1,157 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from models.entities import IngestionJob, IngestionTask, IngestionStatus
+from services.srv_base import BaseService
+
+class IngestionJobService(BaseService[IngestionJob]):
+    def __init__(self, model: type[IngestionJob]):
+        super().__init__(model)
+
+    def refresh_status(self, job_id: int, db: Session) -> Optional[IngestionJob]:
+        """Tính lại trạng thái job từ trạng thái các task con"""
+        job = self.get_by_id(job_id, db)
+        if not job:
+            return None
+
+        statuses = [task.status for task in job.tasks]
+        if any(s in (IngestionStatus.PENDING, IngestionStatus.RUNNING) for s in statuses):
+            all_pending = all(s == IngestionStatus.PENDING for s in statuses)
+            job.status = IngestionStatus.PENDING if all_pending else IngestionStatus.RUNNING
+        elif statuses and all(s == IngestionStatus.FAILED for s in statuses):
+            job.status = IngestionStatus.FAILED
+        else:
+            # Có ít nhất 1 file thành công -> thành công
+            job.status = IngestionStatus.SUCCEEDED
+
+        job.updated_at = datetime.now().isoformat()
+        db.commit()
+        db.refresh(job)
+        return job
+
+
+class IngestionTaskService(BaseService[IngestionTask]):
+    def __init__(self, model: type[IngestionTask]):
+        super().__init__(model)
+
+    def get_tasks_by_job_id(self, job_id: int, db: Session) -> List[IngestionTask]:
+        return (
+            db.query(self.model)
+            .filter(self.model.job_id == job_id)
+            .order_by(self.model.id.asc())
+            .all()
+        )
+
+    def get_latest_task_by_source_id(self, source_id: int, db: Session) -> Optional[IngestionTask]:
+        return (
+            db.query(self.model)
+            .filter(self.model.source_id == source_id)
+            .order_by(self.model.id.desc())
+            .first()
+        )
+
+    def get_pending_tasks(self, db: Session) -> List[IngestionTask]:
+        return (
+            db.query(self.model)
+            .filter(self.model.status == IngestionStatus.PENDING)
+            .order_by(self.model.id.asc())
+            .all()
+        )
+
+    def reset_stale_tasks(self, stale_before: str, db: Session) -> List[int]:
+        """Task RUNNING không có heartbeat từ stale_before (worker đã chết) được đưa về PENDING để chạy lại.
+
+        Task của worker khác vẫn đang chạy (nhiều process / replica) không bị động tới.
+        """
+        stale = (
+            (self.model.status == IngestionStatus.RUNNING)
+            & ((self.model.heartbeat_at.is_(None)) | (self.model.heartbeat_at < stale_before))
+        )
+        task_ids = [row.id for row in db.query(self.model.id).filter(stale).all()]
+        if not task_ids:
+            return []
+
+        db.query(self.model).filter(self.model.id.in_(task_ids), stale).update(
+            {self.model.status: IngestionStatus.PENDING, self.model.worker_id: None},
+            synchronize_session=False
+        )
+        db.commit()
+        return task_ids
+
+    def claim(self, task_id: int, worker_id: str, db: Session) -> bool:
+        """Chuyển task PENDING -> RUNNING một cách nguyên tử, tránh 2 worker cùng chạy 1 task"""
+        now = datetime.now().isoformat()
+        count = (
+            db.query(self.model)
+            .filter(self.model.id == task_id, self.model.status == IngestionStatus.PENDING)
+            .update(
+                {
+                    self.model.status: IngestionStatus.RUNNING,
+                    self.model.started_at: now,
+                    self.model.error: None,
+                    self.model.worker_id: worker_id,
+                    self.model.heartbeat_at: now,
+                },
+                synchronize_session=False
+            )
+        )
+        db.commit()
+        return count == 1
+
+    def heartbeat(self, worker_id: str, db: Session) -> int:
+        """Đánh dấu các task RUNNING của worker là còn chạy"""
+        count = (
+            db.query(self.model)
+            .filter(self.model.worker_id == worker_id, self.model.status == IngestionStatus.RUNNING)
+            .update({self.model.heartbeat_at: datetime.now().isoformat()}, synchronize_session=False)
+        )
+        db.commit()
+        return count
+
+    def reset_failed_task(self, task_id: int, db: Session) -> bool:
+        """Đưa task FAILED về PENDING để chạy lại, pipeline sẽ tiếp tục từ checkpoint của source"""
+        count = (
+            db.query(self.model)
+            .filter(self.model.id == task_id, self.model.status == IngestionStatus.FAILED)
+            .update(
+                {
+                    self.model.status: IngestionStatus.PENDING,
+                    self.model.error: None,
+                    self.model.finished_at: None,
+                    self.model.updated_at: datetime.now().isoformat(),
+                },
+                synchronize_session=False
+            )
+        )
+        db.commit()
+        return count == 1
+
+    def update_progress(self, task_id: int, counters: dict, db: Session):
+        values = {
+            getattr(self.model, key): counters[key]
+            for key in ("pages_total", "pages_ocr", "chunks_total", "chunks_embedded")
+            if key in counters
+        }
+        values[self.model.result] = counters
+        values[self.model.updated_at] = datetime.now().isoformat()
+        db.query(self.model).filter(self.model.id == task_id).update(values, synchronize_session=False)
+        db.commit()
+
+    def finish(self, task_id: int, status: IngestionStatus, db: Session, error: Optional[str] = None):
+        now = datetime.now().isoformat()
+        db.query(self.model).filter(self.model.id == task_id).update(
+            {
+                self.model.status: status,
+                self.model.error: error,
+                self.model.finished_at: now,
+                self.model.updated_at: now,
+            },
+            synchronize_session=False
+        )
+        db.commit()
+
+
+ingestion_job_service = IngestionJobService(IngestionJob)
+ingestion_task_service = IngestionTaskService(IngestionTask)
@@ -0,0 +1,199 @@
+import os
+import shutil
+import socket
+import time
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from core import config, logger
+from database import SessionLocal
+from models.entities import IngestionStatus
+from services.llm.srv_llm import llm_service
+from services.srv_notebook import notebook_service
+from services.srv_source import source_service
+from services.process_document.utils import IngestionProgress
+from .srv_ingestion import ingestion_job_service, ingestion_task_service
+
+class IngestionWorker:
+    """Pool giới hạn số luồng chạy pipeline xử lý tài liệu ở background.
+
+    Mỗi process có worker_id riêng và heartbeat định kỳ cho các task đang chạy, nên nhiều process / replica
+    dùng chung database không chạy lại task của nhau; chỉ task RUNNING mất heartbeat quá stale_after giây
+    (worker đã chết) mới được đưa về hàng đợi.
+    """
+    def __init__(
+        self,
+        max_workers: int = 2,
+        flush_interval: float = 1.0,
+        heartbeat_interval: float = 15,
+        stale_after: float = 120
+    ):
+        self._max_workers = max_workers
+        self._flush_interval = flush_interval
+        self._heartbeat_interval = float(heartbeat_interval)
+        self._stale_after = float(stale_after)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._get_executor()
+        self._stopped.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="ingestion-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+        self.resume()
+
+    def shutdown(self):
+        self._stopped.set()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def resume(self):
+        """Đưa lại vào hàng đợi các task chưa chạy và task của worker đã chết (sau khi restart process)"""
+        with SessionLocal() as db:
+            reset_ids = ingestion_task_service.reset_stale_tasks(self._stale_before(), db)
+            task_ids = [task.id for task in ingestion_task_service.get_pending_tasks(db)]
+
+        if task_ids:
+            logger.info(f"Ingestion: resume {len(task_ids)} tasks ({len(reset_ids)} bị gián đoạn)")
+        for task_id in task_ids:
+            self.submit(task_id)
+
+    def submit(self, task_id: int):
+        self._get_executor().submit(self._run, task_id)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="ingestion"
+                )
+            return self._executor
+
+    def _stale_before(self) -> str:
+        return (datetime.now() - timedelta(seconds=self._stale_after)).isoformat()
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self._heartbeat_interval):
+            try:
+                with SessionLocal() as db:
+                    ingestion_task_service.heartbeat(self.worker_id, db)
+                    # Task của worker khác đã chết trong lúc process này đang chạy
+                    reset_ids = ingestion_task_service.reset_stale_tasks(self._stale_before(), db)
+            except Exception as e:
+                logger.error(f"Ingestion: lỗi heartbeat worker {self.worker_id}: {e}")
+                continue
+
+            if reset_ids:
+                logger.info(f"Ingestion: chạy lại {len(reset_ids)} task của worker không còn heartbeat")
+            for task_id in reset_ids:
+                self.submit(task_id)
+
+    def _run(self, task_id: int):
+        with SessionLocal() as db:
+            if not ingestion_task_service.claim(task_id, self.worker_id, db):
+                return
+            task = ingestion_task_service.get_by_id(task_id, db)
+            job_id = task.job_id
+            user_id = task.job.user_id
+            source_id = task.source_id
+            filename = task.filename
+            file_path = task.file_path
+            output_dir = task.output_dir
+            # Job chuyển sang RUNNING ngay khi task đầu tiên bắt đầu, không chờ task xong
+            ingestion_job_service.refresh_status(job_id, db)
+
+        progress = IngestionProgress(on_change=self._throttled_flush(task_id))
+        status, error = IngestionStatus.SUCCEEDED, None
+        try:
+            logger.info(f"Ingestion: bắt đầu xử lý '{filename}' (task {task_id})")
+            # Request LLM của file được xếp hàng theo user, nhiều file lớn của một user không chặn user khác
+            with llm_service.client(f"user:{user_id}"):
+                result = source_service.process_file(file_path, filename, source_id, output_dir, progress=progress)
+            if not result:
+                status, error = IngestionStatus.FAILED, "process_file trả về False"
+                if progress.get("pages_failed"):
+                    error = f"{progress.get('pages_failed')} trang OCR lỗi, retry để OCR lại các trang này"
+                elif progress.get("captions_failed"):
+                    error = f"{progress.get('captions_failed')} ảnh caption lỗi, retry để caption lại các ảnh này"
+        except Exception as e:
+            logger.error(f"Ingestion: lỗi xử lý file '{filename}' (task {task_id}): {e}")
+            status, error = IngestionStatus.FAILED, str(e)
+
+        self._flush(task_id, progress.snapshot())
+        try:
+            with SessionLocal() as db:
+                ingestion_task_service.finish(task_id, status, db, error=error)
+                job = ingestion_job_service.refresh_status(job_id, db)
+                job_failed = job is not None and job.status == IngestionStatus.FAILED
+        except Exception as e:
+            # Task vẫn RUNNING nhưng không còn heartbeat, sẽ được chạy lại sau stale_after giây
+            logger.error(f"Ingestion: lỗi cập nhật trạng thái task {task_id}: {e}")
+            return
+        logger.info(f"Ingestion: task {task_id} kết thúc với trạng thái {status.value}")
+
+        if job_failed:
+            self._cleanup_failed_job(job_id)
+
+    def _cleanup_failed_job(self, job_id: int):
+        """Mọi file của job đều lỗi: xóa file đã upload, thư mục ảnh và notebook.
+
+        Giữ lại nếu có task chỉ lỗi một số trang OCR / ảnh caption, retry task đó chỉ cần xử lý lại phần lỗi.
+        """
+        try:
+            with SessionLocal() as db:
+                job = ingestion_job_service.get_by_id(job_id, db)
+                if job is None or any(
+                    (task.result or {}).get(key) for task in job.tasks for key in IngestionProgress.FAILURE_KEYS
+                ):
+                    return
+
+                for task in job.tasks:
+                    if os.path.exists(task.file_path):
+                        os.remove(task.file_path)
+                        logger.info(f"Đã xóa file: {task.file_path}")
+                    if os.path.exists(task.output_dir):
+                        shutil.rmtree(task.output_dir)
+                        logger.info(f"Đã xóa thư mục: {task.output_dir}")
+
+                notebook_id = job.notebook_id
+                notebook_service.delete(notebook_id, db)
+                logger.info(f"Đã xóa notebook {notebook_id} do không có file nào xử lý thành công")
+        except Exception as e:
+            logger.error(f"Ingestion: lỗi dọn dẹp job {job_id}: {e}")
+
+    def _throttled_flush(self, task_id: int):
+        lock = threading.Lock()
+        last_flush = [0.0]
+
+        def on_change(counters: Dict[str, int]):
+            with lock:
+                now = time.monotonic()
+                if now - last_flush[0] < self._flush_interval:
+                    return
+                last_flush[0] = now
+            self._flush(task_id, counters)
+        return on_change
+
+    def _flush(self, task_id: int, counters: Dict[str, int]):
+        try:
+            with SessionLocal() as db:
+                ingestion_task_service.update_progress(task_id, counters, db)
+        except Exception as e:
+            logger.error(f"Ingestion: lỗi cập nhật tiến độ task {task_id}: {e}")
+
+
+ingestion_worker = IngestionWorker(
+    max_workers=config.ingestion_max_workers,
+    flush_interval=config.ingestion_progress_flush_seconds,
+    heartbeat_interval=config.ingestion_heartbeat_seconds,
+    stale_after=config.ingestion_stale_seconds,
+)
@@ -0,0 +1,285 @@
+import asyncio
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Mapping, Optional, Tuple
+
+from core import metrics
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """HTTP status của lỗi từ provider (openai.APIStatusError và các lỗi có status_code / response)"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_throttled(error: Exception) -> bool:
+    """429 (rate limit) hoặc 5xx (provider quá tải): nên giảm tải rồi gửi lại"""
+    status = get_status_code(error)
+    return status is not None and (status == 429 or status >= 500)
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Số giây phải chờ theo header retry-after-ms / Retry-After (giây hoặc HTTP date), None nếu không có"""
+    headers: Mapping = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(0.0, float(value) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+class AdaptiveLimiter:
+    """Giới hạn số request đồng thời tới một provider, tự điều chỉnh theo kiểu AIMD.
+
+    - Tăng cộng: mỗi lần đủ `limit` request thành công liên tiếp khi đang dùng hết giới hạn và độ trễ
+      vẫn trong khoảng latency_tolerance lần độ trễ tốt nhất từng thấy -> limit + 1.
+    - Giảm nhân: 429 / 5xx -> limit * decrease_factor, một lần cho mỗi đợt throttle (bỏ qua phản hồi của
+      các request đã gửi trước lần giảm gần nhất).
+    - Retry-After: tạm dừng cấp slot mới cho provider tới hết thời gian provider yêu cầu.
+
+    Request chờ slot được xếp theo độ ưu tiên:
+    - interactive (chat) luôn được cấp slot trước bulk (ingest), và có interactive_reserve slot bulk không được dùng
+      nên chat không phải chờ request ingest đang chạy xong
+    - bulk đang chờ mà không được cấp slot nào trong bulk_max_wait giây thì được cấp slot trống tiếp theo
+      trước interactive (chống đói khi chat chiếm hết slot)
+    - trong cùng độ ưu tiên, các client (user) chia slot theo weighted fair queuing (start-time fair queuing):
+      client có weight gấp đôi nhận gấp đôi số slot, một client gửi hàng nghìn request không chặn client khác
+
+    Giữ độ trễ của latency_window request thành công gần nhất để tính percentile (dùng cho hedged request).
+
+    Chỉ dùng trên một event loop (event loop nền của LLMService). Metric: llm.<name>.limit / in_flight /
+    queue_depth / latency_ms, llm.<name>.<priority>.queue_depth (gauge) và llm.<name>.requests / throttled /
+    errors, llm.<name>.<priority>.wait.seconds / wait.calls (counter).
+    """
+    def __init__(
+        self,
+        name: str,
+        initial: int = 3,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        adaptive: bool = True,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        latency_window: int = 200,
+        interactive_reserve: int = 0,
+        bulk_max_wait: float = 30.0
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.adaptive = adaptive
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.interactive_reserve = interactive_reserve
+        self.bulk_max_wait = bulk_max_wait
+
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiting = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency: Optional[float] = None
+        self._best_latency: Optional[float] = None
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+
+        # priority -> client -> hàng đợi (future, thời điểm vào hàng, weight)
+        self._queues: Dict[str, Dict[str, Deque[Tuple[asyncio.Future, float, float]]]] = {
+            priority: {} for priority in PRIORITIES
+        }
+        # Virtual start time của request tiếp theo của mỗi client và virtual time hiện tại của mỗi độ ưu tiên
+        self._start_tags: Dict[str, Dict[str, float]] = {priority: {} for priority in PRIORITIES}
+        self._virtual_time: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self._last_grant: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self._resume_handle: Optional[asyncio.TimerHandle] = None
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    async def acquire(self, priority: str = INTERACTIVE, client: str = "default", weight: float = 1.0) -> float:
+        """Chờ tới khi có slot, trả về thời điểm bắt đầu request (truyền lại cho release)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queued_at = loop.time()
+
+        queue = self._queues[priority].setdefault(client, deque())
+        if not queue:
+            # Client vừa quay lại: không được hưởng phần slot đã không dùng lúc rảnh
+            start_tags = self._start_tags[priority]
+            start_tags[client] = max(start_tags.get(client, 0.0), self._virtual_time[priority])
+        entry = (future, queued_at, max(weight, 1e-6))
+        queue.append(entry)
+        self._waiting += 1
+        self._dispatch()
+        self._publish()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Đã được cấp slot nhưng caller bị hủy trước khi dùng: trả lại slot
+                self._in_flight -= 1
+            elif entry in queue:
+                queue.remove(entry)
+                self._waiting -= 1
+                if not queue and self._queues[priority].get(client) is queue:
+                    del self._queues[priority][client]
+            self._dispatch()
+            self._publish()
+            raise
+
+        metrics.incr(f"llm.{self.name}.requests")
+        metrics.incr(f"llm.{self.name}.{priority}.wait.seconds", loop.time() - queued_at)
+        metrics.incr(f"llm.{self.name}.{priority}.wait.calls")
+        return loop.time()
+
+    def release(
+        self,
+        started: float,
+        error: Optional[BaseException] = None,
+        retry_after: Optional[float] = None
+    ):
+        now = asyncio.get_running_loop().time()
+        saturated = self._waiting > 0 or self._in_flight >= self.limit
+        self._in_flight -= 1
+
+        if isinstance(error, asyncio.CancelledError):
+            # Request bị hủy (thua hedged request, hết deadline): không có thông tin về tải
+            pass
+        elif error is not None and is_throttled(error):
+            metrics.incr(f"llm.{self.name}.throttled")
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if self.adaptive and started >= self._last_decrease:
+                self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+                self._last_decrease = now
+        elif error is not None:
+            # Lỗi không phải do tải (4xx, parse...) không dùng để điều chỉnh
+            metrics.incr(f"llm.{self.name}.errors")
+        else:
+            latency = now - started
+            self._latencies.append(latency)
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            self._best_latency = min(self._best_latency or self._latency, self._latency)
+            healthy = self._latency <= self.latency_tolerance * self._best_latency
+            if self.adaptive and saturated and healthy:
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+        self._dispatch()
+        self._publish()
+
+    def latency_percentile(self, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """Độ trễ (giây) ở percentile (0-100) của các request thành công gần đây, None nếu chưa đủ mẫu"""
+        if len(self._latencies) < max(1, min_samples):
+            return None
+        latencies = sorted(self._latencies)
+        rank = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        return latencies[rank]
+
+    def _dispatch(self):
+        """Cấp slot trống cho các request đang chờ theo độ ưu tiên và fair queuing"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._paused_until > now:
+            if self._resume_handle is None:
+                self._resume_handle = loop.call_at(self._paused_until, self._resume)
+            return
+
+        while self._in_flight < self.limit:
+            priority = self._next_priority(now)
+            if priority is None:
+                return
+            future = self._pop(priority)
+            self._waiting -= 1
+            if future.done():
+                # Caller đã bị hủy trong lúc chờ
+                continue
+            self._in_flight += 1
+            self._last_grant[priority] = now
+            future.set_result(None)
+
+    def _resume(self):
+        self._resume_handle = None
+        self._dispatch()
+        self._publish()
+
+    def _next_priority(self, now: float) -> Optional[str]:
+        interactive, bulk = self._queues[INTERACTIVE], self._queues[BULK]
+        if bulk and self.bulk_max_wait:
+            # Tính từ lần cuối bulk được cấp slot (hàng đợi ingest dài nhưng vẫn chạy thì không phải bị đói)
+            oldest = min(queue[0][1] for queue in bulk.values())
+            if now - max(oldest, self._last_grant[BULK]) >= self.bulk_max_wait:
+                return BULK
+        if interactive:
+            return INTERACTIVE
+        # Luôn để bulk dùng được ít nhất một slot
+        reserve = min(self.interactive_reserve, self.limit - 1)
+        if bulk and self._in_flight < self.limit - reserve:
+            return BULK
+        return None
+
+    def _pop(self, priority: str) -> asyncio.Future:
+        queues, start_tags = self._queues[priority], self._start_tags[priority]
+        client = min(queues, key=start_tags.__getitem__)
+        queue = queues[client]
+        future, _, weight = queue.popleft()
+
+        self._virtual_time[priority] = start_tags[client]
+        start_tags[client] += 1 / weight
+        if not queue:
+            del queues[client]
+        # Client không còn request chờ và không đi trước virtual time thì không cần giữ start tag
+        for idle in [c for c, tag in start_tags.items() if c not in queues and tag <= self._virtual_time[priority]]:
+            del start_tags[idle]
+        return future
+
+    def reset_loop(self):
+        # Future và timer gắn với loop cũ (loop nền của LLMService có thể được tạo lại sau shutdown)
+        for queues in self._queues.values():
+            queues.clear()
+        self._resume_handle = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge(f"llm.{self.name}.limit", self.limit)
+        metrics.set_gauge(f"llm.{self.name}.in_flight", self._in_flight)
+        metrics.set_gauge(f"llm.{self.name}.queue_depth", self._waiting)
+        for priority, queues in self._queues.items():
+            metrics.set_gauge(f"llm.{self.name}.{priority}.queue_depth", sum(len(queue) for queue in queues.values()))
+        if self._latency is not None:
+            metrics.set_gauge(f"llm.{self.name}.latency_ms", round(self._latency * 1000, 1))
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": self._waiting,
+            "queue_depth_by_priority": {
+                priority: sum(len(queue) for queue in queues.values())
+                for priority, queues in self._queues.items()
+            },
+            "latency_ms": round(self._latency * 1000, 1) if self._latency is not None else None,
+            "adaptive": self.adaptive,
+        }
@@ -0,0 +1,13 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+from langchain_core.output_parsers import PydanticOutputParser
+
+class ImageCaptionItem(BaseModel):
+    index: int = Field(..., description="Vị trí của hình ảnh cần mô tả theo thứ tự gửi lên, bắt đầu từ 0.")
+    description: str = Field(..., description="Mô tả ngắn gọn về nội dung chính của hình ảnh.")
+
+class ImageCaptionBatchResponse(BaseModel):
+    captions: List[ImageCaptionItem] = Field(..., description="Danh sách mô tả, mỗi hình ảnh cần mô tả có đúng một phần tử.")
+
+parser = PydanticOutputParser(pydantic_object=ImageCaptionBatchResponse)
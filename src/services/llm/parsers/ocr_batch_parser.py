@@ -0,0 +1,15 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+from langchain_core.output_parsers import PydanticOutputParser
+
+from .ocr_parser import DocSegmentResponse
+
+class PageOcrResponse(BaseModel):
+    page_number: int = Field(..., description="Số trang của ảnh, đúng với số trang được cung cấp trong câu hỏi")
+    ocr_response: List[DocSegmentResponse] = Field(..., description="Danh sách các đoạn của trang, index bắt đầu từ 0 trong mỗi trang")
+
+class OcrBatchResponse(BaseModel):
+    pages: List[PageOcrResponse] = Field(..., description="Kết quả OCR của từng trang, mỗi ảnh trang có đúng một phần tử")
+
+parser = PydanticOutputParser(pydantic_object=OcrBatchResponse)
@@ -4,7 +4,9 @@ Each header has an original order index, title, and page range.
 
 Your task:
 1. Infer the correct hierarchical structure (chapter / section / subsection) and assign into a hierarchical tree structure.
-3. Keep the id provided in the input. Do NOT reassign or change them.
+2. Sections that already have a parent_index in the input are fixed anchors from the surrounding document.
+   Return them with exactly the given parent_index and only use them as context to place the other sections.
+3. Keep the index provided in the input. Do NOT reassign or change them.
 4. Root node should be level 0 with title "ROOT".
 5. Do NOT invent or remove sections.
 6. Do NOT modify titles.
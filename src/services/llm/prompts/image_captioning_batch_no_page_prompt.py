@@ -0,0 +1,16 @@
+prompt = """MÔ TẢ từng hình ảnh sao cho người đọc tài liệu, ngay cả khi không nhìn thấy hình, vẫn có thể hiểu hình ảnh đó đang minh họa cho nội dung gì trong tài liệu hướng dẫn.
+
+ĐẦU VÀO:
+- Tất cả hình ảnh được gửi đều là các hình ảnh CẦN ĐƯỢC MÔ TẢ (ảnh chụp màn hình, ảnh minh họa thao tác, sơ đồ, biểu đồ…), đánh index từ 0 theo đúng thứ tự được gửi.
+- Các hình ảnh nằm liền nhau trong cùng một tài liệu, KHÔNG có hình ảnh toàn trang.
+
+NGUYÊN TẮC MÔ TẢ:
+1. Mô tả trung thực những gì NHÌN THẤY trong từng hình ảnh, không trộn nội dung giữa các hình.
+2. Ngôn ngữ:
+   - Trung lập, mang tính tài liệu
+   - Không dùng ngôi thứ nhất
+3. Dựa vào các hình ảnh liền trước / liền sau để hiểu bối cảnh, mô tả từng hình ảnh dưới vai người dùng sử dụng phần mềm. Ví dụ: Bước 1: Vào giao diện chính, bạn sẽ thấy...; Bước 2: Sau khi điền thông tin, vui lòng ấn Next để đăng nhập,...
+4. Trả về ĐÚNG một mô tả cho mỗi hình ảnh, giữ nguyên index.
+
+Chỉ trả về JSON hợp lệ. Không thêm bất kỳ nội dung nào khác: 
+"""
@@ -0,0 +1,111 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from .limiter import BULK, INTERACTIVE
+from .parsers import ocr_parser, summarize_history_parser, notebook_chat_parser, \
+    image_captioning_parser, correct_section_structure_parser, rerank_parser, \
+    rewrite_question_parser, image_captioning_batch_parser, ocr_batch_parser
+from .prompts import ocr_prompt, summarize_history_prompt, notebook_chat_prompt, \
+    image_captioning_prompt, correct_section_structure_prompt, rerank_prompt, \
+    rewrite_question_prompt, image_captioning_batch_prompt, ocr_batch_prompt, image_captioning_batch_no_page_prompt
+
+PROVIDERS = ("text", "vision")
+
+@dataclass(frozen=True)
+class LLMTask:
+    """Một task LLM đã dựng sẵn: prompt (kèm format instructions), parser, provider và độ ưu tiên"""
+    name: str
+    prompt: ChatPromptTemplate
+    parser: Optional[BaseOutputParser]
+    provider: str
+    priority: str
+    # Prompt + format instructions, dùng làm một phần của version prompt trong key cache
+    fingerprint: str
+    # Prompt không có biến: system message được format sẵn một lần
+    static_messages: Optional[List[BaseMessage]] = field(default=None, repr=False)
+
+    def format_messages(self, **kwargs) -> List[BaseMessage]:
+        if self.static_messages is not None:
+            return list(self.static_messages)
+        return self.prompt.format_messages(**kwargs)
+
+class TaskRegistry:
+    """task -> LLMTask, dựng một lần khi import (ChatPromptTemplate, JSON schema của parser), tra cứu O(1).
+
+    Thêm task mới: task_registry.register("ten_task", prompt_template, parser, provider="text").
+    """
+    def __init__(self):
+        self._tasks: Dict[str, LLMTask] = {}
+
+    def register(
+        self,
+        name: str,
+        prompt_template: str,
+        parser: Optional[BaseOutputParser],
+        provider: str,
+        priority: str = BULK,
+        replace: bool = False
+    ) -> LLMTask:
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown provider: {provider}")
+        if priority not in (INTERACTIVE, BULK):
+            raise ValueError(f"Unknown priority: {priority}")
+        if name in self._tasks and not replace:
+            raise ValueError(f"Task already registered: {name}")
+
+        format_instructions = parser.get_format_instructions() if parser else ""
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", prompt_template + "\n{format_instructions}"),
+            ]
+        ).partial(format_instructions=format_instructions)
+
+        task = LLMTask(
+            name=name,
+            prompt=prompt,
+            parser=parser,
+            provider=provider,
+            priority=priority,
+            fingerprint="\n".join([
+                *(message.prompt.template for message in prompt.messages),
+                *(str(value) for value in prompt.partial_variables.values()),
+            ]),
+            static_messages=None if prompt.input_variables else prompt.format_messages(),
+        )
+        self._tasks[name] = task
+        return task
+
+    def get(self, name: str) -> LLMTask:
+        try:
+            return self._tasks[name]
+        except KeyError:
+            raise ValueError(f"Unknown task: {name}") from None
+
+    def names(self, provider: Optional[str] = None, priority: Optional[str] = None) -> Set[str]:
+        return {
+            name for name, task in self._tasks.items()
+            if (provider is None or task.provider == provider) and (priority is None or task.priority == priority)
+        }
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tasks
+
+task_registry = TaskRegistry()
+
+# TEXT-ONLY TASK
+task_registry.register("summarize_history", summarize_history_prompt.propmt, summarize_history_parser.parser, "text", INTERACTIVE)
+task_registry.register("notebook_chat", notebook_chat_prompt.prompt, notebook_chat_parser.parser, "text", INTERACTIVE)
+task_registry.register("rerank", rerank_prompt.prompt, rerank_parser.parser, "text", INTERACTIVE)
+task_registry.register("rewrite_question", rewrite_question_prompt.prompt, rewrite_question_parser.parser, "text", INTERACTIVE)
+task_registry.register("correct_section_structure", correct_section_structure_prompt.prompt, correct_section_structure_parser.parser, "text")
+
+# IMAGE TASK
+task_registry.register("image_captioning", image_captioning_prompt.prompt, image_captioning_parser.parser, "vision")
+task_registry.register("image_captioning_batch", image_captioning_batch_prompt.prompt, image_captioning_batch_parser.parser, "vision")
+task_registry.register("image_captioning_batch_no_page", image_captioning_batch_no_page_prompt.prompt, image_captioning_batch_parser.parser, "vision")
+task_registry.register("image_captioning_v2", ocr_prompt.prompt, ocr_parser.parser, "vision")
+task_registry.register("ocr_batch", ocr_batch_prompt.prompt, ocr_batch_parser.parser, "vision")
@@ -0,0 +1,45 @@
+import asyncio
+import random
+from typing import Dict, Optional
+
+from .limiter import get_status_code, is_throttled
+
+# Lỗi mạng / timeout của SDK openai (APITimeoutError, APIConnectionError) và httpx, so theo tên để không phụ thuộc SDK
+TRANSIENT_ERROR_NAMES = {
+    "APITimeoutError", "APIConnectionError", "ConnectError", "ConnectTimeout", "ReadTimeout",
+    "ReadError", "RemoteProtocolError", "PoolTimeout",
+}
+
+# Gửi kèm response lỗi khi yêu cầu LLM trả lời lại đúng format
+REPROMPT_MESSAGE = (
+    "Câu trả lời trước không đúng định dạng yêu cầu, lỗi khi đọc: {error}\n"
+    "Hãy trả lời lại toàn bộ, chỉ gồm JSON hợp lệ đúng format instructions, không thêm nội dung nào khác."
+)
+
+def is_transient(error: BaseException) -> bool:
+    """Lỗi tạm thời, gửi lại có thể thành công: 408, 429, 5xx, timeout, mất kết nối"""
+    if is_throttled(error) or get_status_code(error) == 408:
+        return True
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Full jitter: ngẫu nhiên trong [0, min(cap, base * 2^attempt)] để các request lỗi cùng lúc không gửi lại cùng lúc.
+
+    Provider trả Retry-After thì chờ ít nhất chừng đó, cộng thêm jitter nhỏ.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        return retry_after + delay * 0.1
+    return delay
+
+def parse_task_deadlines(value: str) -> Dict[str, float]:
+    """"ocr_batch=120,rerank=20" -> {"ocr_batch": 120.0, "rerank": 20.0}"""
+    deadlines = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        task, _, seconds = item.partition("=")
+        deadlines[task.strip()] = float(seconds)
+    return deadlines
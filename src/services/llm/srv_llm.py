@@ -1,89 +1,380 @@
+import asyncio
+import hashlib
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
 
 from core.llm import openai_llm, gemini_llm
-from .get_prompt import get_prompt_by_task
-from langchain_core.messages import HumanMessage
-from core import logger
+from .limiter import AdaptiveLimiter, get_retry_after, get_status_code
+from .registry import LLMTask, task_registry
+from .resilience import REPROMPT_MESSAGE, backoff_delay, is_transient, parse_task_deadlines
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.prompt_values import ChatPromptValue
+from core import config, logger, metrics
+
+T = TypeVar("T")
+
+# (client, weight) của các lời gọi LLM trong context hiện tại, đặt bằng LLMService.client()
+_current_client: ContextVar[Tuple[str, float]] = ContextVar("llm_client", default=("default", 1.0))
 
 class LLMService:
-    def __init__(self, max_concurrent: int = 3):
-        self._semaphore = threading.Semaphore(max_concurrent)
-        self._max_concurrent = max_concurrent
-        self._executor = ThreadPoolExecutor(max_workers=max_concurrent)
+    """Gọi LLM qua đường async của LangChain (ainvoke) trên một event loop nền riêng.
+
+    Request đang chờ provider chỉ là coroutine, không giữ thread. Mỗi provider (text: OpenAI, vision: OpenRouter)
+    có một AdaptiveLimiter riêng: số request đồng thời tự tăng khi provider còn dư và giảm khi bị 429 / 5xx.
+    Các hàm sync (get_chat_completion, batch_get_chat_completion) đẩy coroutine sang event loop đó và chờ
+    kết quả, nên caller cũ không phải đổi.
+
+    Mỗi task được bảo vệ bởi:
+    - retry: lỗi tạm thời (429, 5xx, timeout, mất kết nối) gửi lại tối đa max_retries lần, chờ Retry-After
+      hoặc backoff lũy thừa có jitter
+    - re-prompt: response không parse được thì gửi lại kèm response cũ và lỗi, tối đa parse_retries lần
+    - hedged request (hedge_percentile > 0): request chạy quá độ trễ percentile đó của provider thì gửi thêm
+      một bản sao, lấy kết quả về trước và hủy bản còn lại
+    - deadline: task chạy quá deadline giây (tính cả retry) thì raise TimeoutError
+
+    Task interactive (chat, xem task_registry) được limiter cấp slot trước task ingest, có
+    interactive_reserve slot riêng; task ingest chờ quá bulk_max_wait giây thì được ưu tiên lại. Trong cùng
+    loại task, slot được chia đều theo client (user) đặt bằng `with llm_service.client(...)`.
+    """
+    def __init__(
+        self,
+        max_concurrent: int = 3,
+        text_llm=openai_llm,
+        vision_llm=gemini_llm,
+        initial_concurrent: Optional[int] = None,
+        min_concurrent: int = 1,
+        adaptive: bool = False,
+        max_retries: int = 0,
+        retry_backoff: float = 1.0,
+        retry_backoff_max: float = 30.0,
+        parse_retries: int = 0,
+        hedge_percentile: float = 0,
+        hedge_min_samples: int = 20,
+        deadline: float = 0,
+        task_deadlines: Optional[Dict[str, float]] = None,
+        interactive_reserve: int = 0,
+        bulk_max_wait: float = 30.0
+    ):
+        # Model cho task text và task ảnh, có thể thay bằng model giả khi chạy benchmark
+        self.text_llm = text_llm
+        self.vision_llm = vision_llm
+        self._prompt_versions: Dict[str, str] = {}
+
+        # adaptive = False: giới hạn cố định initial_concurrent (mặc định max_concurrent)
+        self.limiters: Dict[str, AdaptiveLimiter] = {
+            name: AdaptiveLimiter(
+                name,
+                initial=initial_concurrent or max_concurrent,
+                min_limit=min_concurrent,
+                max_limit=max_concurrent,
+                adaptive=adaptive,
+                interactive_reserve=interactive_reserve,
+                bulk_max_wait=bulk_max_wait,
+            )
+            for name in ("text", "vision")
+        }
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.parse_retries = parse_retries
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        # Deadline (giây) theo task, task không có trong task_deadlines dùng deadline; 0 = không giới hạn
+        self.deadline = deadline
+        self.task_deadlines = task_deadlines or {}
+
+        # Event loop nền, tạo khi có request đầu tiên; mọi client async của provider gắn với loop này
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+
+    @contextmanager
+    def client(self, name: str, weight: float = 1.0) -> Iterator[None]:
+        """Các lời gọi LLM trong khối with (cùng thread / coroutine) được tính cho client `name` khi chia slot.
+
+        Client có weight gấp đôi nhận gấp đôi số slot so với client khác cùng loại task khi phải xếp hàng.
+        """
+        token = _current_client.set((name, weight))
+        try:
+            yield
+        finally:
+            _current_client.reset(token)
 
     def get_chat_completion(self, task: str, params: Dict):
-        with self._semaphore:
-            prompt, parser = get_prompt_by_task(task)
+        return self._run_sync(self._acomplete(task, params, _current_client.get()))
 
-            # TEXT-ONLY TASK
-            if task in {"summarize_history", "correct_section_structure", "rerank", "notebook_chat", "rewrite_question"}:
-                chain = prompt | openai_llm | parser
-                return chain.invoke(params).dict()
+    async def aget_chat_completion(self, task: str, params: Dict):
+        return await self._run_async(self._acomplete(task, params, _current_client.get()))
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
 
+    async def _acomplete(self, task: str, params: Dict, client: Tuple[str, float] = ("default", 1.0)):
+        spec = task_registry.get(task)
+        # Tham số cho limiter.acquire: loại task và client để xếp hàng
+        admission = {
+            "priority": spec.priority,
+            "client": client[0],
+            "weight": client[1],
+        }
+
+        deadline = self.task_deadlines.get(task, self.deadline)
+        if not deadline:
+            return await self._complete(spec, params, admission)
+        try:
+            return await asyncio.wait_for(self._complete(spec, params, admission), deadline)
+        except asyncio.TimeoutError:
+            metrics.incr(f"llm.{spec.provider}.deadline_exceeded")
+            raise TimeoutError(f"LLM task {task} exceeded deadline of {deadline}s") from None
+
+    async def _complete(self, spec: LLMTask, params: Dict, admission: Dict):
+        task, provider, parser = spec.name, spec.provider, spec.parser
+        if provider == "text":
+            # TEXT-ONLY TASK
+            llm = self.text_llm
+            messages = spec.prompt.invoke(params).to_messages()
+        else:
             # IMAGE TASK
-            elif task in {"image_captioning", "image_captioning_v2"}:
-                return self._run_image_task(prompt, parser, params)
+            llm = self.vision_llm
+            messages = self._build_image_messages(spec, params)
+
+        for reprompt in range(self.parse_retries + 1):
+            content = await self._call_with_retry(task, provider, llm, messages, admission)
+            try:
+                return parser.parse(content).dict()
+            except OutputParserException as e:
+                if reprompt == self.parse_retries:
+                    raise
+                metrics.incr(f"llm.{provider}.reprompts")
+                logger.warning(f"LLM {provider}: unparsable response on task {task}, re-prompting ({reprompt + 1}/{self.parse_retries})")
+                # Giữ nguyên request gốc (kể cả ảnh), thêm response lỗi và yêu cầu trả lời lại đúng format
+                messages = messages + [
+                    AIMessage(content=content),
+                    HumanMessage(content=REPROMPT_MESSAGE.format(error=str(e)[:500])),
+                ]
+
+    async def _call_with_retry(self, task: str, provider: str, llm, messages: List[BaseMessage], admission: Dict) -> str:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._call_hedged(provider, llm, messages, admission)
+            except Exception as e:
+                if not is_transient(e) or attempt == self.max_retries:
+                    raise
+                # Limiter đã dừng cấp slot tới hết Retry-After (nếu có), backoff có jitter tránh gửi lại đồng loạt
+                delay = backoff_delay(attempt, self.retry_backoff, self.retry_backoff_max, get_retry_after(e))
+                metrics.incr(f"llm.{provider}.retries")
+                logger.warning(
+                    f"LLM {provider} error ({get_status_code(e) or type(e).__name__}) on task {task}, "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _call_hedged(self, provider: str, llm, messages: List[BaseMessage], admission: Dict) -> str:
+        limiter = self.limiters[provider]
+        hedge_after = None
+        if self.hedge_percentile:
+            hedge_after = limiter.latency_percentile(self.hedge_percentile, self.hedge_min_samples)
+        if hedge_after is None:
+            return await self._call(provider, llm, messages, admission)
+
+        primary = asyncio.ensure_future(self._call(provider, llm, messages, admission))
+        futures = [primary]
+        try:
+            done, _ = await asyncio.wait(futures, timeout=hedge_after)
+            # Còn request đang chờ slot thì bản sao chỉ làm hàng đợi dài thêm
+            if done or limiter.queue_depth > 0:
+                return await primary
+
+            metrics.incr(f"llm.{provider}.hedged")
+            hedge = asyncio.ensure_future(self._call(provider, llm, messages, admission))
+            futures.append(hedge)
+            pending, error = set(futures), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            metrics.incr(f"llm.{provider}.hedge_wins")
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in futures:
+                future.cancel()
+
+    async def _call(self, provider: str, llm, messages: List[BaseMessage], admission: Dict) -> str:
+        """Một request tới provider qua limiter, trả về nội dung text của response"""
+        limiter = self.limiters[provider]
+        started = await limiter.acquire(**admission)
+        try:
+            response = await llm.ainvoke(ChatPromptValue(messages=messages))
+        except BaseException as e:
+            limiter.release(started, e, get_retry_after(e))
+            raise
+        limiter.release(started)
+        # Chat model trả AIMessage, model giả có thể trả thẳng chuỗi
+        return getattr(response, "content", response)
 
-            else:
-                raise ValueError(f"Unknown task: {task}")
+    def get_prompt_version(self, task: str) -> str:
+        """Hash của prompt + format instructions + model của task, dùng làm một phần của key cache"""
+        if task not in self._prompt_versions:
+            spec = task_registry.get(task)
+            llm = self.vision_llm if spec.provider == "vision" else self.text_llm
+            fingerprint = "\n".join([llm.model_name, spec.fingerprint])
+            self._prompt_versions[task] = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+        return self._prompt_versions[task]
 
-    def _build_message(self, question: Optional[str] = None, images: Optional[List[str]] = None) -> HumanMessage:
+    def _build_message(self, question: Optional[str] = None, images: Optional[List[Union[str, Dict, Any]]] = None) -> HumanMessage:
+        """images: base64 (PNG), dict {"base64", "mime_type"} hoặc object có to_llm_image() (DocPageModel, DocImageModel).
+
+        Object chỉ được base64 ở đây, ngay trước khi gửi request, nên chỉ các request đang chạy giữ bản base64.
+        """
         if question is None and images is None:
             raise ValueError("At least one of question or images must be provided.")
         
         content = []
         if question:
             content.append({"type": "text", "text": question}) 
-        for base64 in images:
+        for image in images or []:
+            if isinstance(image, str):
+                image = {"base64": image, "mime_type": "image/png"}
+            elif not isinstance(image, dict):
+                image = image.to_llm_image()
             content.append(
                 {"type": "image",
-                 "base64": base64,
-                 "mime_type": "image/png"}
+                 "base64": image["base64"],
+                 "mime_type": image["mime_type"]}
             )
         return HumanMessage(content=content)
     
-    def _run_image_task(self, prompt, parser, params: Dict):
+    def _build_image_messages(self, spec: LLMTask, params: Dict) -> List[BaseMessage]:
         question = params.get("question", None)
         images = params.get("images", None)
         retrieved_documents = params.get("retrieved_documents", None)
 
-        # system message
-        system_messages = prompt.format_messages(retrieved_documents=retrieved_documents)
+        # system message (prompt ảnh không có biến: đã format sẵn trong registry)
+        system_messages = spec.format_messages(retrieved_documents=retrieved_documents)
 
         # multimodal message
         human_message = self._build_message(question, images)
-        
-        messages = system_messages + [human_message]
-        response = gemini_llm.invoke(messages)
-        return parser.parse(response.content).dict()
-    
+        return system_messages + [human_message]
+
     def batch_get_chat_completion(
         self, 
-        tasks_with_params: List[Tuple[str, Dict]]
+        tasks_with_params: List[Tuple[str, Dict]],
+        on_result: Optional[Callable[[int, Optional[Dict], Optional[Exception]], None]] = None
     ) -> List[Tuple[int, Dict, Optional[Exception]]]:
-        results = []
-        def process_single(index: int, task: str, params: Dict):
+        """on_result được gọi ở thread của event loop nền ngay khi từng task xong, nên phải chạy nhanh"""
+        return self._run_sync(self._abatch(tasks_with_params, on_result, _current_client.get()))
+
+    async def abatch_get_chat_completion(
+        self,
+        tasks_with_params: List[Tuple[str, Dict]],
+        on_result: Optional[Callable[[int, Optional[Dict], Optional[Exception]], None]] = None
+    ) -> List[Tuple[int, Dict, Optional[Exception]]]:
+        return await self._run_async(self._abatch(tasks_with_params, on_result, _current_client.get()))
+
+    async def _abatch(
+        self,
+        tasks_with_params: List[Tuple[str, Dict]],
+        on_result: Optional[Callable[[int, Optional[Dict], Optional[Exception]], None]] = None,
+        client: Tuple[str, float] = ("default", 1.0)
+    ) -> List[Tuple[int, Dict, Optional[Exception]]]:
+        async def process_single(index: int, task: str, params: Dict):
             try:
-                result = self.get_chat_completion(task, params)
+                result = await self._acomplete(task, params, client)
                 return (index, result, None)
             except Exception as e:
                 logger.error(f"Error in batch processing task {task} at index {index}: {e}")
                 return (index, None, e)
-        
-        # Submit all tasks to executor
-        futures = []
-        for idx, (task, params) in enumerate(tasks_with_params):
-            future = self._executor.submit(process_single, idx, task, params)
-            futures.append(future)
-        
+
+        # Mọi task tạo coroutine ngay, limiter của provider giới hạn số request thực sự gửi đi
+        coroutines = [process_single(idx, task, params) for idx, (task, params) in enumerate(tasks_with_params)]
+
         # Collect results as they complete
-        for future in as_completed(futures):
-            results.append(future.result())
-        
+        results = []
+        for next_done in asyncio.as_completed(coroutines):
+            result = await next_done
+            results.append(result)
+            if on_result is not None:
+                on_result(*result)
+
         # Sort by original index to maintain order
         results.sort(key=lambda x: x[0])
         return results
 
-llm_service = LLMService(max_concurrent=3)
\ No newline at end of file
+    def shutdown(self):
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop, self._loop_thread = None, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            # Condition của limiter gắn với loop cũ
+            for limiter in self.limiters.values():
+                limiter.reset_loop()
+
+    def _run_sync(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        loop = self._get_loop()
+        if self._in_loop(loop):
+            coroutine.close()
+            raise RuntimeError("LLMService: gọi hàm sync từ event loop của LLMService, dùng bản async (a...)")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    async def _run_async(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        # Caller ở event loop khác (FastAPI): chạy trên loop nền và chờ không chặn loop của caller
+        loop = self._get_loop()
+        if self._in_loop(loop):
+            return await coroutine
+        future: Future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _in_loop(loop: asyncio.AbstractEventLoop) -> bool:
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                    # shutdown: hủy request còn dở để caller đang chờ nhận CancelledError thay vì treo
+                    pending = asyncio.all_tasks(loop)
+                    for task in pending:
+                        task.cancel()
+                    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                    loop.close()
+
+                self._loop_thread = threading.Thread(target=run, name="llm-event-loop", daemon=True)
+                self._loop_thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+llm_service = LLMService(
+    max_concurrent=config.llm_max_concurrent,
+    initial_concurrent=config.llm_initial_concurrent,
+    min_concurrent=config.llm_min_concurrent,
+    adaptive=config.llm_adaptive_concurrency,
+    max_retries=config.llm_max_retries,
+    retry_backoff=config.llm_retry_backoff,
+    parse_retries=config.llm_parse_retries,
+    hedge_percentile=config.llm_hedge_percentile,
+    deadline=config.llm_deadline_seconds,
+    task_deadlines=parse_task_deadlines(config.llm_task_deadlines),
+    interactive_reserve=config.llm_interactive_reserve,
+    bulk_max_wait=config.llm_bulk_max_wait,
+)
\ No newline at end of file
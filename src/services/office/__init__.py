@@ -0,0 +1 @@
+from .srv_office import OfficeConverterService, office_converter_service
@@ -0,0 +1,283 @@
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from core import config, logger, metrics
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uno_worker.py")
+
+def _kill_group(process: subprocess.Popen):
+    # Process được chạy trong session riêng: kill cả nhóm để không sót soffice.bin con
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
+
+class OfficeWorker:
+    """Một instance LibreOffice headless chạy sẵn (điều khiển qua uno_worker.py) với profile riêng"""
+    def __init__(self, slot: int, soffice_bin: str, uno_python: str, profile_dir: str, start_timeout: float):
+        self.slot = slot
+        self.soffice_bin = soffice_bin
+        self.uno_python = uno_python
+        self.profile_dir = profile_dir
+        self.start_timeout = start_timeout
+
+        self.conversions = 0
+        self.last_used = 0.0
+        self._process: Optional[subprocess.Popen] = None
+        self._replies: queue.Queue = queue.Queue()
+
+    def start(self):
+        started = time.perf_counter()
+        self._process = subprocess.Popen(
+            [self.uno_python, WORKER_SCRIPT, self.soffice_bin, self.profile_dir, str(self.start_timeout)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, bufsize=1, start_new_session=True,
+        )
+        threading.Thread(target=self._read_replies, name=f"office-{self.slot}", daemon=True).start()
+
+        try:
+            reply = self._read(self.start_timeout + 5)
+        except RuntimeError:
+            self.stop()
+            raise
+        if not reply.get("ready"):
+            self.stop()
+            raise RuntimeError(f"Office worker {self.slot} không khởi động được: {reply}")
+
+        self.last_used = time.monotonic()
+        metrics.incr("office.worker_starts")
+        logger.info(f"Office: worker {self.slot} ready in {time.perf_counter() - started:.1f}s")
+
+    def request(self, payload: Dict, timeout: float) -> Dict:
+        try:
+            self._process.stdin.write(json.dumps(payload) + "\n")
+            self._process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise RuntimeError(f"Office worker {self.slot} đã dừng: {e}")
+        return self._read(timeout)
+
+    def ping(self, timeout: float = 10) -> bool:
+        try:
+            return bool(self.request({"ping": True}, timeout).get("ok"))
+        except RuntimeError:
+            return False
+
+    def stop(self):
+        if self._process is not None:
+            _kill_group(self._process)
+            self._process = None
+
+    def _read(self, timeout: float) -> Dict:
+        try:
+            line = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError(f"Office worker {self.slot} không phản hồi sau {timeout}s")
+        if line is None:
+            raise RuntimeError(f"Office worker {self.slot} đã thoát")
+        return json.loads(line)
+
+    def _read_replies(self):
+        process = self._process
+        for line in process.stdout:
+            self._replies.put(line)
+        self._replies.put(None)
+
+class OfficeConverterService:
+    """Convert tài liệu office (DOCX, ...) sang PDF qua pool instance LibreOffice headless chạy sẵn.
+
+    Mỗi slot có một instance và profile riêng nên các lần convert song song không tranh profile.
+    Instance quá timeout / không qua health check bị kill và khởi động lại ở lần dùng sau,
+    instance đã convert max_conversions file được thay mới. Không có interpreter kèm `uno` thì
+    mỗi lần convert chạy `soffice --convert-to` riêng (cold) với profile của slot.
+    """
+    def __init__(
+        self,
+        pool_size: int = 2,
+        timeout: float = 120,
+        start_timeout: float = 60,
+        health_check_seconds: float = 30,
+        max_conversions: int = 200,
+        soffice_bin: str = "soffice",
+        uno_python: str = "/usr/bin/python3",
+        profile_dir: Optional[str] = None
+    ):
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.health_check_seconds = health_check_seconds
+        self.max_conversions = max_conversions
+        self.soffice_bin = soffice_bin
+        self.uno_python = uno_python
+        self.profile_dir = profile_dir or os.path.join(tempfile.gettempdir(), "office-profiles")
+
+        # Mỗi slot chỉ được một thread giữ tại một thời điểm, worker của slot chỉ thread đó đụng tới
+        self._slots: queue.Queue = queue.Queue()
+        for slot in range(self.pool_size):
+            self._slots.put(slot)
+        self._workers: Dict[int, OfficeWorker] = {}
+        self._warm_available: Optional[bool] = None
+        self._lock = threading.Lock()
+
+    @property
+    def warm_available(self) -> bool:
+        """Có interpreter import được `uno` để giữ instance chạy sẵn hay không (kiểm tra một lần)"""
+        with self._lock:
+            if self._warm_available is None:
+                self._warm_available = self._check_uno()
+                if not self._warm_available:
+                    logger.warning(f"Office: '{self.uno_python}' không có module uno, convert bằng soffice cold")
+            return self._warm_available
+
+    def warm_up(self):
+        """Khởi động sẵn instance cho mọi slot ở background"""
+        def run():
+            if not self.warm_available:
+                return
+            slots = [self._slots.get() for _ in range(self.pool_size)]
+            try:
+                for slot in slots:
+                    try:
+                        self._get_worker(slot)
+                    except Exception as e:
+                        logger.error(f"Office: warm up worker {slot} failed: {e}")
+            finally:
+                for slot in slots:
+                    self._slots.put(slot)
+
+        threading.Thread(target=run, name="office-warm-up", daemon=True).start()
+
+    def shutdown(self):
+        for slot in list(self._workers):
+            self._stop_worker(slot)
+
+    def convert_to_pdf(self, input_path: str, output_dir: Optional[str] = None) -> str:
+        """Convert file sang PDF cùng tên trong output_dir (mặc định cạnh file gốc), trả về đường dẫn PDF"""
+        output_dir = output_dir or os.path.dirname(os.path.abspath(input_path))
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + ".pdf")
+
+        started = time.perf_counter()
+        slot = self._slots.get()
+        try:
+            if self.warm_available:
+                self._convert_warm(slot, input_path, output_path)
+            else:
+                self.convert_cold(input_path, output_dir, profile_dir=self._slot_profile_dir(slot))
+        except Exception:
+            metrics.incr("office.conversion_errors")
+            raise
+        finally:
+            self._slots.put(slot)
+
+        metrics.incr("office.conversions")
+        metrics.incr("office.conversion_seconds", time.perf_counter() - started)
+        return output_path
+
+    def convert_cold(self, input_path: str, output_dir: str, profile_dir: Optional[str] = None) -> str:
+        """Chạy một process soffice cho một file; profile_dir None thì dùng profile mới tạo và xóa sau đó"""
+        temp_profile = None
+        if profile_dir is None:
+            temp_profile = profile_dir = tempfile.mkdtemp(prefix="office-profile-")
+        try:
+            process = subprocess.Popen(
+                [
+                    self.soffice_bin, "--headless", "--norestore", "--nolockcheck",
+                    f"-env:UserInstallation={Path(profile_dir).resolve().as_uri()}",
+                    "--convert-to", "pdf", "--outdir", output_dir, input_path,
+                ],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True,
+            )
+            try:
+                _, stderr = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                _kill_group(process)
+                raise RuntimeError(f"soffice convert '{input_path}' quá {self.timeout}s")
+
+            output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + ".pdf")
+            if process.returncode != 0 or not os.path.exists(output_path):
+                raise RuntimeError(f"soffice convert '{input_path}' lỗi: {stderr.decode(errors='ignore').strip()}")
+            metrics.incr("office.cold_conversions")
+            return output_path
+        finally:
+            if temp_profile is not None:
+                shutil.rmtree(temp_profile, ignore_errors=True)
+
+    def _convert_warm(self, slot: int, input_path: str, output_path: str):
+        worker = self._get_worker(slot)
+        try:
+            reply = worker.request({"input": os.path.abspath(input_path), "output": output_path}, self.timeout)
+        except RuntimeError:
+            # Treo / chết giữa chừng -> bỏ instance, lần sau khởi động lại; không thử lại file có thể làm treo
+            self._stop_worker(slot, restart=True)
+            raise
+
+        if not reply.get("ok"):
+            # Lỗi do file hay do instance: instance không qua ping thì khởi động lại
+            if not worker.ping():
+                self._stop_worker(slot, restart=True)
+            raise RuntimeError(f"Office convert '{input_path}' lỗi: {reply.get('error')}")
+
+        worker.conversions += 1
+        worker.last_used = time.monotonic()
+        if worker.conversions >= self.max_conversions:
+            # LibreOffice giữ lại bộ nhớ sau nhiều lần mở tài liệu, thay instance mới
+            self._stop_worker(slot)
+
+    def _get_worker(self, slot: int) -> OfficeWorker:
+        worker = self._workers.get(slot)
+        if worker is not None and time.monotonic() - worker.last_used > self.health_check_seconds:
+            if worker.ping():
+                worker.last_used = time.monotonic()
+            else:
+                logger.warning(f"Office: worker {slot} failed health check, restarting")
+                self._stop_worker(slot, restart=True)
+                worker = None
+
+        if worker is None:
+            worker = OfficeWorker(slot, self.soffice_bin, self.uno_python, self._slot_profile_dir(slot),
+                                  self.start_timeout)
+            worker.start()
+            self._workers[slot] = worker
+        return worker
+
+    def _stop_worker(self, slot: int, restart: bool = False):
+        worker = self._workers.pop(slot, None)
+        if worker is not None:
+            worker.stop()
+            if restart:
+                metrics.incr("office.worker_restarts")
+
+    def _slot_profile_dir(self, slot: int) -> str:
+        return os.path.join(self.profile_dir, f"slot-{slot}")
+
+    def _check_uno(self) -> bool:
+        if shutil.which(self.uno_python) is None or shutil.which(self.soffice_bin) is None:
+            return False
+        try:
+            return subprocess.run([self.uno_python, "-c", "import uno"], capture_output=True, timeout=30).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+
+office_converter_service = OfficeConverterService(
+    pool_size=config.office_pool_size,
+    timeout=config.office_convert_timeout,
+    start_timeout=config.office_start_timeout,
+    health_check_seconds=config.office_health_check_seconds,
+    max_conversions=config.office_max_conversions,
+    soffice_bin=config.office_soffice_bin,
+    uno_python=config.office_uno_python,
+    profile_dir=config.office_profile_dir,
+)
@@ -0,0 +1,109 @@
+"""Worker convert tài liệu office sang PDF qua một instance LibreOffice headless chạy sẵn.
+
+Chạy bằng interpreter có module `uno` (python3-uno của hệ thống), không import gì của app:
+
+    python3 uno_worker.py <soffice> <profile_dir> <start_timeout>
+
+Mỗi dòng stdin là một request JSON, mỗi dòng stdout là một response JSON:
+    {"input": "...", "output": "..."} -> {"ok": true} | {"ok": false, "error": "..."}
+    {"ping": true}                     -> {"ok": true} nếu instance còn phản hồi
+Dòng đầu tiên {"ready": true} khi instance đã sẵn sàng nhận request.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import uno
+from com.sun.star.beans import PropertyValue
+from com.sun.star.connection import NoConnectException
+
+PDF_FILTERS = {
+    ".doc": "writer_pdf_Export", ".docx": "writer_pdf_Export", ".odt": "writer_pdf_Export", ".rtf": "writer_pdf_Export",
+    ".ppt": "impress_pdf_Export", ".pptx": "impress_pdf_Export", ".odp": "impress_pdf_Export",
+    ".xls": "calc_pdf_Export", ".xlsx": "calc_pdf_Export", ".ods": "calc_pdf_Export",
+}
+
+def prop(name, value):
+    item = PropertyValue()
+    item.Name = name
+    item.Value = value
+    return item
+
+def reply(payload):
+    sys.stdout.write(json.dumps(payload) + "\n")
+    sys.stdout.flush()
+
+def start_office(soffice, profile_dir, pipe_name):
+    os.makedirs(profile_dir, exist_ok=True)
+    return subprocess.Popen(
+        [
+            soffice, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault", "--nolockcheck",
+            f"-env:UserInstallation={uno.systemPathToFileUrl(os.path.abspath(profile_dir))}",
+            f"--accept=pipe,name={pipe_name};urp;StarOffice.ComponentContext",
+        ],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+def connect(pipe_name, timeout):
+    local_context = uno.getComponentContext()
+    resolver = local_context.ServiceManager.createInstanceWithContext(
+        "com.sun.star.bridge.UnoUrlResolver", local_context
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            context = resolver.resolve(f"uno:pipe,name={pipe_name};urp;StarOffice.ComponentContext")
+            return context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+        except NoConnectException:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+def convert(desktop, input_path, output_path):
+    extension = os.path.splitext(input_path)[1].lower()
+    if extension not in PDF_FILTERS:
+        raise ValueError(f"unsupported file type {extension}")
+
+    document = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(os.path.abspath(input_path)), "_blank", 0,
+        (prop("Hidden", True), prop("ReadOnly", True)),
+    )
+    if document is None:
+        raise RuntimeError(f"cannot load {input_path}")
+    try:
+        document.storeToURL(
+            uno.systemPathToFileUrl(os.path.abspath(output_path)),
+            (prop("FilterName", PDF_FILTERS[extension]),),
+        )
+    finally:
+        document.close(True)
+
+def main():
+    soffice, profile_dir, start_timeout = sys.argv[1], sys.argv[2], float(sys.argv[3])
+    pipe_name = f"office_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+    office = start_office(soffice, profile_dir, pipe_name)
+    try:
+        desktop = connect(pipe_name, start_timeout)
+        reply({"ready": True})
+        for line in sys.stdin:
+            request = json.loads(line)
+            try:
+                if request.get("ping"):
+                    desktop.getComponents()
+                else:
+                    convert(desktop, request["input"], request["output"])
+                reply({"ok": True})
+            except Exception as e:
+                reply({"ok": False, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        office.terminate()
+        try:
+            office.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            office.kill()
+
+if __name__ == "__main__":
+    main()
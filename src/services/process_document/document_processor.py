@@ -1,22 +1,151 @@
-from typing import List
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
-from .utils import DocImageModel, DocPageModel, SectionNode, \
-    ocr_service, image_caption_service, doc_extractor, tree_builder, contextual_document_service
+from core import config, logger, metrics
+
+from .utils import DocImageModel, DocPageModel, SectionNode, IngestionProgress, ContextualDocumentService, run_stage, \
+    ocr_service, image_caption_service, doc_extractor, docx_extractor, tree_builder, contextual_document_service
+from services import SourceCheckpoint
 from services.qdrant.data_models import QdrantBaseDocument
 
 class DocumentProcessor:
-    def process_document(self, file_path: str, filename: str, output_dir: str) -> List[QdrantBaseDocument]:
-        # Đọc file thành các trang ảnh kèm ảnh thành phần tương ứng
-        pages = doc_extractor.convert_pdf_to_pages(file_path, output_dir)
+    def __init__(self, pipelined: bool = True, queue_size: int = 2, docx_native: bool = True):
+        # pipelined: render, OCR và chunk chạy ở các thread riêng nối với nhau bằng queue giới hạn
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        # docx_native: DOCX đọc thẳng heading / đoạn văn / ảnh, không convert sang PDF rồi OCR
+        self.docx_native = docx_native
+
+    def process_document(
+        self,
+        file_path: str,
+        filename: str,
+        output_dir: str,
+        progress: Optional[IngestionProgress] = None,
+        checkpoint: Optional[SourceCheckpoint] = None
+    ) -> List[QdrantBaseDocument]:
+        return list(self.iter_documents(file_path, filename, output_dir, progress=progress, checkpoint=checkpoint))
+
+    def iter_documents(
+        self,
+        file_path: str,
+        filename: str,
+        output_dir: str,
+        progress: Optional[IngestionProgress] = None,
+        checkpoint: Optional[SourceCheckpoint] = None,
+        on_tree: Optional[Callable[[List[SectionNode]], None]] = None
+    ) -> Iterator[QdrantBaseDocument]:
+        """Trả document theo thứ tự tài liệu ngay khi section tương ứng đã chốt, không chờ xử lý xong cả tài liệu.
+
+        on_tree nhận cây section hoàn chỉnh sau document cuối cùng.
+        """
+        progress = progress or IngestionProgress()
+        native_docx = self.docx_native and docx_extractor.is_docx(file_path)
+        pdf_path = file_path
+        if docx_extractor.is_docx(file_path) and not native_docx:
+            pdf_path = doc_extractor.convert_docx_to_pdf(file_path)
+            if pdf_path is None:
+                raise RuntimeError(f"Không convert được '{filename}' sang PDF")
+
+        # DOCX đọc trực tiếp không có khái niệm trang
+        pages_total = 0 if native_docx else doc_extractor.count_pages(pdf_path)
+        progress.set("pages_total", pages_total)
+
+        # Cây đã build xong ở lần chạy trước -> bỏ qua OCR và build cây
+        tree_data = checkpoint.get_tree() if checkpoint is not None else None
+        if tree_data is not None:
+            progress.set("pages_ocr", pages_total)
+            tree = [SectionNode(**node) for node in tree_data]
+            yield from self.iter_tree_documents(tree, progress=progress)
+            if on_tree is not None:
+                on_tree(tree)
+            return
+
+        def save_tree(tree: List[SectionNode]):
+            # Còn trang OCR / caption lỗi thì cây thiếu nội dung, không lưu để lần chạy sau không bỏ qua OCR
+            if checkpoint is not None and not progress.has_failures():
+                checkpoint.save_tree([node.model_dump() for node in tree])
+            if on_tree is not None:
+                on_tree(tree)
+
+        if native_docx:
+            flat_nodes = self._iter_docx_nodes(file_path, filename, output_dir, progress)
+        else:
+            flat_nodes = self._iter_flat_nodes(file_path, pdf_path, filename, output_dir, pages_total, progress, checkpoint)
+        sections = tree_builder.stream(flat_nodes, on_tree=save_tree)
+        yield from self._sections_to_documents(sections, contextual_document_service, progress)
+        logger.info(f"DocumentProcessor: built {progress.get('chunks_total')} documents for '{filename}'")
+
+    def iter_tree_documents(
+        self,
+        tree: List[SectionNode],
+        contextual_service: Optional[ContextualDocumentService] = None,
+        progress: Optional[IngestionProgress] = None
+    ) -> Iterator[QdrantBaseDocument]:
+        """Tách lại document từ cây đã build (checkpoint hoặc cây lưu trên Source), không OCR lại"""
+        yield from self._sections_to_documents(
+            tree_builder.iter_sections(tree),
+            contextual_service or contextual_document_service,
+            progress or IngestionProgress(),
+        )
+
+    def _sections_to_documents(
+        self,
+        sections: Iterable[Tuple[SectionNode, List[str]]],
+        contextual_service: ContextualDocumentService,
+        progress: IngestionProgress
+    ) -> Iterator[QdrantBaseDocument]:
+        for node, breadcrumb in sections:
+            with metrics.timer("ingestion.chunk"):
+                documents = contextual_service.convert_section_to_documents(node, breadcrumb)
+            for document in documents:
+                progress.incr("chunks_total")
+                yield document
+
+    def _iter_docx_nodes(
+        self,
+        file_path: str,
+        filename: str,
+        output_dir: str,
+        progress: IngestionProgress
+    ) -> Iterable[SectionNode]:
+        # Chỉ caption ảnh tốn LLM (đã có cache theo hash ảnh) nên không cần checkpoint theo trang
+        windows = docx_extractor.iter_window_nodes(file_path, filename, output_dir, progress=progress)
+        if self.pipelined:
+            windows = run_stage(windows, maxsize=self.queue_size, name="docx")
+        return chain.from_iterable(windows)
 
-        # OCR các trang và chuyển thành các nodes
-        flat_nodes = ocr_service.ocr_pages(pages, file_path, filename)
+    def _iter_flat_nodes(
+        self,
+        file_path: str,
+        pdf_path: str,
+        filename: str,
+        output_dir: str,
+        pages_total: int,
+        progress: IngestionProgress,
+        checkpoint: Optional[SourceCheckpoint]
+    ) -> Iterable[SectionNode]:
+        # Trang đã OCR + caption xong ở lần chạy trước, chỉ render lại từ trang đầu tiên chưa xong
+        done_pages = checkpoint.get_pages() if checkpoint is not None else {}
+        start_page = next((index for index in range(pages_total) if index + 1 not in done_pages), pages_total)
+        if done_pages:
+            logger.info(f"DocumentProcessor: resume '{filename}' from page {start_page + 1} ({len(done_pages)} pages done)")
 
-        # Build cây từ các node tương ứng
-        tree = tree_builder.build(flat_nodes)
+        # Đọc file thành các trang ảnh kèm ảnh thành phần tương ứng, render trước một cửa sổ OCR khi chạy pipeline
+        pages = doc_extractor.iter_pdf_pages(pdf_path, output_dir, start_page=start_page)
+        if self.pipelined:
+            pages = run_stage(pages, maxsize=ocr_service.window_size, name="render")
 
-        # Xử lý cây thành các document
-        qdrant_documents = contextual_document_service.convert_tree_to_documents(tree)
-        return qdrant_documents
+        # OCR các trang theo cửa sổ và chuyển thành các nodes
+        windows = ocr_service.iter_window_nodes(
+            pages, file_path, filename, progress=progress, checkpoint=checkpoint, done_pages=done_pages
+        )
+        if self.pipelined:
+            windows = run_stage(windows, maxsize=self.queue_size, name="ocr")
+        return chain.from_iterable(windows)
 
-document_processor = DocumentProcessor()
\ No newline at end of file
+document_processor = DocumentProcessor(
+    pipelined=config.ingestion_pipeline_enabled,
+    queue_size=config.ingestion_stage_queue_size,
+    docx_native=config.docx_native_enabled,
+)
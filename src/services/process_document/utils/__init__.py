@@ -1,6 +1,9 @@
 from .data_models import DocPageModel, DocImageModel, SectionNode
+from .progress import IngestionProgress
+from .pipeline import run_stage
 from .ocr import ocr_service
 from .image_caption import image_caption_service
 from .doc_extractor import doc_extractor
+from .docx_extractor import docx_extractor
 from .tree_builder import tree_builder
-from .contextual_tree import contextual_document_service
\ No newline at end of file
+from .contextual_tree import ContextualDocumentService, contextual_document_service
@@ -3,16 +3,18 @@ from typing import List, Tuple
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from core import logger
+from core import config, logger
 from .data_models import SectionNode
 from services.qdrant.data_models import QdrantBaseDocument, QdrantDocumentMetadata
 
 
 class ContextualDocumentService:
-    def __init__(self):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
         self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
             separators=["\n\n", "\n", ". ", " "],
         )
     
@@ -33,24 +35,25 @@ class ContextualDocumentService:
         while queue:
             node, current_breadcrumb = queue.popleft()
             
+            documents.extend(self.convert_section_to_documents(node, current_breadcrumb))
+
+            # Thêm children header vào queue với breadcrumb cập nhật
             if node.is_header():
-                # Xử lý header node: cộng dồn text con, tách image riêng
-                header_docs = self._process_header_node(node, current_breadcrumb)
-                documents.extend(header_docs)
-                
-                # Thêm children header vào queue với breadcrumb cập nhật
                 for child in node.children:
                     if child.is_header():
                         child_breadcrumb = current_breadcrumb + [child.content]
                         queue.append((child, child_breadcrumb))
-            else:
-                # Node không thuộc header nào (root level text/image)
-                orphan_docs = self._process_orphan_node(node, current_breadcrumb)
-                documents.extend(orphan_docs)
 
         logger.info("ContextualDocument: built %d documents", len(documents))
         return documents
     
+    def convert_section_to_documents(self, node: SectionNode, breadcrumb: list[str]) -> list[QdrantBaseDocument]:
+        """Document của một section: header thì cộng dồn text con và tách image riêng,
+        node không thuộc header nào (root level text/image) thì xử lý riêng"""
+        if node.is_header():
+            return self._process_header_node(node, breadcrumb)
+        return self._process_orphan_node(node, breadcrumb)
+
     def _process_header_node(
         self, 
         header: SectionNode, 
@@ -172,4 +175,7 @@ class ContextualDocumentService:
         return " > ".join(breadcrumb)
 
 
-contextual_document_service = ContextualDocumentService()
\ No newline at end of file
+contextual_document_service = ContextualDocumentService(
+    chunk_size=config.chunk_size,
+    chunk_overlap=config.chunk_overlap,
+)
\ No newline at end of file
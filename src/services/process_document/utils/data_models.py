@@ -1,17 +1,50 @@
-from typing import List, Optional
+import base64
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
 class DocImageModel(BaseModel):
+    """Ảnh trong tài liệu chỉ giữ đường dẫn file đã ghi ra đĩa, bytes / base64 chỉ đọc khi gửi LLM"""
     static_file_path: str = Field(description="đường dẫn static đến hình ảnh tài liệu")
-    base64: str = Field(description="hình ảnh tài liệu dạng base64")
+    local_path: str = Field(description="đường dẫn file hình ảnh trên đĩa")
     mime_type: str = Field(description="loại mime của hình ảnh")
+    content_hash: Optional[str] = Field(None, description="sha256 của bytes hình ảnh")
+    perceptual_hash: Optional[int] = Field(None, description="dHash 64 bit của hình ảnh")
+
+    def to_llm_image(self) -> Dict[str, str]:
+        with open(self.local_path, "rb") as f:
+            return {"base64": base64.b64encode(f.read()).decode("utf-8"), "mime_type": self.mime_type}
+
+class DocSegmentModel(BaseModel):
+    label: str = Field(description="loại segment: header hoặc text")
+    content: str = Field(description="nội dung segment")
+    font_size: Optional[float] = Field(None, description="cỡ chữ lớn nhất của segment (từ text layer)")
+    bold: bool = Field(False, description="segment in đậm hay không (từ text layer)")
 
 class DocPageModel(BaseModel):
+    """Trang đã render. Ảnh trang giữ dạng bytes đã nén, chỉ base64 lúc dựng request và được giải phóng
+    bằng release() khi các request LLM của trang đã xong"""
     page_number: int = Field(description="số trang của tài liệu")
-    base64: str = Field(None, description="hình ảnh trang tài liệu dạng base64")
+    image_data: Optional[bytes] = Field(None, description="ảnh trang tài liệu đã nén (bytes)")
     images: List[DocImageModel] = Field(description="danh sách hình ảnh trong trang tài liệu")
     mime_type: str = Field(description="loại mime của trang tài liệu")
+    content_hash: Optional[str] = Field(None, description="sha256 của ảnh trang đã render, dùng làm key cache OCR")
+    text_segments: Optional[List[DocSegmentModel]] = Field(
+        None, description="segment đọc trực tiếp từ text layer, None nếu trang cần OCR"
+    )
+    encoded_bytes: int = Field(0, description="kích thước ảnh trang sau khi nén (bytes), 0 nếu không render")
+
+    @property
+    def has_image(self) -> bool:
+        return self.image_data is not None
+
+    def to_llm_image(self) -> Dict[str, str]:
+        if self.image_data is None:
+            raise ValueError(f"Trang {self.page_number} không có ảnh trang (chưa render hoặc đã release)")
+        return {"base64": base64.b64encode(self.image_data).decode("utf-8"), "mime_type": self.mime_type}
+
+    def release(self):
+        self.image_data = None
 
 class SectionNode(BaseModel):
     order_id: int = Field(..., description="Thứ tự của section trong source")
@@ -19,10 +52,13 @@ class SectionNode(BaseModel):
     label: Optional[str] = Field(None, description="Section label nếu có")
     content: str = Field("", description="Text content của section")
     
-    parent_id: Optional[str] = Field(None, description="Parent section id")
+    parent_id: Optional[int] = Field(None, description="order_id của parent section")
     children: List["SectionNode"] = Field(default_factory=list)
     
     page: Optional[int] = Field(None, description="Trang của section nếu có")
+    font_size: Optional[float] = Field(None, description="Cỡ chữ của header (chỉ có ở trang dùng text layer)")
+    bold: bool = Field(False, description="Header in đậm hay không (chỉ có ở trang dùng text layer)")
+    level: Optional[int] = Field(None, description="Cấp outline của header nếu tài liệu gốc có (heading style DOCX)")
     breadcrumb: Optional[str] = Field(None, description="Breadcrumb context của section")
     file_path: Optional[str] = Field(None, description="Đường dẫn tĩnh tới tài liệu gốc")
     filename: Optional[str] = Field(None, description="Tên file gốc")
@@ -1,87 +1,140 @@
 import os
-import base64
-import subprocess
-from typing import List
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import batched, islice
+from typing import Deque, Iterator, List, Optional
 
 import fitz
-from pydantic import BaseModel, Field
 
-from core import config, logger
-from .data_models import DocImageModel, DocPageModel
+from core import config, logger, metrics
+from services import office_converter_service
+from utils.pdf_render import PageEncoding, RenderOptions, render_page, render_page_range
+from .data_models import DocPageModel
 
 class DocExtractor:
-    def __init__(self):
+    def __init__(self, render_workers: int = 1, chunk_pages: int = 4):
         self.min_width = config.min_width
         self.min_height = config.min_height
         self.max_width = config.max_width
         self.max_height = config.max_height
+
+        # Số process render song song (1 = render tuần tự trong process hiện tại)
+        self.render_workers = render_workers
+        self.chunk_pages = chunk_pages
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def render_options(self) -> RenderOptions:
+        return RenderOptions(
+            ocr_encoding=PageEncoding(
+                dpi=config.ocr_render_dpi,
+                max_dpi=config.ocr_render_max_dpi,
+                image_format=config.ocr_render_format,
+                quality=config.ocr_render_quality,
+                max_edge=config.ocr_render_max_edge,
+            ),
+            context_encoding=PageEncoding(
+                dpi=config.context_render_dpi,
+                max_dpi=config.context_render_dpi,
+                image_format=config.context_render_format,
+                quality=config.context_render_quality,
+                max_edge=config.context_render_max_edge,
+            ),
+            min_width=self.min_width,
+            min_height=self.min_height,
+            max_width=self.max_width,
+            max_height=self.max_height,
+            text_layer_enabled=config.text_layer_enabled,
+            text_layer_min_chars=config.text_layer_min_chars,
+            perceptual_hash=config.caption_perceptual_dedup,
+        )
     
     def convert_pdf_to_pages(self, pdf_path: str, output_dir: str) -> List[DocPageModel]:
-        doc = fitz.open(pdf_path)
+        return list(self.iter_pdf_pages(pdf_path, output_dir))
+    
+    def iter_pdf_pages(self, pdf_path: str, output_dir: str, start_page: int = 0) -> Iterator[DocPageModel]:
+        """Render từng trang (từ trang start_page, tính từ 0) khi được yêu cầu, không giữ toàn bộ tài liệu trong bộ nhớ"""
         os.makedirs(output_dir, exist_ok=True)
-        
-        results: List[DocPageModel] = []
-        for page_index in range(len(doc)):
-            page = doc[page_index]
+        if self.render_workers > 1:
+            yield from self._iter_pdf_pages_parallel(pdf_path, output_dir, start_page)
+            return
+
+        options = self.render_options
+        with fitz.open(pdf_path) as doc:
+            for page_index in range(start_page, len(doc)):
+                with metrics.timer("ingestion.render"):
+                    page = render_page(doc, page_index, output_dir, options)
+                yield self._to_page_model(page)
+    
+    def iter_pdf_page_windows(self, pdf_path: str, output_dir: str, window_size: int) -> Iterator[List[DocPageModel]]:
+        for window in batched(self.iter_pdf_pages(pdf_path, output_dir), window_size):
+            yield list(window)
+    
+    def count_pages(self, pdf_path: str) -> int:
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+    
+    def _iter_pdf_pages_parallel(self, pdf_path: str, output_dir: str, start_page: int = 0) -> Iterator[DocPageModel]:
+        """Chia các khoảng trang cho process pool, mỗi worker tự mở tài liệu; trả về đúng thứ tự trang"""
+        page_count = self.count_pages(pdf_path)
+        ranges = iter([
+            (start, min(start + self.chunk_pages, page_count))
+            for start in range(start_page, page_count, self.chunk_pages)
+        ])
+        pool = self._get_process_pool()
+        options = self.render_options
+
+        # Giới hạn số khoảng trang đang render để bộ nhớ vẫn bị chặn
+        pending: Deque[Future] = deque()
+        for start, end in islice(ranges, self.render_workers * 2):
+            pending.append(pool.submit(render_page_range, pdf_path, output_dir, start, end, options))
 
-            # Tạo ảnh toàn trang
-            mat = fitz.Matrix(2.0, 2.0)
-            pix = page.get_pixmap(matrix=mat, colorspace=fitz.csRGB)
-            page_bytes = pix.tobytes("png")
-            page_base64 = base64.b64encode(page_bytes).decode('utf-8')
-            
-            # Lấy danh sách hình ảnh trong trang
-            image_list = page.get_images(full=True)
-            doc_page = DocPageModel(page_number=page_index + 1, base64=page_base64, images=[], mime_type="image/png")
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                
-                # Nếu w, h không hợp lệ thì bỏ qua
-                width = base_image["width"]
-                height = base_image["height"]
-                if not self.check_is_valid_size(width, height):
-                    continue
-                
-                # Tạo object hình ảnh
-                image_bytes = base_image["image"]
-                image_ext = base_image["ext"]
-                image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-                image_path = os.path.join(output_dir, f"image_p{page_index+1}_{img_index+1}.{image_ext}")
-                with open(image_path, "wb") as img_file:
-                    img_file.write(image_bytes)
-                
-                doc_image = DocImageModel(
-                    static_file_path=image_path.replace("\\", "/").replace("app/static/", ""),
-                    base64=image_base64,
-                    caption=None,
-                    mime_type=image_ext,
+        try:
+            while pending:
+                # Render chạy ở process pool, tính thời gian phải chờ khoảng trang kế tiếp
+                with metrics.timer("ingestion.render"):
+                    pages = pending.popleft().result()
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append(pool.submit(render_page_range, pdf_path, output_dir, *next_range, options))
+                for page in pages:
+                    yield self._to_page_model(page)
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def _to_page_model(self, page: dict) -> DocPageModel:
+        if page["encoded_bytes"]:
+            purpose = "ocr" if page["text_segments"] is None else "context"
+            metrics.incr(f"render.{purpose}.pages")
+            metrics.incr(f"render.{purpose}.bytes", page["encoded_bytes"])
+        return DocPageModel(**page)
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._process_pool is None:
+                # spawn: an toàn khi process cha đang có nhiều thread (uvicorn, worker pool)
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.render_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
                 )
-                
-                # Thêm vào trang
-                doc_page.images.append(doc_image)
-                
-            results.append(doc_page)
-        doc.close()
-        return results
+            return self._process_pool
     
-    def convert_docx_to_pdf(self, docx_path: str) -> str:
-        temp_pdf = docx_path.replace(".docx", ".pdf")
+    def convert_docx_to_pdf(self, docx_path: str) -> Optional[str]:
+        # Convert qua pool LibreOffice chạy sẵn, không khởi động soffice mới cho mỗi file
         try:
-            subprocess.run([
-                'libreoffice', '--headless', '--convert-to', 'pdf', 
-                docx_path, '--outdir', os.path.dirname(docx_path)
-            ], check=True, capture_output=True)
-            return temp_pdf
-
-        except subprocess.CalledProcessError as e:
-            logger.info(f"Error converting DOCX to PDF: {e.stderr.decode()}")
+            return office_converter_service.convert_to_pdf(docx_path)
+        except Exception as e:
+            logger.error(f"Error converting DOCX to PDF: {e}")
+            return None
     
     def check_is_valid_size(self, width: int, height: int) -> bool:
-        if width < self.min_width or height < self.min_height:
-            return False
-        if width > self.max_width or height > self.max_height:
-            return False
-        return True
+        return self.render_options.is_valid_size(width, height)
 
-doc_extractor = DocExtractor()
\ No newline at end of file
+doc_extractor = DocExtractor(
+    render_workers=config.pdf_render_workers,
+    chunk_pages=config.pdf_render_chunk_pages,
+)
\ No newline at end of file
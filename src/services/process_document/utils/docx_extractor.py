@@ -0,0 +1,254 @@
+import hashlib
+import os
+import re
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple, Union
+
+import docx
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from PIL import Image
+
+from core import config, logger, metrics
+from utils import get_perceptual_hash
+from .data_models import DocImageModel, DocPageModel, SectionNode
+from .image_caption import ImageDedupIndex, image_caption_service
+from .progress import IngestionProgress
+
+HEADING_STYLE_PATTERN = re.compile(r"^heading\s+(\d)$", re.IGNORECASE)
+# w:outlineLvl = 9 là body text
+BODY_OUTLINE_LEVEL = 9
+# Định dạng ảnh vision API nhận được, định dạng khác (tiff, bmp, ...) được encode lại sang PNG
+LLM_IMAGE_TYPES = ("image/png", "image/jpeg", "image/webp")
+
+# Phần tử đọc được từ DOCX theo thứ tự tài liệu: ("header", text, level) / ("text", text, None) / ("image", img, None)
+DocxItem = Tuple[str, Union[str, DocImageModel], Optional[int]]
+
+class DocxExtractor:
+    """Đọc DOCX trực tiếp thành flat SectionNode: header lấy cấp từ heading style / outline level,
+    đoạn văn và bảng thành text, ảnh lấy từ package. Không cần LibreOffice, render trang hay OCR."""
+
+    def __init__(self, image_window: int = 8, perceptual_hash: bool = False):
+        self.min_width = config.min_width
+        self.min_height = config.min_height
+        self.max_width = config.max_width
+        self.max_height = config.max_height
+
+        # Số ảnh gom lại trước khi caption, node trả về theo từng cửa sổ để bộ nhớ vẫn bị chặn
+        self.image_window = max(1, image_window)
+        self.perceptual_hash = perceptual_hash
+
+    @staticmethod
+    def is_docx(file_path: str) -> bool:
+        return os.path.splitext(file_path)[1].lower() == ".docx"
+
+    def iter_window_nodes(
+        self,
+        file_path: str,
+        filename: str,
+        output_dir: str,
+        progress: Optional[IngestionProgress] = None
+    ) -> Iterator[List[SectionNode]]:
+        """Trả node theo thứ tự tài liệu, mỗi lần một cửa sổ image_window ảnh (đã caption) kèm text xung quanh"""
+        progress = progress or IngestionProgress()
+        os.makedirs(output_dir, exist_ok=True)
+
+        caption_index = image_caption_service.new_dedup_index()
+        window: List[DocxItem] = []
+        window_images = 0
+        order_id = 0
+        image_offset = 0
+
+        for item in self._iter_items(docx.Document(file_path), output_dir):
+            window.append(item)
+            if item[0] == "image":
+                window_images += 1
+            if window_images >= self.image_window:
+                nodes = self._to_nodes(window, file_path, filename, order_id, image_offset, caption_index, progress)
+                order_id += len(nodes)
+                image_offset += window_images
+                window, window_images = [], 0
+                yield nodes
+
+        if window:
+            nodes = self._to_nodes(window, file_path, filename, order_id, image_offset, caption_index, progress)
+            order_id += len(nodes)
+            yield nodes
+
+        metrics.incr("docx.files")
+        logger.info(f"DocxExtractor: extracted {order_id} nodes from '{filename}'")
+
+    def _to_nodes(
+        self,
+        items: List[DocxItem],
+        file_path: str,
+        filename: str,
+        order_id: int,
+        image_offset: int,
+        caption_index: ImageDedupIndex,
+        progress: IngestionProgress
+    ) -> List[SectionNode]:
+        # Cả cửa sổ là một "trang" không có ảnh toàn trang: dùng lại dedup / cache của caption service
+        # và ảnh của cửa sổ được gộp vào cùng request caption
+        images = [img for kind, img, _ in items if kind == "image"]
+        captions = []
+        if images:
+            page = DocPageModel(
+                page_number=image_offset // self.image_window + 1, images=images, mime_type=images[0].mime_type
+            )
+            captions = image_caption_service.caption_page_images([page], caption_index, progress)[0]
+        metrics.incr("docx.images", len(images))
+
+        nodes = []
+        image_index = 0
+        for kind, value, level in items:
+            node = SectionNode(order_id=order_id + len(nodes), file_path=file_path, filename=filename)
+            if kind == "image":
+                caption, img = captions[image_index]
+                image_index += 1
+                node.label = "image"
+                # Caption lỗi đã đếm vào captions_failed, task kết thúc lỗi để retry
+                node.content = caption or ""
+                node.file_path = img.static_file_path
+                node.image_path = img.static_file_path
+            else:
+                node.label = kind
+                node.content = value
+                node.level = level
+            nodes.append(node)
+        return nodes
+
+    def _iter_items(self, document, output_dir: str) -> Iterator[DocxItem]:
+        """Header / text / ảnh theo thứ tự tài liệu, các đoạn văn liền nhau gộp thành một text"""
+        paragraphs: List[str] = []
+        image_count = 0
+
+        def flush_text() -> Iterator[DocxItem]:
+            if paragraphs:
+                yield "text", "\n".join(paragraphs), None
+                paragraphs.clear()
+
+        for block in document.iter_inner_content():
+            if isinstance(block, Paragraph):
+                text = block.text.strip()
+                level = self._heading_level(block) if text else None
+                if level is not None:
+                    yield from flush_text()
+                    yield "header", text, level
+                elif text:
+                    paragraphs.append(text)
+                element = block._p
+            elif isinstance(block, Table):
+                text = self._table_text(block)
+                if text:
+                    paragraphs.append(text)
+                element = block._tbl
+            else:
+                continue
+
+            for rel_id in element.xpath(".//a:blip/@r:embed"):
+                img = self._save_image(block.part, rel_id, output_dir, image_count)
+                if img is None:
+                    continue
+                image_count += 1
+                yield from flush_text()
+                yield "image", img, None
+
+        yield from flush_text()
+
+    def _heading_level(self, paragraph: Paragraph) -> Optional[int]:
+        """Cấp của header (0 = Title, 1 = Heading 1 / outline level 0, ...), None nếu là đoạn văn thường.
+
+        Outline level đặt trực tiếp trên đoạn được ưu tiên, sau đó đến style và các style nó kế thừa.
+        """
+        level = self._outline_level(paragraph._p.pPr)
+        if level is not None:
+            return level
+
+        style = paragraph.style
+        while style is not None:
+            name = style.name or ""
+            if name.lower() == "title":
+                return 0
+            match = HEADING_STYLE_PATTERN.match(name)
+            if match:
+                return int(match.group(1))
+            level = self._outline_level(style.element.pPr)
+            if level is not None:
+                return level
+            style = style.base_style
+        return None
+
+    @staticmethod
+    def _outline_level(pPr) -> Optional[int]:
+        if pPr is None:
+            return None
+        outline = pPr.find(qn("w:outlineLvl"))
+        if outline is None:
+            return None
+        value = int(outline.get(qn("w:val"), BODY_OUTLINE_LEVEL))
+        return value + 1 if value < BODY_OUTLINE_LEVEL else None
+
+    @staticmethod
+    def _table_text(table: Table) -> str:
+        rows = []
+        for row in table.rows:
+            # Ô gộp (merge) lặp lại trong row.cells, chỉ lấy một lần
+            cells, seen = [], set()
+            for cell in row.cells:
+                if id(cell._tc) in seen:
+                    continue
+                seen.add(id(cell._tc))
+                cells.append(cell.text.strip())
+            if any(cells):
+                rows.append(" | ".join(cells))
+        return "\n".join(rows)
+
+    def _save_image(self, part, rel_id: str, output_dir: str, image_count: int) -> Optional[DocImageModel]:
+        image_part = part.related_parts.get(rel_id)
+        if image_part is None:
+            return None
+
+        # Ảnh vector (EMF / WMF) không đọc được kích thước thì bỏ qua như ảnh không hợp lệ
+        try:
+            width, height = image_part.image.px_width, image_part.image.px_height
+        except Exception:
+            return None
+        if not self.is_valid_size(width, height):
+            return None
+
+        image_bytes = image_part.blob
+        image_ext = os.path.splitext(image_part.partname)[1].lstrip(".").lower() or "png"
+        mime_type = image_part.content_type
+        if mime_type not in LLM_IMAGE_TYPES:
+            try:
+                with Image.open(BytesIO(image_bytes)) as image:
+                    buffer = BytesIO()
+                    image.convert("RGBA").save(buffer, format="PNG")
+            except Exception:
+                return None
+            image_bytes, image_ext, mime_type = buffer.getvalue(), "png", "image/png"
+        image_path = os.path.join(output_dir, f"image_docx_{image_count + 1}.{image_ext}")
+        with open(image_path, "wb") as img_file:
+            img_file.write(image_bytes)
+
+        return DocImageModel(
+            static_file_path=image_path.replace("\\", "/").replace("app/static/", ""),
+            local_path=image_path,
+            mime_type=mime_type,
+            content_hash=hashlib.sha256(image_bytes).hexdigest(),
+            perceptual_hash=get_perceptual_hash(image_bytes) if self.perceptual_hash else None,
+        )
+
+    def is_valid_size(self, width: int, height: int) -> bool:
+        if width < self.min_width or height < self.min_height:
+            return False
+        if width > self.max_width or height > self.max_height:
+            return False
+        return True
+
+docx_extractor = DocxExtractor(
+    image_window=config.docx_image_window,
+    perceptual_hash=config.caption_perceptual_dedup,
+)
@@ -1,36 +1,252 @@
-from typing import List
+from collections import defaultdict
+from itertools import batched
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core import config, logger, metrics
+from services import llm_service, cache_service
+from utils import hamming_distance
+from .data_models import DocImageModel, DocPageModel
+from .progress import IngestionProgress
+
+class ImageDedupIndex:
+    """Tra ảnh đã gặp theo hash chính xác hoặc perceptual hash (khoảng cách Hamming <= max_distance)"""
+    def __init__(self, max_distance: int = 4):
+        self.max_distance = max_distance
+        self._by_hash: Dict[str, Any] = {}
+        self._by_perceptual: List[Tuple[int, Any]] = []
+
+    def find(self, img: DocImageModel) -> Optional[Any]:
+        if img.content_hash in self._by_hash:
+            return self._by_hash[img.content_hash]
+        if img.perceptual_hash is not None:
+            for perceptual_hash, value in self._by_perceptual:
+                if hamming_distance(perceptual_hash, img.perceptual_hash) <= self.max_distance:
+                    return value
+        return None
+
+    def add(self, img: DocImageModel, value: Any):
+        if img.content_hash:
+            self._by_hash[img.content_hash] = value
+        if img.perceptual_hash is not None:
+            self._by_perceptual.append((img.perceptual_hash, value))
 
-from services import llm_service
-from .data_models import DocPageModel, SectionNode
 
 class ImageCaptionService:
-    def caption_images_from_pages(self, pages: List[DocPageModel]):
-        results = []
-        for x, page in enumerate(pages):
-            base64_images = [img.base64 for img in page.images]
-            captions = self.caption_images(base64_images, page.base64)            
-            
-            for y, (img, caption) in enumerate(zip(page.images, captions)):
-                node = SectionNode(
-                    order_id=x * 1000 + y,
-                    label="image",
-                    content=caption.get("description", ""),
-                    file_path=img.static_file_path
-                )
-                results.append(node)
-        return results
-    
-    def caption_images(self, base64_images: List[str], full_page_base64: str):
-        captions = []
-        for base64 in base64_images:
-            caption_result = self.caption_image(base64, full_page_base64)
-            captions.append(caption_result)
+    CACHE_NAMESPACE = "image_caption"
+    # Các task có thể tạo ra caption của một ảnh, caption của task nào cũng dùng lại được
+    CAPTION_TASKS = ("image_captioning", "image_captioning_batch", "image_captioning_batch_no_page")
+
+    def __init__(
+        self,
+        cache_enabled: bool = True,
+        cache_max_entries: int = 100000,
+        perceptual_max_distance: int = 4,
+        batch_per_page: bool = True,
+        batch_max_images: int = 8
+    ):
+        self.cache_enabled = cache_enabled
+        self.cache_max_entries = cache_max_entries
+        self.perceptual_max_distance = perceptual_max_distance
+
+        # Gộp các ảnh của cùng một trang vào một request, ảnh toàn trang chỉ gửi một lần
+        self.batch_per_page = batch_per_page
+        self.batch_max_images = batch_max_images
+
+    def new_dedup_index(self) -> ImageDedupIndex:
+        """Index caption dùng chung cho toàn bộ một tài liệu"""
+        return ImageDedupIndex(max_distance=self.perceptual_max_distance)
+
+    def caption_page_images(
+        self,
+        pages: Sequence[DocPageModel],
+        dedup_index: Optional[ImageDedupIndex] = None,
+        progress: Optional[IngestionProgress] = None
+    ) -> Dict[int, List[Tuple[Optional[str], DocImageModel]]]:
+        """Caption ảnh của các trang, mỗi ảnh khác nhau chỉ gọi LLM một lần.
+
+        Trả về {page_idx: [(caption, img), ...]} theo đúng thứ tự ảnh trong trang, caption None nếu LLM lỗi
+        (đếm vào captions_failed).
+        """
+        dedup_index = dedup_index or self.new_dedup_index()
+        progress = progress or IngestionProgress()
+
+        captions: Dict[Tuple[int, int], Optional[str]] = {}
+        # Ảnh cần gọi LLM: đại diện đầu tiên + danh sách vị trí xuất hiện
+        pending: List[Tuple[int, DocImageModel, List[Tuple[int, int]]]] = []
+        pending_index = ImageDedupIndex(max_distance=self.perceptual_max_distance)
+
+        for page_idx, page in enumerate(pages):
+            for img_idx, img in enumerate(page.images):
+                progress.incr("caption_images")
+                position = (page_idx, img_idx)
+
+                # Ảnh đã caption ở trang trước trong cùng tài liệu
+                caption = dedup_index.find(img)
+                if caption is not None:
+                    captions[position] = caption
+                    progress.incr("caption_dedup_hits")
+                    continue
+
+                # Ảnh trùng với ảnh đang chờ caption trong cùng cửa sổ
+                pending_ref = pending_index.find(img)
+                if pending_ref is not None:
+                    pending[pending_ref][2].append(position)
+                    progress.incr("caption_dedup_hits")
+                    continue
+
+                # Ảnh đã caption ở lần xử lý trước (cache bền vững)
+                caption = self._get_cached_caption(img)
+                if caption is not None:
+                    captions[position] = caption
+                    dedup_index.add(img, caption)
+                    progress.incr("caption_cache_hits")
+                    continue
+
+                pending_index.add(img, len(pending))
+                pending.append((page_idx, img, [position]))
+
+        if pending:
+            with metrics.timer("ingestion.caption"):
+                pending_captions = self._caption_pending(pages, pending, progress)
+            for (page_idx, img, positions), captioned in zip(pending, pending_captions):
+                if captioned is None:
+                    caption = None
+                    progress.incr("captions_failed")
+                else:
+                    caption, task = captioned
+                    dedup_index.add(img, caption)
+                    self._set_cached_caption(img, caption, task)
+
+                for position in positions:
+                    captions[position] = caption
+
+        saved = progress.get("caption_dedup_hits") + progress.get("caption_cache_hits")
+        progress.set("caption_calls_saved", saved)
+
+        results_by_page: Dict[int, List[Tuple[Optional[str], DocImageModel]]] = {}
+        for page_idx, page in enumerate(pages):
+            if page.images:
+                results_by_page[page_idx] = [
+                    (captions[(page_idx, img_idx)], img)
+                    for img_idx, img in enumerate(page.images)
+                ]
+        return results_by_page
+
+    def _caption_pending(
+        self,
+        pages: Sequence[DocPageModel],
+        pending: List[Tuple[int, DocImageModel, List[Tuple[int, int]]]],
+        progress: IngestionProgress
+    ) -> List[Optional[Tuple[str, str]]]:
+        """Gọi LLM cho các ảnh chưa có caption, trả về (caption, task tạo ra caption) theo thứ tự pending (None nếu lỗi)"""
+        captions: List[Optional[Tuple[str, str]]] = [None] * len(pending)
+
+        # Nhóm ảnh theo trang: mỗi nhóm là một request
+        if self.batch_per_page:
+            indices_by_page = defaultdict(list)
+            for pending_idx, (page_idx, _, _) in enumerate(pending):
+                indices_by_page[page_idx].append(pending_idx)
+            groups = [
+                list(group)
+                for indices in indices_by_page.values()
+                for group in batched(indices, self.batch_max_images)
+            ]
+        else:
+            groups = [[pending_idx] for pending_idx in range(len(pending))]
+
+        tasks = [self._build_caption_task(pages, pending, group) for group in groups]
+        logger.info(f"Caption: submitting {len(tasks)} requests for {len(pending)} images")
+        results = llm_service.batch_get_chat_completion(tasks)
+        progress.incr("caption_calls", len(tasks))
+
+        fallback_indices = []
+        for group, (task, _), (idx, result, error) in zip(groups, tasks, results):
+            page_number = pages[pending[group[0]][0]].page_number
+            if error:
+                logger.error(f"Image caption error for page {page_number}: {error}")
+                if len(group) > 1:
+                    fallback_indices.extend(group)
+                continue
+
+            if len(group) == 1:
+                captions[group[0]] = (result.get("description", ""), task)
+                continue
+
+            descriptions = {item["index"]: item["description"] for item in result.get("captions", [])}
+            for position, pending_idx in enumerate(group):
+                if position in descriptions:
+                    captions[pending_idx] = (descriptions[position], task)
+                else:
+                    fallback_indices.append(pending_idx)
+
+        # Response gộp lỗi hoặc thiếu ảnh -> caption lại từng ảnh
+        if fallback_indices:
+            logger.warning(f"Caption: batched response incomplete, retrying {len(fallback_indices)} images one by one")
+            tasks = [self._build_caption_task(pages, pending, [pending_idx]) for pending_idx in fallback_indices]
+            results = llm_service.batch_get_chat_completion(tasks)
+            progress.incr("caption_calls", len(tasks))
+            progress.incr("caption_batch_fallbacks", len(tasks))
+
+            for pending_idx, (task, _), (idx, result, error) in zip(fallback_indices, tasks, results):
+                if error:
+                    logger.error(f"Image caption error for page {pages[pending[pending_idx][0]].page_number}: {error}")
+                    continue
+                captions[pending_idx] = (result.get("description", ""), task)
+
         return captions
-    
-    def caption_image(self, base64: str, full_page_base64: str):
-        task = "image_captioning"
-        params = {"images": [base64, full_page_base64]}
-        result = llm_service.get_chat_completion(task, params)
-        return result
-
-image_caption_service = ImageCaptionService()
\ No newline at end of file
+
+    def _build_caption_task(
+        self,
+        pages: Sequence[DocPageModel],
+        pending: List[Tuple[int, DocImageModel, List[Tuple[int, int]]]],
+        group: List[int]
+    ) -> Tuple[str, Dict]:
+        page = pages[pending[group[0]][0]]
+        if len(group) == 1:
+            images = [pending[group[0]][1]]
+            if page.has_image:
+                images.append(page)
+            return "image_captioning", {"images": images}
+
+        # Truyền model ảnh / trang, base64 chỉ được tạo khi LLMService dựng request
+        images = [pending[pending_idx][1] for pending_idx in group]
+        question = f"Có {len(group)} hình ảnh cần mô tả (index từ 0 đến {len(group) - 1})"
+        # Trang không có ảnh toàn trang (DOCX): prompt gộp không có ảnh ngữ cảnh ở cuối
+        if not page.has_image:
+            return "image_captioning_batch_no_page", {"question": f"{question}.", "images": images}
+        question = f"{question}, hình ảnh cuối cùng là ảnh toàn trang {page.page_number}."
+        return "image_captioning_batch", {"question": question, "images": images + [page]}
+
+    def _cache_key(self, img: DocImageModel, task: str) -> Optional[str]:
+        """Key theo version prompt của task đã tạo ra caption (caption từng ảnh hoặc caption gộp theo trang)"""
+        if not self.cache_enabled or not img.content_hash:
+            return None
+        return f"{img.content_hash}:{llm_service.get_prompt_version(task)}"
+
+    def _get_cached_caption(self, img: DocImageModel) -> Optional[str]:
+        keys = [self._cache_key(img, task) for task in self.CAPTION_TASKS]
+        if None in keys:
+            return None
+        try:
+            cached = cache_service.get_many(self.CACHE_NAMESPACE, keys)
+        except Exception as e:
+            logger.error(f"Caption cache read error for {img.static_file_path}: {e}")
+            return None
+        return next((cached[key] for key in keys if key in cached), None)
+
+    def _set_cached_caption(self, img: DocImageModel, caption: str, task: str):
+        key = self._cache_key(img, task)
+        if key is None:
+            return
+        try:
+            cache_service.set(self.CACHE_NAMESPACE, key, caption, max_entries=self.cache_max_entries)
+        except Exception as e:
+            logger.error(f"Caption cache write error for {img.static_file_path}: {e}")
+
+image_caption_service = ImageCaptionService(
+    cache_enabled=config.caption_cache_enabled,
+    cache_max_entries=config.caption_cache_max_entries,
+    perceptual_max_distance=config.caption_perceptual_max_distance,
+    batch_per_page=config.caption_batch_per_page,
+    batch_max_images=config.caption_batch_max_images,
+)
@@ -1,70 +1,197 @@
-from core import logger
-from services import llm_service
+from collections import defaultdict
+from itertools import batched
+from typing import Iterable, Iterator, Optional, Sequence
+
+from core import config, logger, metrics
+from services import llm_service, cache_service, SourceCheckpoint
 from .data_models import DocPageModel, SectionNode
-from .image_caption import image_caption_service
+from .image_caption import ImageDedupIndex, image_caption_service
+from .progress import IngestionProgress
 
 class OcrService:
-    def ocr_pages(self, pages: list[DocPageModel], file_path: str, filename: str) -> list[SectionNode]:
-        logger.info(f"OCR: Starting parallel processing for {len(pages)} pages")
-        
-        # Step 1: Batch OCR all pages
-        ocr_tasks = []
-        for page in pages:
-            task = "image_captioning_v2"
-            params = {"images": [page.base64]}
-            ocr_tasks.append((task, params))
-        
-        logger.info(f"OCR: Submitting {len(ocr_tasks)} OCR tasks")
-        ocr_results = llm_service.batch_get_chat_completion(ocr_tasks)
-        
-        # Step 2: Collect all image captioning tasks
-        image_caption_tasks = []
-        image_metadata = []
-        
+    CACHE_NAMESPACE = "ocr"
+    # Các task có thể tạo ra segment OCR của một trang, kết quả của task nào cũng dùng lại được
+    OCR_TASKS = ("image_captioning_v2", "ocr_batch")
+
+    def __init__(
+        self,
+        window_size: int = 8,
+        cache_enabled: bool = True,
+        cache_max_entries: int = 100000,
+        pages_per_request: int = 1
+    ):
+        self.window_size = window_size
+        self.cache_enabled = cache_enabled
+        self.cache_max_entries = cache_max_entries
+
+        # Số trang liên tiếp gộp vào một request OCR, 1 = mỗi trang một request
+        self.pages_per_request = max(1, pages_per_request)
+
+    @property
+    def ocr_task(self) -> str:
+        return "ocr_batch" if self.pages_per_request > 1 else "image_captioning_v2"
+
+    def ocr_pages(
+        self,
+        pages: Iterable[DocPageModel],
+        file_path: str,
+        filename: str,
+        progress: Optional[IngestionProgress] = None,
+        checkpoint: Optional[SourceCheckpoint] = None,
+        done_pages: Optional[dict[int, list[dict]]] = None
+    ) -> list[SectionNode]:
+        """OCR theo từng cửa sổ trang để bộ nhớ chỉ phụ thuộc vào window_size, không phụ thuộc số trang.
+
+        done_pages: node của các trang đã xong ở lần chạy trước (từ checkpoint), không OCR lại.
+        Các trang này có thể không có trong `pages` (trang đầu tài liệu đã xong thì không cần render).
+        """
+        return [
+            node
+            for window_nodes in self.iter_window_nodes(pages, file_path, filename, progress, checkpoint, done_pages)
+            for node in window_nodes
+        ]
+
+    def iter_window_nodes(
+        self,
+        pages: Iterable[DocPageModel],
+        file_path: str,
+        filename: str,
+        progress: Optional[IngestionProgress] = None,
+        checkpoint: Optional[SourceCheckpoint] = None,
+        done_pages: Optional[dict[int, list[dict]]] = None
+    ) -> Iterator[list[SectionNode]]:
+        """Như ocr_pages nhưng trả node của từng cửa sổ trang ngay khi cửa sổ đó xong (theo thứ tự trang),
+        để các stage sau chạy song song với OCR các trang tiếp theo"""
+        progress = progress or IngestionProgress()
+        done_pages = done_pages or {}
+        resumed_page_numbers = sorted(done_pages)
+        total_nodes = 0
+
+        def number(nodes: list[SectionNode]) -> list[SectionNode]:
+            nonlocal total_nodes
+            for node in nodes:
+                node.order_id = total_nodes
+                total_nodes += 1
+            return nodes
+
+        def pop_resumed(before_page: Optional[int] = None) -> list[SectionNode]:
+            nodes = []
+            while resumed_page_numbers and (before_page is None or resumed_page_numbers[0] < before_page):
+                page_number = resumed_page_numbers.pop(0)
+                nodes.extend(SectionNode(**node) for node in done_pages[page_number])
+                progress.incr("pages_resumed")
+                progress.incr("pages_ocr")
+            return nodes
+
+        caption_index = image_caption_service.new_dedup_index()
+        for window in batched(pages, self.window_size):
+            todo = [page for page in window if page.page_number not in done_pages]
+            window_nodes, failed_pages = self._ocr_window(
+                todo, file_path, filename, total_nodes, caption_index, progress
+            ) if todo else ([], set())
+
+            nodes_by_page = defaultdict(list)
+            for node in window_nodes:
+                nodes_by_page[node.page].append(node)
+
+            # Lưu checkpoint các trang đã xong. Trang lỗi không lưu: task kết thúc lỗi, giữ checkpoint,
+            # retry task chỉ OCR lại các trang này
+            if checkpoint is not None:
+                checkpoint.save_pages({
+                    page.page_number: [node.model_dump() for node in nodes_by_page[page.page_number]]
+                    for page in todo if page.page_number not in failed_pages
+                })
+
+            ordered_nodes = []
+            for page in window:
+                ordered_nodes.extend(pop_resumed(before_page=page.page_number + 1))
+                if page.page_number not in done_pages:
+                    ordered_nodes.extend(nodes_by_page[page.page_number])
+
+            # Giải phóng ảnh của các trang đã xử lý xong trước khi trả node cho stage sau
+            del window, todo
+            yield number(ordered_nodes)
+
+        remaining_nodes = pop_resumed()
+        if remaining_nodes:
+            yield number(remaining_nodes)
+
+        logger.info(
+            f"OCR: Completed processing, total nodes: {total_nodes}, "
+            f"resumed pages: {progress.get('pages_resumed')}, "
+            f"caption calls: {progress.get('caption_calls')} (saved {progress.get('caption_calls_saved')})"
+        )
+
+    def _ocr_window(
+        self,
+        pages: Sequence[DocPageModel],
+        file_path: str,
+        filename: str,
+        order_id: int,
+        caption_index: ImageDedupIndex,
+        progress: IngestionProgress
+    ) -> tuple[list[SectionNode], set[int]]:
+        """Trả về (node của các trang theo thứ tự, số trang bị lỗi OCR hoặc caption ảnh)"""
+        logger.info(f"OCR: Starting parallel processing for pages {pages[0].page_number}-{pages[-1].page_number}")
+
+        # Step 1: Trang có text layer dùng luôn segment đã đọc, chỉ OCR trang scan / ít chữ bằng LLM
+        segments_by_page = {}  # {page_idx: [segment, ...]}
+        vision_page_indices = []
         for page_idx, page in enumerate(pages):
-            for img in page.images:
-                task = "image_captioning"
-                params = {"images": [img.base64, page.base64]}
-                image_caption_tasks.append((task, params))
-                image_metadata.append((page_idx, img))
-        
-        # Batch image captioning
-        if image_caption_tasks:
-            logger.info(f"OCR: Submitting {len(image_caption_tasks)} image captioning tasks")
-            image_caption_results = llm_service.batch_get_chat_completion(image_caption_tasks)
-        else:
-            image_caption_results = []
-        
-        # Organize image captions by page for correct ordering
-        image_captions_by_page = {}  # {page_idx: [(img_idx, caption, img), ...]}
-        for cap_idx, (idx, caption_result, error) in enumerate(image_caption_results):
-            page_idx, img = image_metadata[cap_idx]
-            
-            if page_idx not in image_captions_by_page:
-                image_captions_by_page[page_idx] = []
-            
-            if error:
-                logger.error(f"Image caption error for page {page_idx}: {error}")
-                caption_text = ""
+            if page.text_segments is not None:
+                segments_by_page[page_idx] = [segment.model_dump() for segment in page.text_segments]
             else:
-                caption_text = caption_result.get("description", "")
-            
-            image_captions_by_page[page_idx].append((cap_idx, caption_text, img))
-        
+                vision_page_indices.append(page_idx)
+
+        progress.incr("page_bytes", sum(page.encoded_bytes for page in pages))
+        progress.incr("pages_rendered", sum(1 for page in pages if page.encoded_bytes))
+
+        text_layer_pages = len(pages) - len(vision_page_indices)
+        progress.incr("pages_text_layer", text_layer_pages)
+        progress.incr("pages_vision", len(vision_page_indices))
+        progress.incr("pages_ocr", text_layer_pages)
+
+        # Trang đã OCR trước đó (cùng ảnh trang, cùng prompt) lấy lại từ cache, không gọi LLM
+        ocr_page_indices = []
+        for page_idx in vision_page_indices:
+            cached_segments = self._get_cached_segments(pages[page_idx])
+            if cached_segments is not None:
+                segments_by_page[page_idx] = cached_segments
+                progress.incr("ocr_cache_hits")
+                progress.incr("pages_ocr")
+                continue
+            ocr_page_indices.append(page_idx)
+
+        logger.info(
+            f"OCR: {text_layer_pages} pages from text layer, "
+            f"{len(vision_page_indices) - len(ocr_page_indices)} from cache, {len(ocr_page_indices)} pages to OCR"
+        )
+        if ocr_page_indices:
+            with metrics.timer("ingestion.ocr"):
+                ocr_segments = self._ocr_vision_pages(pages, ocr_page_indices, progress)
+            for page_idx, (page_segments, task) in ocr_segments.items():
+                segments_by_page[page_idx] = page_segments
+                self._set_cached_segments(pages[page_idx], page_segments, task)
+
+        # Step 2: Caption ảnh, ảnh trùng trong tài liệu hoặc đã có trong cache không gọi lại LLM
+        image_captions_by_page = image_caption_service.caption_page_images(pages, caption_index, progress)
+
+        # Mọi request LLM của các trang đã xong -> giải phóng ảnh trang, không chờ cả cửa sổ được yield
+        for page in pages:
+            page.release()
+
         # Step 3: Build flat nodes - interleave text and images per page
         flat_nodes = []
-        order_id = 0
-        
-        for page_idx, (idx, ocr_result, error) in enumerate(ocr_results):
-            page = pages[page_idx]
-            
-            if error:
-                logger.error(f"OCR error for page {page_idx}: {error}")
+        failed_pages = set()
+
+        for page_idx, page in enumerate(pages):
+            if page_idx not in segments_by_page:
+                failed_pages.add(page.page_number)
+                progress.incr("pages_failed")
                 continue
-            
-            page_segments = ocr_result.get("ocr_response", [])
-            page_segments.sort(key=lambda x: x["index"])
-            
+
+            page_segments = segments_by_page[page_idx]
+
             # Build text/header nodes for this page
             for i, segment in enumerate(page_segments):
                 node = SectionNode(
@@ -74,33 +201,148 @@ class OcrService:
                     label="header" if segment.get("label") == "header" else "text",
                     content=segment.get("content"),
                     page=page.page_number,
+                    font_size=segment.get("font_size"),
+                    bold=segment.get("bold", False),
                 )
                 flat_nodes.append(node)
                 order_id += 1
-            
+
             # Add image nodes for this page (right after text segments of this page)
             if page_idx in image_captions_by_page:
-                for cap_idx, caption_text, img in image_captions_by_page[page_idx]:
+                for caption_text, img in image_captions_by_page[page_idx]:
+                    # Caption lỗi (đã đếm vào captions_failed): không checkpoint trang để retry caption lại
+                    if caption_text is None:
+                        failed_pages.add(page.page_number)
                     image_node = SectionNode(
                         file_path=img.static_file_path,
                         filename=filename,
                         order_id=order_id,
                         label="image",
-                        content=caption_text,
+                        content=caption_text or "",
                         page=page.page_number,
                         image_path=img.static_file_path
                     )
                     flat_nodes.append(image_node)
                     order_id += 1
-        
-        logger.info(f"OCR: Completed processing, total nodes: {len(flat_nodes)}")
-        return flat_nodes
-            
+
+        return flat_nodes, failed_pages
+
+    def _ocr_vision_pages(
+        self,
+        pages: Sequence[DocPageModel],
+        page_indices: list[int],
+        progress: IngestionProgress
+    ) -> dict[int, tuple[list[dict], str]]:
+        """OCR các trang scan bằng LLM, gộp pages_per_request trang liên tiếp vào một request.
+
+        Trả về {page_idx: ([segment, ...], task tạo ra kết quả)}, trang bị lỗi không có trong kết quả.
+        """
+        segments_by_page = {}
+        groups = [list(group) for group in batched(page_indices, self.pages_per_request)]
+        tasks = [self._build_ocr_task(pages, group) for group in groups]
+
+        logger.info(f"OCR: submitting {len(tasks)} requests for {len(page_indices)} pages")
+        results = llm_service.batch_get_chat_completion(tasks)
+        progress.incr("ocr_requests", len(tasks))
+
+        fallback_indices = []
+        for group, (task, _), (idx, result, error) in zip(groups, tasks, results):
+            if error:
+                logger.error(f"OCR error for pages {[pages[page_idx].page_number for page_idx in group]}: {error}")
+                if len(group) > 1:
+                    fallback_indices.extend(group)
+                continue
+
+            if len(group) == 1 and self.pages_per_request == 1:
+                segments_by_page[group[0]] = (self._sort_segments(result.get("ocr_response", [])), task)
+                progress.incr("pages_ocr")
+                continue
+
+            # Response gộp được key theo số trang để ghép lại đúng trang
+            segments_by_number = {
+                page_result["page_number"]: page_result["ocr_response"]
+                for page_result in result.get("pages", [])
+            }
+            for page_idx in group:
+                page_number = pages[page_idx].page_number
+                if page_number in segments_by_number:
+                    segments_by_page[page_idx] = (self._sort_segments(segments_by_number[page_number]), task)
+                    progress.incr("pages_ocr")
+                else:
+                    fallback_indices.append(page_idx)
+
+        # Response gộp lỗi hoặc thiếu trang -> OCR lại từng trang
+        if fallback_indices:
+            logger.warning(f"OCR: batched response incomplete, retrying {len(fallback_indices)} pages one by one")
+            tasks = [
+                ("image_captioning_v2", {"images": [pages[page_idx]]})
+                for page_idx in fallback_indices
+            ]
+            results = llm_service.batch_get_chat_completion(tasks)
+            progress.incr("ocr_requests", len(tasks))
+            progress.incr("ocr_batch_fallbacks", len(tasks))
+
+            for page_idx, (task, _), (idx, result, error) in zip(fallback_indices, tasks, results):
+                if error:
+                    logger.error(f"OCR error for page {pages[page_idx].page_number}: {error}")
+                    continue
+                segments_by_page[page_idx] = (self._sort_segments(result.get("ocr_response", [])), task)
+                progress.incr("pages_ocr")
+
+        return segments_by_page
+
+    def _build_ocr_task(self, pages: Sequence[DocPageModel], group: list[int]) -> tuple[str, dict]:
+        if self.pages_per_request == 1:
+            # Truyền model trang, base64 chỉ được tạo khi LLMService dựng request
+            return "image_captioning_v2", {"images": [pages[group[0]]]}
+
+        page_numbers = [pages[page_idx].page_number for page_idx in group]
+        question = (
+            f"Có {len(group)} ảnh trang, số trang theo thứ tự ảnh lần lượt là: "
+            f"{', '.join(str(page_number) for page_number in page_numbers)}"
+        )
+        return self.ocr_task, {"question": question, "images": [pages[page_idx] for page_idx in group]}
+
+    @staticmethod
+    def _sort_segments(segments: list[dict]) -> list[dict]:
+        return sorted(segments, key=lambda x: x["index"])
+
+    def _cache_key(self, page: DocPageModel, task: str) -> Optional[str]:
+        """Key theo version prompt của task đã OCR trang (từng trang hoặc gộp trang), không theo pages_per_request"""
+        if not self.cache_enabled or not page.content_hash:
+            return None
+        return f"{page.content_hash}:{llm_service.get_prompt_version(task)}"
+
+    def _get_cached_segments(self, page: DocPageModel) -> Optional[list[dict]]:
+        keys = [self._cache_key(page, task) for task in self.OCR_TASKS]
+        if None in keys:
+            return None
+        try:
+            cached = cache_service.get_many(self.CACHE_NAMESPACE, keys)
+        except Exception as e:
+            logger.error(f"OCR cache read error for page {page.page_number}: {e}")
+            return None
+        return next((cached[key] for key in keys if key in cached), None)
+
+    def _set_cached_segments(self, page: DocPageModel, segments: list[dict], task: str):
+        key = self._cache_key(page, task)
+        if key is None:
+            return
+        try:
+            cache_service.set(self.CACHE_NAMESPACE, key, segments, max_entries=self.cache_max_entries)
+        except Exception as e:
+            logger.error(f"OCR cache write error for page {page.page_number}: {e}")
+
     def ocr_page(self, page: DocPageModel):
         """Legacy method for single page OCR"""
         task = "image_captioning_v2"
-        params = {"images": [page.base64]}
+        params = {"images": [page.to_llm_image()]}
         response = llm_service.get_chat_completion(task, params)
         return response
 
-ocr_service = OcrService()
\ No newline at end of file
+ocr_service = OcrService(
+    window_size=config.ocr_page_window,
+    cache_enabled=config.ocr_cache_enabled,
+    cache_max_entries=config.ocr_cache_max_entries,
+    pages_per_request=config.ocr_pages_per_request,
+)
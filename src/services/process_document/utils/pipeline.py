@@ -0,0 +1,57 @@
+import contextvars
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+def run_stage(source: Iterable[T], maxsize: int = 1, name: str = "stage") -> Iterator[T]:
+    """Chạy `source` ở một thread riêng, kết quả đi qua queue giới hạn `maxsize` phần tử.
+
+    Stage trước chỉ chạy trước stage sau tối đa `maxsize` phần tử rồi chờ, nên bộ nhớ vẫn bị chặn.
+    Lỗi ở stage trước được raise lại ở stage sau; stage sau dừng sớm (lỗi / close) thì stage trước cũng dừng.
+    Thread của stage chạy trong bản sao context của caller (vd. client của llm_service).
+    """
+    items: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+    stopped = threading.Event()
+
+    def put(item, error=None) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put((item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(source)
+        try:
+            for item in iterator:
+                if not put(item):
+                    break
+        except BaseException as e:
+            put(_DONE, e)
+            return
+        finally:
+            # Đóng generator nguồn để các stage phía trước nó cũng dừng
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        put(_DONE)
+
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(produce,), name=f"ingestion-{name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
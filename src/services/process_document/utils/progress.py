@@ -0,0 +1,40 @@
+import threading
+from typing import Callable, Dict, Optional
+
+class IngestionProgress:
+    """Bộ đếm tiến độ của một lần ingest, được chia sẻ giữa các stage của pipeline"""
+    # Bộ đếm lỗi khiến kết quả ingest thiếu nội dung, task phải kết thúc lỗi để retry
+    FAILURE_KEYS = ("pages_failed", "captions_failed")
+
+    def __init__(self, on_change: Optional[Callable[[Dict[str, int]], None]] = None):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._on_change = on_change
+
+    def incr(self, key: str, value: int = 1):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            snapshot = dict(self._counters)
+        self._notify(snapshot)
+
+    def set(self, key: str, value: int):
+        with self._lock:
+            self._counters[key] = value
+            snapshot = dict(self._counters)
+        self._notify(snapshot)
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def has_failures(self) -> bool:
+        with self._lock:
+            return any(self._counters.get(key, 0) for key in self.FAILURE_KEYS)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def _notify(self, snapshot: Dict[str, int]):
+        if self._on_change is not None:
+            self._on_change(snapshot)
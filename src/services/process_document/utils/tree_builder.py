@@ -1,81 +1,378 @@
-from collections import deque
-from typing import List, Dict, Any, Optional
+import time
+from collections import Counter, deque
+from typing import Callable, Deque, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 
-from core import config, logger
+from core import config, logger, metrics
 from services.llm.srv_llm import llm_service
+from utils.heading_numbering import parse_numbering
 from .data_models import SectionNode
 
-class TreeBuilder:
-    def build(self, flat_nodes: List[SectionNode]) -> List[SectionNode]:
-        logger.info("TreeBuilder: start building section tree")
+class HeadingRuleResolver:
+    """Suy parent của header theo thứ tự tài liệu bằng luật, không gọi LLM.
+
+    - Header có cấp outline (heading style DOCX): con của header gần nhất có cấp nhỏ hơn.
+    - Header có đánh số: mỗi kiểu đánh số là một cấp theo thứ tự xuất hiện ("Chương I" > "1." > "1.1" > "a)"),
+      từ khóa có cấp cố định (Phần > Chương > Mục > Điều) thì đóng các cấp thấp hơn đang mở.
+    - Header không đánh số nhưng có cỡ chữ (trang text layer): con của header gần nhất có chữ lớn hơn, chỉ khi
+      cỡ chữ xác định được cấp: lớn hơn chữ thân bài (không chỉ in đậm) và chưa gặp header đánh số cùng cỡ chữ
+      ở hai cấp khác nhau.
+    - Còn lại (trang OCR, không đánh số, cỡ chữ không rõ cấp) không suy được.
+    """
+    def __init__(self):
+        self._outline_stack: List[Tuple[int, SectionNode]] = []
+        self._numbering_stack: List[Tuple[str, Optional[int], SectionNode]] = []
+        self._typography_stack: List[Tuple[Tuple[float, bool], SectionNode]] = []
+        # Số ký tự theo cỡ chữ của text thân bài, cỡ chữ -> các cấp đánh số đã gặp với cỡ chữ đó
+        self._body_sizes: Counter = Counter()
+        self._weight_depths: Dict[Tuple[float, bool], Set[int]] = {}
+
+    def observe(self, node: SectionNode):
+        """Ghi nhận cỡ chữ của text thân bài để biết header nào chỉ khác thân bài ở chữ đậm"""
+        if node.font_size is not None and not node.is_header():
+            self._body_sizes[node.font_size] += len(node.content)
+
+    def resolve(self, header: SectionNode) -> Tuple[bool, Optional[SectionNode]]:
+        """(suy được hay không, parent của header hoặc None nếu là root)"""
+        if header.level is not None:
+            return True, self._push_outline(header)
+
+        numbering = parse_numbering(header.content)
+        if numbering is not None:
+            parent = self._push_numbered(header, numbering.scheme, numbering.rank)
+            if header.font_size is not None:
+                weight = (header.font_size, header.bold)
+                self._weight_depths.setdefault(weight, set()).add(len(self._numbering_stack))
+            self._push_typography(header)
+            return True, parent
+
+        if header.font_size is not None:
+            parent = self._push_typography(header)
+            if self._typography_ranked(header):
+                return True, parent
+        return False, None
+
+    def _typography_ranked(self, header: SectionNode) -> bool:
+        """Cỡ chữ của header chỉ ứng với một cấp: lớn hơn thân bài, không dùng chung cho nhiều cấp đánh số"""
+        if not self._body_sizes:
+            return False
+        body_size = self._body_sizes.most_common(1)[0][0]
+        if header.font_size <= body_size:
+            return False
+        return len(self._weight_depths.get((header.font_size, header.bold), ())) <= 1
 
-        # Tiền xử lý cây bằng chuyển node text vào trong node header trên nó
-        naive_tree = self._naive_build_tree(flat_nodes)
+    def _push_outline(self, header: SectionNode) -> Optional[SectionNode]:
+        stack = self._outline_stack
+        while stack and stack[-1][0] >= header.level:
+            stack.pop()
 
-        # Thu thập roots của naive tree để LLM phân cấp
-        root_nodes = [node for node in naive_tree if node.label == "header"]
-        skeleton = [{"index": h.order_id, "title": h.content, "page": h.page} for h in root_nodes]
+        parent = stack[-1][1] if stack else None
+        stack.append((header.level, header))
+        return parent
 
-        task = "correct_section_structure"
-        params = {"question": "", "sections": skeleton}
-        llm_response = llm_service.get_chat_completion(task, params)["response"]
+    def _push_numbered(self, header: SectionNode, scheme: str, rank: Optional[int]) -> Optional[SectionNode]:
+        stack = self._numbering_stack
+        position = next((i for i, (open_scheme, _, _) in enumerate(stack) if open_scheme == scheme), None)
+        if position is not None:
+            # Cùng kiểu với một cấp đang mở -> anh em của header ở cấp đó
+            del stack[position:]
+        elif rank is not None:
+            while stack and stack[-1][1] is not None and stack[-1][1] >= rank:
+                stack.pop()
 
-        # Map về cây hoàn chỉnh
-        final_tree = self._llm_to_tree(llm_response, root_nodes)
-        self.log_ascii_tree(final_tree)
+        parent = stack[-1][2] if stack else None
+        stack.append((scheme, rank, header))
+        return parent
+
+    def _push_typography(self, header: SectionNode) -> Optional[SectionNode]:
+        if header.font_size is None:
+            return None
+
+        stack = self._typography_stack
+        weight = (header.font_size, header.bold)
+        while stack and stack[-1][0] <= weight:
+            stack.pop()
+
+        parent = stack[-1][1] if stack else None
+        stack.append((weight, header))
+        return parent
+
+class TreeBuilder:
+    def __init__(
+        self,
+        rules_enabled: bool = True,
+        llm_window: int = 40,
+        llm_context: int = 8,
+        llm_overlap: int = 8,
+        llm_parallel_windows: int = 4,
+        llm_flush_pages: int = 10,
+        llm_flush_seconds: float = 30
+    ):
+        # rules_enabled = False: mọi header đều do LLM phân cấp
+        self.rules_enabled = rules_enabled
+        # Số header tối đa trong một request LLM và số header đã chốt đi kèm làm ngữ cảnh
+        self.llm_window = max(1, llm_window)
+        self.llm_context = llm_context
+        # Cửa sổ liên tiếp gối lên nhau llm_overlap header, tối đa llm_parallel_windows cửa sổ gửi cùng lúc
+        self.llm_overlap = min(max(0, llm_overlap), self.llm_window - 1)
+        self.llm_parallel_windows = max(1, llm_parallel_windows)
+        # Dãy header chưa suy được gửi LLM sớm khi đã kéo dài quá N trang hoặc chờ quá N giây,
+        # không giữ các section phía sau tới khi gom đủ llm_run_limit header (0 = không giới hạn)
+        self.llm_flush_pages = int(llm_flush_pages)
+        self.llm_flush_seconds = float(llm_flush_seconds)
 
-        logger.info("TreeBuilder: tree built with %s nodes", len(final_tree))
-        return final_tree
+    @property
+    def llm_run_limit(self) -> int:
+        """Số header chưa suy được tối đa gom lại trước khi gửi LLM (vừa đủ llm_parallel_windows cửa sổ)"""
+        return self.llm_window + (self.llm_parallel_windows - 1) * (self.llm_window - self.llm_overlap)
+
+    def build(self, flat_nodes: Iterable[SectionNode]) -> List[SectionNode]:
+        tree: List[SectionNode] = []
+        for _ in self.stream(flat_nodes, on_tree=tree.extend):
+            pass
+        return tree
+
+    def stream(
+        self,
+        flat_nodes: Iterable[SectionNode],
+        on_tree: Optional[Callable[[List[SectionNode]], None]] = None
+    ) -> Iterator[Tuple[SectionNode, List[str]]]:
+        """Trả về (section, breadcrumb) theo thứ tự tài liệu ngay khi section đã chốt, trong lúc vẫn đang nhận node.
+
+        Section chốt khi nội dung xong (đã gặp header tiếp theo) và parent của header đã biết.
+        Header suy được bằng luật chốt ngay; header còn lại gom thành cửa sổ gửi LLM kèm vài header
+        đã chốt xung quanh làm ngữ cảnh. on_tree nhận cây hoàn chỉnh sau section cuối cùng.
+        """
+        logger.info("TreeBuilder: start building section tree")
+        resolver = HeadingRuleResolver() if self.rules_enabled else None
 
-    def _llm_to_tree(self, llm_response: str, root_nodes: List[SectionNode]) -> List[SectionNode]:
-        header_map = {h.order_id: h for h in root_nodes}
         roots: List[SectionNode] = []
-        for item in llm_response:
-            index = item.get("index")
-            parent_index = item.get("parent_index")
+        headers: Dict[int, SectionNode] = {}
+        parents: Dict[int, Optional[int]] = {}      # order_id header -> order_id parent đã chốt
+        breadcrumbs: Dict[int, List[str]] = {}
+        pending: Deque[SectionNode] = deque()       # section chờ chốt, theo thứ tự tài liệu
+        recent: Deque[SectionNode] = deque(maxlen=max(1, self.llm_context))
+        unresolved: List[SectionNode] = []
+        window_context: List[SectionNode] = []
+        current_header: Optional[SectionNode] = None
+        run_started = 0.0
+        rule_headers = 0
 
-            node = header_map.get(index)
-            if node is None:
-                logger.info("Header index %s not found", index)
-                continue
+        def run_expired(node: SectionNode) -> bool:
+            if self.llm_flush_seconds and time.monotonic() - run_started >= self.llm_flush_seconds:
+                return True
+            first_page = unresolved[0].page
+            return bool(self.llm_flush_pages) and first_page is not None and node.page is not None \
+                and node.page - first_page >= self.llm_flush_pages
 
-            if parent_index is None:
-                roots.append(node)
-            else:
-                parent = header_map.get(parent_index)
+        def flush_unresolved(after: List[SectionNode]):
+            parents.update(self._resolve_with_llm(unresolved, window_context if self.llm_context > 0 else [],
+                                                  after, parents, headers))
+            recent.extend(unresolved)
+            unresolved.clear()
+
+        def release() -> List[Tuple[SectionNode, List[str]]]:
+            released = []
+            while pending:
+                node = pending[0]
+                if node is current_header or (node.is_header() and node.order_id not in parents):
+                    break
+                pending.popleft()
+
+                parent = headers.get(parents.get(node.order_id))
                 if parent is None:
-                    logger.info(
-                        "Parent %s not found for header %s",
-                        parent_index, index
-                    )
                     roots.append(node)
+                    breadcrumb = [node.content] if node.is_header() else []
                 else:
                     node.parent_id = parent.order_id
                     parent.children.append(node)
+                    breadcrumb = breadcrumbs[parent.order_id] + [node.content]
+                if node.is_header():
+                    breadcrumbs[node.order_id] = breadcrumb
+                released.append((node, breadcrumb))
+            return released
 
-        logger.info("TreeBuilder: built %d root headers", len(roots))
-        return roots
-
-    def _naive_build_tree(self, flat_nodes: List[SectionNode]) -> List[SectionNode]:
-        roots = []
-        current_header: SectionNode = None
         for node in flat_nodes:
-            if node.label == "header":
+            if node.is_header():
                 current_header = node
-                roots.append(node)
-            
-            else:
-                # Nếu chưa có header hiện tại --> roots
-                if not current_header:
-                    roots.append(node)
+                headers[node.order_id] = node
+                pending.append(node)
 
-                # Nếu có header hiện tại --> append vào children header hiện tại
+                resolved, parent = resolver.resolve(node) if resolver is not None else (False, None)
+                if resolved:
+                    rule_headers += 1
+                    parents[node.order_id] = parent.order_id if parent is not None else None
+                    if unresolved:
+                        flush_unresolved(after=[node])
+                    recent.append(node)
                 else:
+                    if not unresolved:
+                        window_context = list(recent)
+                        run_started = time.monotonic()
+                    unresolved.append(node)
+                    if len(unresolved) >= self.llm_run_limit:
+                        flush_unresolved(after=[])
+
+            # Text / image thuộc header gần nhất phía trên, chưa có header nào thì là root
+            else:
+                if resolver is not None:
+                    resolver.observe(node)
+                if current_header is not None:
                     current_header.children.append(node)
                     node.parent_id = current_header.order_id
-        logger.info("TreeBuilder: naive tree built with %s nodes", len(roots))
-        return roots
-    
+                else:
+                    pending.append(node)
+
+            if unresolved and run_expired(node):
+                flush_unresolved(after=[])
+
+            yield from release()
+
+        current_header = None
+        if unresolved:
+            flush_unresolved(after=[])
+        yield from release()
+
+        metrics.incr("section_tree.headers", len(headers))
+        metrics.incr("section_tree.rule_headers", rule_headers)
+        logger.info(
+            f"TreeBuilder: tree built with {len(roots)} roots, "
+            f"{rule_headers}/{len(headers)} headers resolved by rules"
+        )
+        self.log_ascii_tree(roots)
+        if on_tree is not None:
+            on_tree(roots)
+
+    def iter_sections(self, roots: List[SectionNode]) -> Iterator[Tuple[SectionNode, List[str]]]:
+        """Section của cây đã build (header kèm breadcrumb, node root không thuộc header nào),
+        theo thứ tự tài liệu giống stream để chunk sinh ra cùng thứ tự khi chạy lại từ checkpoint"""
+        sections = []
+        stack = [(root, [root.content] if root.is_header() else []) for root in roots]
+        while stack:
+            node, breadcrumb = stack.pop()
+            sections.append((node, breadcrumb))
+            if not node.is_header():
+                continue
+            for child in node.children:
+                if child.is_header():
+                    stack.append((child, breadcrumb + [child.content]))
+
+        sections.sort(key=lambda section: section[0].order_id)
+        yield from sections
+
+    TREE_FORMAT_VERSION = 1
+    COMPACT_EXCLUDE = {"children", "parent_id", "breadcrumb", "file_path", "filename"}
+
+    def to_compact(self, roots: List[SectionNode], file_path: str, filename: str) -> Dict:
+        """Cây dạng gọn để lưu vào Source.structure_config: bỏ field mặc định / suy lại được,
+        file_path và filename chung của tài liệu chỉ lưu một lần"""
+        def compact(node: SectionNode) -> Dict:
+            data = node.model_dump(exclude=self.COMPACT_EXCLUDE, exclude_none=True, exclude_defaults=True)
+            data["order_id"] = node.order_id
+            if node.file_path and node.file_path != file_path:
+                data["file_path"] = node.file_path
+            if node.children:
+                data["children"] = [compact(child) for child in node.children]
+            return data
+
+        return {
+            "version": self.TREE_FORMAT_VERSION,
+            "file_path": file_path,
+            "filename": filename,
+            "nodes": [compact(root) for root in roots],
+        }
+
+    def from_compact(self, data: Dict) -> List[SectionNode]:
+        def expand(item: Dict, parent_id: Optional[int]) -> SectionNode:
+            node = SectionNode(
+                **{key: value for key, value in item.items() if key != "children"},
+                parent_id=parent_id,
+                filename=data.get("filename"),
+            )
+            if node.file_path is None:
+                node.file_path = data.get("file_path")
+            node.children = [expand(child, node.order_id) for child in item.get("children", [])]
+            return node
+
+        return [expand(item, None) for item in data.get("nodes", [])]
+
+    def _resolve_with_llm(
+        self,
+        run: List[SectionNode],
+        context: List[SectionNode],
+        after: List[SectionNode],
+        parents: Dict[int, Optional[int]],
+        headers: Dict[int, SectionNode]
+    ) -> Dict[int, Optional[int]]:
+        """Parent của một dãy header liên tiếp chưa suy được, chia thành các cửa sổ gối nhau gửi LLM song song.
+
+        context / after: header đã chốt ngay trước / sau dãy, gửi kèm cửa sổ đầu / cuối cùng parent đã biết.
+        """
+        windows = self._split_windows(len(run))
+        tasks = []
+        for k, (start, end) in enumerate(windows):
+            known = (context if k == 0 else []) + (after if k == len(windows) - 1 else [])
+            sections = [
+                {"index": h.order_id, "title": h.content, "page": h.page, "parent_index": parents.get(h.order_id)}
+                for h in known
+            ] + [{"index": h.order_id, "title": h.content, "page": h.page} for h in run[start:end]]
+            sections.sort(key=lambda section: section["index"])
+            tasks.append(("correct_section_structure", {"question": "", "sections": sections}))
+
+        metrics.incr("section_tree.llm_requests", len(tasks))
+        metrics.incr("section_tree.llm_headers", len(run))
+        with metrics.timer("ingestion.tree"):
+            results = llm_service.batch_get_chat_completion(tasks)
+
+        local_parents = []
+        for k, (start, end) in enumerate(windows):
+            _, result, error = results[k]
+            if error is not None:
+                logger.error(f"TreeBuilder: LLM error for headers {run[start].order_id}-{run[end - 1].order_id}: {error}")
+            local_parents.append(self._parse_parents(result["response"] if error is None else [], headers))
+
+        # Header ở phần gối nhau lấy kết quả của cửa sổ mà nó nằm gần giữa hơn (thấy nhiều header xung quanh hơn),
+        # cửa sổ đó lỗi / thiếu header thì lấy của cửa sổ còn lại; không cửa sổ nào có thì là root
+        resolved: Dict[int, Optional[int]] = {}
+        for k, (start, end) in enumerate(windows):
+            own_start = start if k == 0 else (start + windows[k - 1][1]) // 2
+            own_end = end if k == len(windows) - 1 else (end + windows[k + 1][0]) // 2
+            for position in range(own_start, own_end):
+                order_id = run[position].order_id
+                candidates = [k] + [
+                    other for other in (k - 1, k + 1)
+                    if 0 <= other < len(windows) and windows[other][0] <= position < windows[other][1]
+                ]
+                resolved[order_id] = next(
+                    (local_parents[window][order_id] for window in candidates if order_id in local_parents[window]),
+                    None
+                )
+        return resolved
+
+    def _split_windows(self, count: int) -> List[Tuple[int, int]]:
+        windows = []
+        start = 0
+        while True:
+            end = min(start + self.llm_window, count)
+            windows.append((start, end))
+            if end == count:
+                return windows
+            start = max(start + 1, end - self.llm_overlap)
+
+    @staticmethod
+    def _parse_parents(llm_response: List[Dict], headers: Dict[int, SectionNode]) -> Dict[int, Optional[int]]:
+        """{index: parent_index} từ response, chỉ nhận parent là header đứng trước trong tài liệu"""
+        local_parents = {}
+        for item in llm_response:
+            index = item.get("index")
+            parent_index = item.get("parent_index")
+            if index not in headers:
+                logger.info(f"Header index {index} not found")
+                continue
+            if parent_index is not None and not (parent_index in headers and parent_index < index):
+                logger.info(f"Parent {parent_index} not found for header {index}")
+                parent_index = None
+            local_parents[index] = parent_index
+        return local_parents
 
     def log_ascii_tree(
         self,
@@ -114,4 +411,12 @@ class TreeBuilder:
 
         logger.info("======== END SECTION TREE ========")
 
-tree_builder = TreeBuilder()
\ No newline at end of file
+tree_builder = TreeBuilder(
+    rules_enabled=config.section_rules_enabled,
+    llm_window=config.section_llm_window,
+    llm_context=config.section_llm_context,
+    llm_overlap=config.section_llm_overlap,
+    llm_parallel_windows=config.section_llm_parallel_windows,
+    llm_flush_pages=config.section_llm_flush_pages,
+    llm_flush_seconds=config.section_llm_flush_seconds,
+)
\ No newline at end of file
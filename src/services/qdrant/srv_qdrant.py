@@ -1,47 +1,173 @@
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional, Literal
+from typing import Callable, Deque, Dict, List, Optional, Literal, Tuple
 
 from qdrant_client import QdrantClient
 from qdrant_client.models import VectorParams, Distance, \
     PointStruct, Filter, FieldCondition, MatchValue, MatchAny, \
-    SearchParams
+    SearchParams, HasIdCondition
 
-from core import config, logger, openai_embeddings
+from core import config, logger, metrics, openai_embeddings
 from .data_models import QdrantBaseDocument
 
+class QdrantBulkWriter:
+    """Upsert point theo batch batch_size, tối đa `parallel` batch đang gửi cùng lúc.
+
+    wait=False: Qdrant trả về ngay khi nhận request (ghi WAL) chưa chờ apply; flush() là barrier,
+    chờ mọi batch được nhận rồi gửi batch cuối với wait=True. Các update của một collection được
+    apply theo thứ tự nhận nên sau barrier mọi point đã đọc được.
+    on_written(documents) được gọi (ở thread gọi add / flush, theo thứ tự) khi batch chứa documents đã được nhận.
+    """
+    def __init__(
+        self,
+        service: "QdrantService",
+        batch_size: int = 256,
+        parallel: int = 4,
+        wait: bool = False,
+        on_written: Optional[Callable[[List[QdrantBaseDocument]], None]] = None
+    ):
+        self.service = service
+        self.batch_size = max(1, batch_size)
+        self.parallel = max(1, parallel)
+        self.wait = wait
+        self.on_written = on_written
+
+        self._points: List[PointStruct] = []
+        self._documents: List[QdrantBaseDocument] = []
+        self._pending: Deque[Tuple[List[QdrantBaseDocument], Future]] = deque()
+        self._last_batch: List[PointStruct] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._points_written = 0
+        self._batches = 0
+        self._started: Optional[float] = None
+
+    def add(self, documents: List[QdrantBaseDocument], embeddings: List[List[float]]):
+        if len(documents) != len(embeddings):
+            raise ValueError("Số lượng documents và embeddings phải bằng nhau.")
+        if self._started is None:
+            self._started = time.perf_counter()
+
+        for doc, embedding in zip(documents, embeddings):
+            self._points.append(PointStruct(id=doc.id, vector=embedding, payload=doc.model_dump(exclude={"id"})))
+            self._documents.append(doc)
+            if len(self._points) >= self.batch_size:
+                self._submit()
+
+    def flush(self) -> Dict:
+        """Gửi phần còn lại, chờ mọi batch và chốt bằng một request wait=True; trả về thống kê points/sec"""
+        try:
+            while self._pending:
+                self._complete_oldest()
+
+            if self._points:
+                points, documents = self._points, self._documents
+                self._points, self._documents = [], []
+                self._upsert(points, wait=True)
+                self._written(documents, len(points))
+            elif self._last_batch and not self.wait:
+                # Không còn point nào để gửi kèm barrier: gửi lại một batch đã gửi (id cố định nên upsert đè)
+                self._upsert(self._last_batch, wait=True)
+        finally:
+            self.close()
+
+        seconds = time.perf_counter() - self._started if self._started is not None else 0
+        points_per_sec = round(self._points_written / seconds, 1) if seconds else None
+        metrics.incr("qdrant.upsert.seconds", seconds)
+        if points_per_sec is not None:
+            metrics.set_gauge("qdrant.upsert.points_per_sec", points_per_sec)
+        logger.info(
+            f"Inserted {self._points_written} points to {self.service.collection_name} "
+            f"in {self._batches} batches ({points_per_sec} points/sec)"
+        )
+        return {
+            "status": "inserted",
+            "points": self._points_written,
+            "batches": self._batches,
+            "seconds": round(seconds, 3),
+            "points_per_sec": points_per_sec,
+        }
+
+    def close(self):
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _submit(self):
+        points, documents = self._points[:self.batch_size], self._documents[:self.batch_size]
+        del self._points[:self.batch_size], self._documents[:self.batch_size]
+
+        while len(self._pending) >= self.parallel:
+            self._complete_oldest()
+        if self.parallel == 1:
+            self._upsert(points, wait=self.wait)
+            self._written(documents, len(points))
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix="qdrant-upsert")
+        self._pending.append((documents, self._executor.submit(self._upsert, points, self.wait)))
+
+    def _complete_oldest(self):
+        documents, future = self._pending.popleft()
+        self._written(documents, future.result())
+
+    def _upsert(self, points: List[PointStruct], wait: bool) -> int:
+        with metrics.timer("qdrant.upsert.request"):
+            self.service.client.upsert(collection_name=self.service.collection_name, points=points, wait=wait)
+        self._last_batch = points
+        return len(points)
+
+    def _written(self, documents: List[QdrantBaseDocument], count: int):
+        self._points_written += count
+        self._batches += 1
+        metrics.incr("qdrant.upsert.points", count)
+        metrics.incr("qdrant.upsert.batches")
+        if self.on_written is not None:
+            self.on_written(documents)
+
 @dataclass
 class QdrantService:
     collection_name: str
     vector_size: int
     distance: Distance = Distance.COSINE
     recreate: bool = False
+    prefer_grpc: bool = False
+    grpc_port: int = 6334
+    upsert_batch_size: int = 256
+    upsert_parallel: int = 4
+    upsert_wait: bool = False
 
     def __post_init__(self):
-        self.client = QdrantClient(url=config.qdrant_url)
+        # location nhận cả URL lẫn ":memory:" (Qdrant in-memory cho benchmark)
+        self.client = QdrantClient(location=config.qdrant_url, prefer_grpc=self.prefer_grpc, grpc_port=self.grpc_port)
         self._ensure_collection()
 
-    def insert_chunks(self, documents: List[QdrantBaseDocument], embeddings: List[List[float]]):
-        if len(documents) != len(embeddings):
-            raise ValueError("Số lượng documents và embeddings phải bằng nhau.")
-        
-        points: List[PointStruct] = []
-        for doc, embedding in zip(documents, embeddings):
-            payload = doc.model_dump(exclude={"id"})
-            points.append(
-                PointStruct(
-                    id=doc.id,
-                    vector=embedding,
-                    payload=payload,
-                )
-            )
-        
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=points,
+    def bulk_writer(
+        self,
+        on_written: Optional[Callable[[List[QdrantBaseDocument]], None]] = None
+    ) -> QdrantBulkWriter:
+        return QdrantBulkWriter(
+            self,
+            batch_size=self.upsert_batch_size,
+            parallel=self.upsert_parallel,
+            wait=self.upsert_wait,
+            on_written=on_written,
         )
-        logger.info(f"Inserted {len(points)} points to {self.collection_name}")
-        return {"status": "inserted", "points": len(points)}
-        
+
+    def insert_chunks(self, documents: List[QdrantBaseDocument], embeddings: List[List[float]]):
+        writer = self.bulk_writer()
+        try:
+            writer.add(documents, embeddings)
+        except Exception:
+            writer.close()
+            raise
+        return writer.flush()
+
 
     def _ensure_collection(self):
         exists = self.client.collection_exists(self.collection_name)
@@ -81,6 +207,17 @@ class QdrantService:
         )
         return {"status": "deleted", "source_id": source_id}
 
+    def delete_stale_chunks(self, source_id: int, keep_chunk_ids: List[str]):
+        """Xóa các point của source không còn trong danh sách chunk hiện tại (sau khi tách chunk lại)"""
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=Filter(
+                must=[FieldCondition(key="source_id", match=MatchValue(value=source_id))],
+                must_not=[HasIdCondition(has_id=keep_chunk_ids)],
+            ),
+        )
+        return {"status": "deleted", "source_id": source_id, "kept": len(keep_chunk_ids)}
+
     def delete_by_chunk_ids(self, chunk_ids: List[str]):
         self.client.delete(
             collection_name=self.collection_name,
@@ -121,4 +258,9 @@ qdrant_service = QdrantService(
     collection_name=config.qdrant_collection_name,
     vector_size=config.qdrant_embedding_dim,
     recreate=False,
+    prefer_grpc=config.qdrant_prefer_grpc,
+    grpc_port=config.qdrant_grpc_port,
+    upsert_batch_size=config.qdrant_upsert_batch_size,
+    upsert_parallel=config.qdrant_upsert_parallel,
+    upsert_wait=config.qdrant_upsert_wait,
 )
\ No newline at end of file
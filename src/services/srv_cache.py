@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from core import config, logger, metrics
+from database import SessionLocal
+from models.entities import CacheEntry
+from services.srv_base import BaseService
+
+class CacheService(BaseService[CacheEntry]):
+    """Cache kết quả (OCR, caption, ...) lưu trong Postgres, chia theo namespace, evict theo LRU"""
+    def __init__(self, model: type[CacheEntry], evict_interval: float = 60):
+        super().__init__(model)
+        # Evict theo thời gian, không theo số lần ghi: batch ghi lớn không làm COUNT + ORDER BY chạy dày hơn
+        self.evict_interval = float(evict_interval)
+        self._last_evict: Dict[str, float] = {}
+        self._evict_lock = threading.Lock()
+
+        # Lượt đọc (hits / last_used_at) gom trong bộ nhớ, ghi xuống DB theo lô mỗi evict_interval giây
+        # hoặc ngay trước khi evict: đường đọc không phải là một lệnh UPDATE
+        self._pending_hits: Dict[str, Dict[str, int]] = {}
+        self._last_flush: Dict[str, float] = {}
+        self._hits_lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with SessionLocal() as db:
+            entry = (
+                db.query(self.model)
+                .filter(self.model.namespace == namespace, self.model.key == key)
+                .first()
+            )
+            if entry is None:
+                metrics.incr(f"cache.{namespace}.misses")
+                return None
+            value = entry.value
+
+        metrics.incr(f"cache.{namespace}.hits")
+        self._record_hits(namespace, [key])
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, max_entries: Optional[int] = None):
+        now = datetime.now().isoformat()
+        with SessionLocal() as db:
+            entry = (
+                db.query(self.model)
+                .filter(self.model.namespace == namespace, self.model.key == key)
+                .first()
+            )
+            if entry is None:
+                db.add(self.model(namespace=namespace, key=key, value=value, hits=0, last_used_at=now))
+            else:
+                entry.value = value
+                entry.last_used_at = now
+                entry.updated_at = now
+            try:
+                db.commit()
+            except IntegrityError:
+                # Worker khác vừa ghi cùng key
+                db.rollback()
+
+        self._maybe_evict(namespace, max_entries)
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """Như get cho nhiều key trong một query, trả về {key: value} của các key có trong cache"""
+        keys = set(keys)
+        if not keys:
+            return {}
+
+        with SessionLocal() as db:
+            entries = (
+                db.query(self.model)
+                .filter(self.model.namespace == namespace, self.model.key.in_(keys))
+                .all()
+            )
+            values = {entry.key: entry.value for entry in entries}
+
+        metrics.incr(f"cache.{namespace}.hits", len(values))
+        metrics.incr(f"cache.{namespace}.misses", len(keys) - len(values))
+        self._record_hits(namespace, list(values))
+        return values
+
+    def set_many(self, namespace: str, items: Dict[str, Any], max_entries: Optional[int] = None):
+        """Như set cho nhiều key trong một transaction"""
+        if not items:
+            return
+
+        now = datetime.now().isoformat()
+        with SessionLocal() as db:
+            existing = {
+                entry.key: entry for entry in (
+                    db.query(self.model)
+                    .filter(self.model.namespace == namespace, self.model.key.in_(list(items)))
+                    .all()
+                )
+            }
+            for key, value in items.items():
+                entry = existing.get(key)
+                if entry is None:
+                    db.add(self.model(namespace=namespace, key=key, value=value, hits=0, last_used_at=now))
+                else:
+                    entry.value = value
+                    entry.last_used_at = now
+                    entry.updated_at = now
+            try:
+                db.commit()
+                conflict = False
+            except IntegrityError:
+                db.rollback()
+                conflict = True
+
+        if conflict:
+            # Worker khác vừa ghi một trong các key -> ghi lại từng key
+            for key, value in items.items():
+                self.set(namespace, key, value)
+        self._maybe_evict(namespace, max_entries)
+
+    def _maybe_evict(self, namespace: str, max_entries: Optional[int]):
+        """Evict tối đa một lần mỗi evict_interval giây cho mỗi namespace, namespace có thể vượt max_entries
+        trong khoảng đó"""
+        if not max_entries:
+            return
+        now = time.monotonic()
+        with self._evict_lock:
+            last_evict = self._last_evict.get(namespace)
+            if last_evict is not None and now - last_evict < self.evict_interval:
+                return
+            self._last_evict[namespace] = now
+        # Ghi lượt đọc đang chờ trước để thứ tự LRU thấy cả các entry vừa được đọc
+        self.flush_hits(namespace)
+        self.evict(namespace, max_entries)
+
+    def _record_hits(self, namespace: str, keys: List[str]):
+        if not keys:
+            return
+        now = time.monotonic()
+        with self._hits_lock:
+            pending = self._pending_hits.setdefault(namespace, {})
+            for key in keys:
+                pending[key] = pending.get(key, 0) + 1
+            last_flush = self._last_flush.setdefault(namespace, now)
+            if now - last_flush < self.evict_interval:
+                return
+            # Chỉ một luồng flush mỗi lượt, luồng khác tiếp tục gom vào lô mới
+            self._last_flush[namespace] = now
+
+        try:
+            self.flush_hits(namespace)
+        except Exception as e:
+            # Giá trị đã đọc xong, lỗi ghi bộ đếm LRU không làm lỗi lượt đọc
+            logger.error(f"Cache: hit counter flush error for '{namespace}': {e}")
+
+    def flush_hits(self, namespace: str) -> int:
+        """Ghi các lượt đọc đang gom của namespace: mỗi nhóm key cùng số lượt là một lệnh UPDATE.
+
+        last_used_at là thời điểm flush, các lượt đọc chưa flush bị mất nếu process dừng (chỉ ảnh hưởng thứ tự LRU).
+        """
+        with self._hits_lock:
+            pending = self._pending_hits.pop(namespace, None)
+            self._last_flush[namespace] = time.monotonic()
+        if not pending:
+            return 0
+
+        keys_by_count: Dict[int, List[str]] = defaultdict(list)
+        for key, count in pending.items():
+            keys_by_count[count].append(key)
+
+        now = datetime.now().isoformat()
+        with SessionLocal() as db:
+            for count, keys in keys_by_count.items():
+                (
+                    db.query(self.model)
+                    .filter(self.model.namespace == namespace, self.model.key.in_(keys))
+                    .update(
+                        {self.model.hits: func.coalesce(self.model.hits, 0) + count, self.model.last_used_at: now},
+                        synchronize_session=False,
+                    )
+                )
+            db.commit()
+        return len(pending)
+
+    def evict(self, namespace: str, max_entries: int) -> int:
+        """Giữ lại max_entries entry được dùng gần nhất của namespace"""
+        with SessionLocal() as db:
+            total = db.query(self.model).filter(self.model.namespace == namespace).count()
+            overflow = total - max_entries
+            if overflow <= 0:
+                return 0
+
+            stale_ids = [
+                row.id for row in (
+                    db.query(self.model.id)
+                    .filter(self.model.namespace == namespace)
+                    .order_by(self.model.last_used_at.asc())
+                    .limit(overflow)
+                    .all()
+                )
+            ]
+            db.query(self.model).filter(self.model.id.in_(stale_ids)).delete(synchronize_session=False)
+            db.commit()
+
+        metrics.incr(f"cache.{namespace}.evictions", len(stale_ids))
+        logger.info(f"Cache: evicted {len(stale_ids)} entries from '{namespace}'")
+        return len(stale_ids)
+
+    def stats(self, namespace: str) -> Dict[str, Any]:
+        hits = metrics.get(f"cache.{namespace}.hits")
+        misses = metrics.get(f"cache.{namespace}.misses")
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "evictions": metrics.get(f"cache.{namespace}.evictions"),
+        }
+
+cache_service = CacheService(CacheEntry, evict_interval=config.cache_evict_interval_seconds)
@@ -0,0 +1,132 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.exc import IntegrityError
+
+from core import logger
+from database import SessionLocal
+from models.entities import IngestionCheckpoint
+from services.srv_base import BaseService
+
+class CheckpointService(BaseService[IngestionCheckpoint]):
+    """Lưu kết quả trung gian của pipeline theo source để chạy lại không phải làm lại từ đầu"""
+    STAGE_PAGE = "page"
+    STAGE_TREE = "tree"
+    STAGE_DOCUMENTS = "documents"
+    STAGE_EMBEDDED = "embedded"
+
+    def __init__(self, model: type[IngestionCheckpoint]):
+        super().__init__(model)
+
+    def get(self, source_id: int, stage: str, key: str = "") -> Optional[Any]:
+        with SessionLocal() as db:
+            entry = (
+                db.query(self.model)
+                .filter(self.model.source_id == source_id, self.model.stage == stage, self.model.key == key)
+                .first()
+            )
+            return entry.value if entry is not None else None
+
+    def get_stage(self, source_id: int, stage: str) -> Dict[str, Any]:
+        with SessionLocal() as db:
+            entries = (
+                db.query(self.model)
+                .filter(self.model.source_id == source_id, self.model.stage == stage)
+                .all()
+            )
+            return {entry.key: entry.value for entry in entries}
+
+    def set(self, source_id: int, stage: str, value: Any, key: str = ""):
+        self.set_many(source_id, stage, {key: value})
+
+    def set_many(self, source_id: int, stage: str, values: Dict[str, Any]):
+        """Ghi nhiều key của một stage trong cùng một transaction"""
+        if not values:
+            return
+
+        now = datetime.now().isoformat()
+        with SessionLocal() as db:
+            existing = {
+                entry.key: entry for entry in (
+                    db.query(self.model)
+                    .filter(
+                        self.model.source_id == source_id,
+                        self.model.stage == stage,
+                        self.model.key.in_(list(values.keys())),
+                    )
+                    .all()
+                )
+            }
+            for key, value in values.items():
+                if key in existing:
+                    existing[key].value = value
+                    existing[key].updated_at = now
+                else:
+                    db.add(self.model(source_id=source_id, stage=stage, key=key, value=value))
+            try:
+                db.commit()
+            except IntegrityError:
+                # Worker khác vừa ghi cùng key
+                db.rollback()
+
+    def clear(self, source_id: int, stages: Optional[Iterable[str]] = None, keep_stages: Iterable[str] = ()) -> int:
+        """Xóa checkpoint của source, chỉ các stage trong stages nếu có, trừ các stage trong keep_stages"""
+        keep_stages = list(keep_stages)
+        with SessionLocal() as db:
+            query = db.query(self.model).filter(self.model.source_id == source_id)
+            if stages is not None:
+                query = query.filter(self.model.stage.in_(list(stages)))
+            if keep_stages:
+                query = query.filter(self.model.stage.notin_(keep_stages))
+            count = query.delete(synchronize_session=False)
+            db.commit()
+        logger.info(f"Checkpoint: cleared {count} entries of source {source_id}")
+        return count
+
+
+class SourceCheckpoint:
+    """Checkpoint của một source, được truyền qua các stage của pipeline"""
+    def __init__(self, source_id: int, service: CheckpointService):
+        self.source_id = source_id
+        self.service = service
+
+    def get_pages(self) -> Dict[int, List[Dict]]:
+        """{page_number: [node, ...]} của các trang đã OCR + caption xong"""
+        pages = self.service.get_stage(self.source_id, CheckpointService.STAGE_PAGE)
+        return {int(page_number): nodes for page_number, nodes in pages.items()}
+
+    def save_pages(self, nodes_by_page: Dict[int, List[Dict]]):
+        values = {str(page_number): nodes for page_number, nodes in nodes_by_page.items()}
+        self.service.set_many(self.source_id, CheckpointService.STAGE_PAGE, values)
+
+    def get_tree(self) -> Optional[List[Dict]]:
+        return self.service.get(self.source_id, CheckpointService.STAGE_TREE)
+
+    def save_tree(self, tree: List[Dict]):
+        self.service.set(self.source_id, CheckpointService.STAGE_TREE, tree)
+
+    def get_documents(self) -> Optional[List[Dict]]:
+        return self.service.get(self.source_id, CheckpointService.STAGE_DOCUMENTS)
+
+    def save_documents(self, documents: List[Dict]):
+        self.service.set(self.source_id, CheckpointService.STAGE_DOCUMENTS, documents)
+
+    def get_embedded_ids(self) -> Set[str]:
+        batches = self.service.get_stage(self.source_id, CheckpointService.STAGE_EMBEDDED)
+        return {chunk_id for chunk_ids in batches.values() for chunk_id in chunk_ids}
+
+    def add_embedded_ids(self, batch_key: str, chunk_ids: List[str]):
+        self.service.set(self.source_id, CheckpointService.STAGE_EMBEDDED, chunk_ids, key=batch_key)
+
+    def clear_embedded_ids(self):
+        self.service.clear(self.source_id, stages=[CheckpointService.STAGE_EMBEDDED])
+
+    def clear(self):
+        self.service.clear(self.source_id)
+
+    def keep_pages(self):
+        """Chỉ giữ các trang đã OCR xong. Cây, chunk và id đã embed dựng từ tài liệu thiếu trang nên bỏ,
+        lần chạy sau OCR các trang còn thiếu rồi dựng lại từ đầu"""
+        self.service.clear(self.source_id, keep_stages=[CheckpointService.STAGE_PAGE])
+
+checkpoint_service = CheckpointService(IngestionCheckpoint)
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from core import config, logger, metrics, openai_embeddings
+from services.srv_cache import cache_service
+
+T = TypeVar("T")
+
+class EmbeddingService:
+    """Embed chunk theo batch, nhiều batch chạy song song, vector cache theo hash(model + nội dung chunk).
+
+    Chunk lặp lại giữa các source (header, footer, điều khoản mẫu...) chỉ gọi model một lần.
+    Vector trong cache lưu dạng float32 little-endian base64 thay vì list JSON (nhỏ hơn ~4 lần).
+    """
+    CACHE_NAMESPACE = "embedding"
+
+    def __init__(
+        self,
+        embeddings,
+        cache=cache_service,
+        max_in_flight: int = 4,
+        cache_enabled: bool = True,
+        cache_max_entries: int = 20000
+    ):
+        # Model embedding, có thể thay bằng model giả khi chạy benchmark
+        self.embeddings = embeddings
+        # Cache bền vững (get_many / set_many), benchmark có thể thay bằng cache trong bộ nhớ
+        self.cache = cache
+        # Số batch gửi model cùng lúc (dùng chung cho mọi source đang ingest)
+        self.max_in_flight = max(1, max_in_flight)
+        self.cache_enabled = cache_enabled
+        self.cache_max_entries = cache_max_entries
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+
+    def embed_batches(
+        self,
+        batches: Iterable[T],
+        get_texts: Callable[[T], List[str]]
+    ) -> Iterator[Tuple[T, List[List[float]]]]:
+        """Trả (batch, vectors) theo đúng thứ tự batch, tối đa max_in_flight batch đang embed cùng lúc"""
+        batches = iter(batches)
+        executor = self._get_executor()
+
+        pending: Deque[Tuple[T, Future]] = deque()
+        for batch in islice(batches, self.max_in_flight):
+            pending.append((batch, executor.submit(self.embed_documents, get_texts(batch))))
+
+        try:
+            while pending:
+                batch, future = pending.popleft()
+                vectors = future.result()
+                next_batch = next(batches, None)
+                if next_batch is not None:
+                    pending.append((next_batch, executor.submit(self.embed_documents, get_texts(next_batch))))
+                yield batch, vectors
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed một batch: lấy vector có sẵn trong cache, chỉ gửi model các nội dung chưa gặp (mỗi nội dung một lần)"""
+        keys = [self._cache_key(text) for text in texts]
+        vectors: Dict[str, List[float]] = self._get_cached(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            started = time.perf_counter()
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self._record_embed(len(missing), time.perf_counter() - started)
+
+            new_items = dict(zip(missing, new_vectors))
+            vectors.update(new_items)
+            self._set_cached(new_items)
+
+        metrics.incr("embedding.texts", len(texts))
+        metrics.incr("embedding.batches")
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """hit_ratio: tỉ lệ chunk không phải gửi model (có trong cache hoặc trùng trong batch)"""
+        texts = metrics.get("embedding.texts")
+        embedded = metrics.get("embedding.embedded_texts")
+        seconds = metrics.get("embedding.seconds")
+        return {
+            "texts": texts,
+            "embedded_texts": embedded,
+            "hit_ratio": round(1 - embedded / texts, 4) if texts else None,
+            "embed_texts_per_sec": round(embedded / seconds, 2) if seconds else None,
+        }
+
+    def _record_embed(self, count: int, seconds: float):
+        metrics.incr("embedding.embedded_texts", count)
+        metrics.incr("embedding.seconds", seconds)
+        metrics.incr("embedding.requests")
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def _get_cached(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not self.cache_enabled:
+            return {}
+        try:
+            cached = self.cache.get_many(self.CACHE_NAMESPACE, keys)
+        except Exception as e:
+            logger.error(f"Embedding cache read error: {e}")
+            return {}
+        return {key: self._unpack_vector(value) for key, value in cached.items()}
+
+    def _set_cached(self, items: Dict[str, List[float]]):
+        if not self.cache_enabled:
+            return
+        try:
+            self.cache.set_many(
+                self.CACHE_NAMESPACE,
+                {key: self._pack_vector(vector) for key, vector in items.items()},
+                max_entries=self.cache_max_entries,
+            )
+        except Exception as e:
+            logger.error(f"Embedding cache write error: {e}")
+
+    @staticmethod
+    def _pack_vector(vector: List[float]) -> str:
+        return base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+
+    @staticmethod
+    def _unpack_vector(value) -> List[float]:
+        # Entry ghi trước khi nén vẫn là list JSON
+        if isinstance(value, list):
+            return value
+        data = base64.b64decode(value)
+        return list(struct.unpack(f"<{len(data) // 4}f", data))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embedding")
+            return self._executor
+
+embedding_service = EmbeddingService(
+    openai_embeddings,
+    max_in_flight=config.embedding_max_in_flight,
+    cache_enabled=config.embedding_cache_enabled,
+    cache_max_entries=config.embedding_cache_max_entries,
+)
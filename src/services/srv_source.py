@@ -1,38 +1,221 @@
+import uuid
+from itertools import batched
 from pathlib import Path
-from typing import Union, List
+from typing import Union, Iterable, Iterator, List, Optional, Set, Tuple
 
 from sqlalchemy.orm import Session
 
-from core import logger, openai_embeddings
+from core import config, logger
+from database import SessionLocal
 from models.entities import Source
 from models.relationship import NotebookSource
 from services.srv_base import BaseService
+from services.srv_checkpoint import checkpoint_service, SourceCheckpoint
+from services.srv_embedding import embedding_service
 from services.qdrant import qdrant_service, QdrantBaseDocument
 
 from services.process_document.document_processor import document_processor
+from services.process_document.utils import IngestionProgress, SectionNode, ContextualDocumentService, \
+    run_stage, tree_builder, contextual_document_service
 
 class SourceService(BaseService[Source]):
     def __init__(self, model: type[Source]):
         super().__init__(model)
-        self.embedding_batch = 128
+        self.embedding_batch = config.embedding_batch_size
+        self.checkpoint_enabled = config.ingestion_checkpoint_enabled
+        # pipelined: embed batch tiếp theo trong lúc upsert batch hiện tại, không chờ chunk xong cả tài liệu
+        self.pipelined = config.ingestion_pipeline_enabled
+        self.queue_size = config.ingestion_stage_queue_size
     
-    def process_file(self, file_path: str, file_name: str, source_id: int, output_dir: str) -> bool:
-        # Documents
-        documents = document_processor.process_document(file_path, file_name, output_dir)
+    def process_file(
+        self,
+        file_path: str,
+        file_name: str,
+        source_id: int,
+        output_dir: str,
+        progress: Optional[IngestionProgress] = None
+    ) -> bool:
+        progress = progress or IngestionProgress()
+        checkpoint = SourceCheckpoint(source_id, checkpoint_service) if self.checkpoint_enabled else None
+
+        # Documents (lấy lại từ checkpoint nếu lần chạy trước đã tách chunk xong)
+        tree: List[SectionNode] = []
+        documents_data = checkpoint.get_documents() if checkpoint is not None else None
+        if documents_data is not None:
+            documents = [QdrantBaseDocument(**doc) for doc in documents_data]
+            progress.set("chunks_total", len(documents))
+            tree = [SectionNode(**node) for node in checkpoint.get_tree() or []]
+        else:
+            # Chưa có cây: cây dựng lại có thể khác lần trước (LLM chọn parent khác) nên cùng id chunk
+            # nhưng nội dung khác, id đã embed ở lần chạy trước không còn đúng
+            if checkpoint is not None and checkpoint.get_tree() is None:
+                checkpoint.clear_embedded_ids()
+            documents = self._iter_documents(file_path, file_name, source_id, output_dir, progress, checkpoint, tree)
+            if not self.pipelined:
+                documents = list(documents)
+
+        # Embedding + insert vào vector db theo batch, bỏ qua các batch đã insert ở lần chạy trước
+        embedded_ids = checkpoint.get_embedded_ids() if checkpoint is not None else set()
+        chunk_ids = []
+        self._embed_and_upsert(self._track_ids(documents, chunk_ids), embedded_ids, progress, checkpoint)
+
+        # Có trang OCR / caption ảnh lỗi: chunk của tài liệu thiếu nội dung không được tìm thấy, giữ checkpoint
+        # các trang đã xong, task kết thúc lỗi để retry chỉ xử lý lại các trang thiếu
+        if progress.has_failures():
+            qdrant_service.delete_by_source(source_id)
+            if checkpoint is not None:
+                checkpoint.keep_pages()
+            return False
+
+        # Chunk của lần chạy trước không còn trong danh sách chunk hiện tại
+        qdrant_service.delete_stale_chunks(source_id, chunk_ids)
+
+        # Lưu cây section lên Source để sau này tách chunk lại không cần OCR lại
+        if tree:
+            self._save_structure(source_id, tree, file_path, file_name, contextual_document_service)
+
+        # Xong toàn bộ -> xóa checkpoint
+        if checkpoint is not None:
+            checkpoint.clear()
+        return True
+
+    def rechunk_source(
+        self,
+        source_id: int,
+        chunk_size: int,
+        chunk_overlap: int,
+        progress: Optional[IngestionProgress] = None
+    ) -> Optional[int]:
+        """Tách chunk + embed lại một source từ cây section đã lưu với cấu hình splitter mới, không OCR lại.
+
+        Trả về số chunk mới, None nếu source chưa có cây section.
+        """
+        progress = progress or IngestionProgress()
+        with SessionLocal() as db:
+            source = self.get_by_id(source_id, db)
+            structure = source.structure_config if source is not None else None
+        if not structure or "nodes" not in structure:
+            return None
+
+        tree = tree_builder.from_compact(structure)
+        contextual_service = ContextualDocumentService(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        chunk_ids = []
+        documents = self._track_ids(
+            self._assign_ids(document_processor.iter_tree_documents(tree, contextual_service, progress), source_id),
+            chunk_ids
+        )
+        if not self.pipelined:
+            documents = list(documents)
+        self._embed_and_upsert(documents, set(), progress, checkpoint=None)
+
+        # Chunk cũ vẫn tìm được cho tới khi chunk mới đã upsert xong, sau đó mới xóa phần thừa
+        qdrant_service.delete_stale_chunks(source_id, chunk_ids)
+        self._save_structure(source_id, tree, structure.get("file_path"), structure.get("filename"), contextual_service)
+        logger.info(
+            f"SourceService: rechunked source {source_id} into {len(chunk_ids)} chunks "
+            f"(chunk_size={chunk_size}, chunk_overlap={chunk_overlap})"
+        )
+        return len(chunk_ids)
+
+    def _iter_documents(
+        self,
+        file_path: str,
+        file_name: str,
+        source_id: int,
+        output_dir: str,
+        progress: IngestionProgress,
+        checkpoint: Optional[SourceCheckpoint],
+        tree: List[SectionNode]
+    ) -> Iterator[QdrantBaseDocument]:
+        documents = []
+        for doc in self._assign_ids(document_processor.iter_documents(
+            file_path, file_name, output_dir, progress=progress, checkpoint=checkpoint, on_tree=tree.extend
+        ), source_id):
+            if checkpoint is not None:
+                documents.append(doc)
+            yield doc
+
+        if checkpoint is not None and not progress.has_failures():
+            checkpoint.save_documents([doc.model_dump() for doc in documents])
+
+    @staticmethod
+    def _track_ids(documents: Iterable[QdrantBaseDocument], chunk_ids: List[str]) -> Iterator[QdrantBaseDocument]:
         for doc in documents:
+            chunk_ids.append(doc.id)
+            yield doc
+
+    @staticmethod
+    def _assign_ids(documents: Iterable[QdrantBaseDocument], source_id: int) -> Iterator[QdrantBaseDocument]:
+        for index, doc in enumerate(documents):
             doc.source_id = source_id
+            # Id cố định theo source + vị trí chunk: chạy lại thì upsert đè, không sinh point trùng
+            doc.id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"source:{source_id}:chunk:{index}"))
+            yield doc
 
-        # Embedding theo batch
-        all_contents = [doc.content for doc in documents]
-        embeddings = []
-        for i in range(0, len(all_contents), self.embedding_batch):
-            batch_texts = all_contents[i : i + self.embedding_batch]
-            batch_embeddings = openai_embeddings.embed_documents(batch_texts)
-            embeddings.extend(batch_embeddings)
-        
-        # Insert vào vector db
-        qdrant_service.insert_chunks(documents, embeddings)
-        return True
+    def _embed_and_upsert(
+        self,
+        documents: Iterable[QdrantBaseDocument],
+        embedded_ids: Set[str],
+        progress: IngestionProgress,
+        checkpoint: Optional[SourceCheckpoint]
+    ):
+        embedded_batches = self._embed_batches(documents, embedded_ids, progress)
+        if self.pipelined:
+            embedded_batches = run_stage(embedded_batches, maxsize=self.queue_size, name="embed")
+
+        def on_written(batch_documents: List[QdrantBaseDocument]):
+            if checkpoint is not None:
+                checkpoint.add_embedded_ids(batch_documents[0].id, [doc.id for doc in batch_documents])
+            progress.incr("chunks_embedded", len(batch_documents))
+
+        # Upsert theo batch cố định, song song, không chờ từng batch apply; flush() chốt lại ở cuối
+        writer = qdrant_service.bulk_writer(on_written=on_written)
+        try:
+            for batch_documents, batch_embeddings in embedded_batches:
+                writer.add(batch_documents, batch_embeddings)
+        except Exception:
+            writer.close()
+            raise
+        writer.flush()
+
+    def _save_structure(
+        self,
+        source_id: int,
+        tree: List[SectionNode],
+        file_path: Optional[str],
+        file_name: Optional[str],
+        contextual_service: ContextualDocumentService
+    ):
+        structure = tree_builder.to_compact(tree, file_path, file_name)
+        structure["chunking"] = {
+            "chunk_size": contextual_service.chunk_size,
+            "chunk_overlap": contextual_service.chunk_overlap,
+        }
+        try:
+            with SessionLocal() as db:
+                self.update(source_id, {"structure_config": structure}, db)
+        except Exception as e:
+            logger.error(f"SourceService: lỗi lưu cây section của source {source_id}: {e}")
+
+    def _embed_batches(
+        self,
+        documents: Iterable[QdrantBaseDocument],
+        embedded_ids: Set[str],
+        progress: IngestionProgress
+    ) -> Iterator[Tuple[List[QdrantBaseDocument], List[List[float]]]]:
+        def pending_batches() -> Iterator[List[QdrantBaseDocument]]:
+            for batch in batched(documents, self.embedding_batch):
+                batch_documents = list(batch)
+                if all(doc.id in embedded_ids for doc in batch_documents):
+                    progress.incr("chunks_embedded", len(batch_documents))
+                    progress.incr("chunks_resumed", len(batch_documents))
+                    continue
+                yield batch_documents
+
+        # Nhiều batch embed song song, trả về theo thứ tự để upsert + checkpoint vẫn đúng thứ tự chunk
+        yield from embedding_service.embed_batches(
+            pending_batches(), lambda batch_documents: [doc.content for doc in batch_documents]
+        )
     
     def get_source_by_file_hash(self, file_hash: str, db: Session):
         return db.query(Source).filter(Source.file_hash == file_hash).first()
@@ -1,2 +1,2 @@
-from .hash import get_bytes_and_hash
+from .hash import get_bytes_and_hash, get_perceptual_hash, hamming_distance
 from .image_caption import check_valid_file_type, normalize_static_path
\ No newline at end of file
@@ -1,8 +1,11 @@
 import re
 import hashlib
 import unicodedata
+from io import BytesIO
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
+
+from PIL import Image
 
 def get_bytes_and_hash(file: Union[bytes, str, Path]):
     if isinstance(file, (str, Path)):
@@ -24,4 +27,24 @@ def normalize_text(text: str) -> str:
 
     text = unicodedata.normalize("NFC", text)
     text = " ".join(text.split())
-    return text.strip()
\ No newline at end of file
+    return text.strip()
+
+def get_perceptual_hash(content: bytes, hash_size: int = 8) -> Optional[int]:
+    """dHash: ảnh gần giống nhau (resize, nén lại, watermark nhạt) cho hash có khoảng cách Hamming nhỏ"""
+    try:
+        with Image.open(BytesIO(content)) as img:
+            gray = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    except Exception:
+        return None
+
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | int(left > right)
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
@@ -0,0 +1,67 @@
+"""Nhận dạng kiểu đánh số của tiêu đề ("1.2.3", "II.", "Chương II", "Điều 5", "Phần A", "a)").
+
+Dùng để suy ra phân cấp section bằng luật, không cần gọi LLM. Module thuần Python.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# Từ khóa đánh số và cấp cố định của nó (nhỏ hơn = cấp cao hơn), dùng khi từ khóa xuất hiện sau cấp thấp hơn
+KEYWORD_RANKS = {
+    "phần": 0, "part": 0,
+    "chương": 1, "chapter": 1,
+    "mục": 2, "section": 2,
+    "tiết": 3,
+    "điều": 4, "article": 4,
+    "khoản": 5,
+}
+
+KEYWORD_PATTERN = re.compile(
+    r"^(" + "|".join(KEYWORD_RANKS) + r")\s+(\d{1,3}(?:\.\d{1,3})*|[IVXLCDM]{1,7}|[A-Z])(?=[\s.:\-–)]|$)",
+    re.IGNORECASE,
+)
+# 1. / 1) / 1.2 / 1.2.3 (số một cấp bắt buộc có "." hoặc ")" để không nhầm với năm, số liệu)
+DECIMAL_PATTERN = re.compile(r"^(\d{1,3}(?:\.\d{1,3})+)\.?(?=\s|$)|^(\d{1,3})[.)](?=\s|$)")
+ROMAN_PATTERN = re.compile(r"^([IVXLCDM]{1,7})[.)](?=\s|$)")
+UPPER_ALPHA_PATTERN = re.compile(r"^([A-Z])[.)](?=\s|$)")
+LOWER_ALPHA_PATTERN = re.compile(r"^([a-zđ])[.)](?=\s|$)")
+ROMAN_NUMERAL_PATTERN = re.compile(r"^M{0,3}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})$")
+
+@dataclass(frozen=True)
+class HeadingNumbering:
+    scheme: str                  # kw:chương, decimal:2, roman, upper_alpha, lower_alpha
+    label: str                   # phần đánh số gốc: "1.2", "II", "5"
+    rank: Optional[int] = None   # cấp cố định của từ khóa, None nếu cấp phụ thuộc thứ tự xuất hiện
+
+def parse_numbering(title: str) -> Optional[HeadingNumbering]:
+    """Kiểu đánh số ở đầu tiêu đề, None nếu tiêu đề không đánh số"""
+    title = (title or "").strip()
+    if not title:
+        return None
+
+    match = KEYWORD_PATTERN.match(title)
+    if match:
+        keyword, label = match.group(1).lower(), match.group(2)
+        # "Section 2.1" cùng kiểu với "2.1", không cùng cấp với "Section 2"
+        if "." in label:
+            return HeadingNumbering(scheme=f"decimal:{label.count('.') + 1}", label=label)
+        return HeadingNumbering(scheme=f"kw:{keyword}", label=label, rank=KEYWORD_RANKS[keyword])
+
+    match = DECIMAL_PATTERN.match(title)
+    if match:
+        label = match.group(1) or match.group(2)
+        return HeadingNumbering(scheme=f"decimal:{label.count('.') + 1}", label=label)
+
+    # "I." / "V." / "X." vừa là số La Mã vừa là chữ cái, ưu tiên số La Mã; "C." / "D." / "M." là chữ cái
+    match = ROMAN_PATTERN.match(title)
+    if match and ROMAN_NUMERAL_PATTERN.match(match.group(1)) and (len(match.group(1)) > 1 or match.group(1) in "IVX"):
+        return HeadingNumbering(scheme="roman", label=match.group(1))
+
+    match = UPPER_ALPHA_PATTERN.match(title)
+    if match:
+        return HeadingNumbering(scheme="upper_alpha", label=match.group(1))
+
+    match = LOWER_ALPHA_PATTERN.match(title)
+    if match:
+        return HeadingNumbering(scheme="lower_alpha", label=match.group(1))
+    return None
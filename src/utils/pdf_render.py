@@ -0,0 +1,180 @@
+"""Render trang PDF thành dữ liệu thuần (dict) để dùng được cả trong process con.
+
+Module này không được import `core`/`services` vì sẽ được import lại trong mỗi worker process.
+"""
+import os
+import hashlib
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+from PIL import Image
+
+from .hash import get_perceptual_hash
+from .text_layer import count_text_chars, extract_text_segments
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+@dataclass(frozen=True)
+class PageEncoding:
+    """Cách render + nén ảnh toàn trang trước khi gửi cho LLM"""
+    dpi: int = 144
+    # Trang nhiều chữ (chữ nhỏ) được render nét hơn, tối đa max_dpi
+    max_dpi: int = 200
+    dense_chars_per_sq_inch: float = 25.0
+    image_format: str = "png"  # png | jpeg | webp
+    quality: int = 85
+    # Cạnh dài nhất của ảnh (pixel) sau khi render
+    max_edge: int = 2048
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.image_format]
+
+    def choose_dpi(self, page_rect: fitz.Rect, text_chars: int = 0, scan_dpi: Optional[float] = None) -> float:
+        dpi = float(self.dpi)
+
+        area_sq_inch = (page_rect.width / 72) * (page_rect.height / 72)
+        if area_sq_inch and text_chars / area_sq_inch >= self.dense_chars_per_sq_inch:
+            dpi = float(self.max_dpi)
+
+        # Trang scan: render cao hơn độ phân giải gốc của ảnh scan không thêm chi tiết
+        if scan_dpi:
+            dpi = min(dpi, scan_dpi)
+
+        longest_edge_inch = max(page_rect.width, page_rect.height) / 72
+        if longest_edge_inch:
+            dpi = min(dpi, self.max_edge / longest_edge_inch)
+        return dpi
+
+    def encode(self, pix: fitz.Pixmap) -> bytes:
+        if self.image_format == "png":
+            return pix.tobytes("png")
+        if self.image_format == "jpeg":
+            return pix.tobytes("jpg", jpg_quality=self.quality)
+
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        buffer = BytesIO()
+        img.save(buffer, format="WEBP", quality=self.quality)
+        return buffer.getvalue()
+
+@dataclass(frozen=True)
+class RenderOptions:
+    # OCR cần ảnh nét hơn ảnh trang chỉ dùng làm ngữ cảnh khi caption
+    ocr_encoding: PageEncoding = field(default_factory=PageEncoding)
+    context_encoding: PageEncoding = field(default_factory=lambda: PageEncoding(dpi=96, max_dpi=96, max_edge=1280))
+
+    min_width: int = 100
+    min_height: int = 100
+    max_width: int = 5000
+    max_height: int = 5000
+
+    # Trang có text layer đủ tốt sẽ không cần render/OCR bằng LLM
+    text_layer_enabled: bool = True
+    text_layer_min_chars: int = 200
+
+    # Tính perceptual hash cho ảnh để gộp ảnh gần giống nhau khi caption
+    perceptual_hash: bool = False
+
+    def is_valid_size(self, width: int, height: int) -> bool:
+        if width < self.min_width or height < self.min_height:
+            return False
+        if width > self.max_width or height > self.max_height:
+            return False
+        return True
+
+def render_page(doc: fitz.Document, page_index: int, output_dir: str, options: RenderOptions) -> Dict:
+    page = doc[page_index]
+
+    # Thử đọc text layer (bỏ ảnh khỏi output để không tốn bộ nhớ)
+    text_segments, text_chars = None, 0
+    if options.text_layer_enabled:
+        page_dict = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)
+        text_segments = extract_text_segments(page_dict, min_chars=options.text_layer_min_chars)
+        text_chars = count_text_chars(page_dict)
+        del page_dict
+
+    # Lấy danh sách hình ảnh trong trang
+    images = []
+    for img_index, img in enumerate(page.get_images(full=True)):
+        xref = img[0]
+        base_image = doc.extract_image(xref)
+
+        # Nếu w, h không hợp lệ thì bỏ qua
+        if not options.is_valid_size(base_image["width"], base_image["height"]):
+            continue
+
+        converted = _to_llm_image(doc, xref, base_image)
+        if converted is None:
+            continue
+        image_bytes, image_ext = converted
+        image_path = os.path.join(output_dir, f"image_p{page_index+1}_{img_index+1}.{image_ext}")
+        with open(image_path, "wb") as img_file:
+            img_file.write(image_bytes)
+
+        images.append({
+            "static_file_path": image_path.replace("\\", "/").replace("app/static/", ""),
+            "local_path": image_path,
+            "mime_type": MIME_TYPES[image_ext],
+            "content_hash": hashlib.sha256(image_bytes).hexdigest(),
+            "perceptual_hash": get_perceptual_hash(image_bytes) if options.perceptual_hash else None,
+        })
+
+    # Tạo ảnh toàn trang: cần cho OCR, hoặc làm ngữ cảnh khi caption ảnh.
+    # Giữ bytes đã nén (không base64) để không nhân đôi bộ nhớ, base64 chỉ tạo lúc gửi LLM
+    page_bytes, content_hash = None, None
+    encoding = options.ocr_encoding if text_segments is None else options.context_encoding
+    if text_segments is None or images:
+        page_bytes, content_hash = _encode_page(page, encoding, text_chars)
+
+    return {
+        "page_number": page_index + 1,
+        "image_data": page_bytes,
+        "images": images,
+        "mime_type": encoding.mime_type,
+        "content_hash": content_hash,
+        "text_segments": text_segments,
+        "encoded_bytes": len(page_bytes) if page_bytes is not None else 0,
+    }
+
+def _to_llm_image(doc: fitz.Document, xref: int, base_image: Dict) -> Optional[Tuple[bytes, str]]:
+    """(bytes, định dạng) của ảnh nhúng. Định dạng vision API không nhận (jpx, jb2, jxr, tiff, ...) được encode lại
+    sang PNG, None nếu không decode được ảnh"""
+    image_ext = "jpeg" if base_image["ext"] == "jpg" else base_image["ext"]
+    if image_ext in MIME_TYPES:
+        return base_image["image"], image_ext
+
+    try:
+        pix = fitz.Pixmap(doc, xref)
+        # PNG chỉ nhận ảnh xám / RGB
+        if pix.colorspace is not None and pix.colorspace.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        return pix.tobytes("png"), "png"
+    except (RuntimeError, ValueError):
+        return None
+
+def _encode_page(page: fitz.Page, encoding: PageEncoding, text_chars: int) -> Tuple[bytes, str]:
+    dpi = encoding.choose_dpi(page.rect, text_chars, _get_scan_dpi(page))
+    pix = page.get_pixmap(dpi=round(dpi), colorspace=fitz.csRGB)
+    page_bytes = encoding.encode(pix)
+    del pix
+    return page_bytes, hashlib.sha256(page_bytes).hexdigest()
+
+def _get_scan_dpi(page: fitz.Page, min_coverage: float = 0.8) -> Optional[float]:
+    """Độ phân giải gốc (dpi) của ảnh scan phủ gần hết trang, None nếu trang không phải trang scan"""
+    page_area = page.rect.width * page.rect.height
+    scan_dpi = None
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"])
+        if not page_area or bbox.width <= 0 or (bbox.width * bbox.height) / page_area < min_coverage:
+            continue
+        dpi = info["width"] / (bbox.width / 72)
+        scan_dpi = max(scan_dpi or 0, dpi)
+    return scan_dpi
+
+def render_page_range(pdf_path: str, output_dir: str, start: int, end: int, options: RenderOptions) -> List[Dict]:
+    """Entry point cho worker process: tự mở tài liệu và render các trang [start, end)"""
+    os.makedirs(output_dir, exist_ok=True)
+    with fitz.open(pdf_path) as doc:
+        return [render_page(doc, page_index, output_dir, options) for page_index in range(start, end)]
@@ -0,0 +1,125 @@
+"""Phân loại text layer của trang PDF (output của `page.get_text("dict")`) thành các segment header/text.
+
+Dùng cho trang born-digital để bỏ qua bước OCR bằng LLM. Module thuần Python, chạy được trong worker process.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .heading_numbering import parse_numbering
+
+# Bit 4 trong span["flags"] của PyMuPDF là chữ đậm
+BOLD_FLAG = 1 << 4
+
+PAGE_NUMBER_PATTERN = re.compile(r"^\s*(trang\s+|page\s+)?\d{1,4}(\s*/\s*\d{1,4})?\s*$", re.IGNORECASE)
+
+def count_text_chars(page_dict: Dict) -> int:
+    """Số ký tự trong text layer của trang, dùng để ước lượng mật độ chữ"""
+    return sum(line["chars"] for block in _collect_lines(page_dict) for line in block)
+
+def extract_text_segments(
+    page_dict: Dict,
+    min_chars: int = 200,
+    header_size_ratio: float = 1.15,
+    max_header_chars: int = 150,
+    max_garbage_ratio: float = 0.05,
+    bold_header_size_ratio: float = 1.05,
+    max_bold_header_chars: int = 80,
+) -> Optional[List[Dict]]:
+    """Trả về danh sách segment theo thứ tự đọc, hoặc None nếu text layer không dùng được"""
+    blocks = _collect_lines(page_dict)
+    lines = [line for block in blocks for line in block]
+
+    total_chars = sum(line["chars"] for line in lines)
+    if total_chars < min_chars:
+        return None
+
+    # Font lỗi (không map được unicode) cho ra ký tự thay thế -> phải OCR
+    garbage = sum(line["text"].count("\ufffd") for line in lines)
+    if garbage / total_chars > max_garbage_ratio:
+        return None
+
+    # Cỡ chữ thân bài = cỡ chữ chiếm nhiều ký tự nhất trên trang
+    size_counter = Counter()
+    for line in lines:
+        size_counter[round(line["size"], 1)] += line["chars"]
+    body_size = size_counter.most_common(1)[0][0]
+
+    segments: List[Dict] = []
+    for block in blocks:
+        previous_label = None
+        for line in block:
+            if PAGE_NUMBER_PATTERN.match(line["text"]):
+                continue
+
+            is_header = _is_header(
+                line, body_size, header_size_ratio, max_header_chars, bold_header_size_ratio, max_bold_header_chars
+            )
+            label = "header" if is_header else "text"
+
+            # Gộp các dòng liên tiếp cùng loại trong một block (đoạn văn xuống dòng, tiêu đề nhiều dòng)
+            if previous_label == label and segments and (
+                label == "text" or abs(segments[-1]["font_size"] - line["size"]) < 0.5
+            ):
+                segments[-1]["content"] += " " + line["text"]
+            else:
+                segments.append({
+                    "label": label,
+                    "content": line["text"],
+                    "font_size": round(line["size"], 1),
+                    "bold": line["bold"],
+                })
+            previous_label = label
+
+    return segments
+
+def _collect_lines(page_dict: Dict) -> List[List[Dict]]:
+    blocks = []
+    for block in page_dict.get("blocks", []):
+        # type 0 = text block, type 1 = image block
+        if block.get("type", 0) != 0:
+            continue
+
+        block_lines = []
+        for line in block.get("lines", []):
+            spans = [span for span in line.get("spans", []) if span.get("text", "").strip()]
+            if not spans:
+                continue
+
+            text = " ".join("".join(span["text"] for span in line["spans"]).split())
+            block_lines.append({
+                "text": text,
+                "chars": sum(len(span["text"].strip()) for span in spans),
+                "size": max(span.get("size", 0) for span in spans),
+                "bold": all(
+                    span.get("flags", 0) & BOLD_FLAG or "bold" in span.get("font", "").lower()
+                    for span in spans
+                ),
+            })
+        if block_lines:
+            blocks.append(block_lines)
+    return blocks
+
+def _is_header(
+    line: Dict,
+    body_size: float,
+    header_size_ratio: float,
+    max_header_chars: int,
+    bold_header_size_ratio: float,
+    max_bold_header_chars: int
+) -> bool:
+    text = line["text"]
+    if len(text) > max_header_chars:
+        return False
+
+    if line["size"] >= body_size * header_size_ratio:
+        return True
+
+    if not line["bold"] or len(text) > max_bold_header_chars:
+        return False
+    # Dòng in đậm, ngắn, có đánh số
+    if parse_numbering(text) is not None:
+        return True
+    # Không đánh số: phải lớn hơn chữ thân bài và không kết thúc như câu văn,
+    # để ô bảng / chú thích in đậm cùng cỡ chữ thân bài không thành header
+    return line["size"] >= body_size * bold_header_size_ratio and not text.endswith((".", ",", ";"))